@@ -0,0 +1,68 @@
+"""Microbenchmark of the message codec against the previous json + dataclass path.
+
+python -m benchmarks.codec
+"""
+
+import json
+import timeit
+from dataclasses import asdict
+
+import benchmarks.dispatch  # noqa: F401  (sets the environment src.config needs)
+from src.codec import JSON, MSGPACK, encode
+from src.dispatcher import InputSolveRequest, OutputSolveRequest, decode_control_message
+
+REQUEST = {
+    "problem_id": 12,
+    "instance_id": 345,
+    "solver_id": 6,
+    "vcpus": 4,
+    "memory_gib": 8.0,
+}
+OUTPUT = OutputSolveRequest(
+    solver_id=6,
+    solver_name="gecode",
+    problem_id=12,
+    instance_id=345,
+    problem_url="http://solver-director.psp.svc.cluster.local:8080/v1/problems/12/file",
+    instance_url="http://solver-director.psp.svc.cluster.local:8080/v1/problems/12/instances/345/file",
+)
+
+
+def legacy_decode(body: bytes) -> InputSolveRequest:
+    request = json.loads(body.decode())
+    return InputSolveRequest(
+        problem_id=request["problem_id"],
+        instance_id=request["instance_id"],
+        solver_id=request["solver_id"],
+        vcpus=request["vcpus"],
+        memory_gib=request["memory_gib"],
+    )
+
+
+def legacy_encode(message: OutputSolveRequest) -> bytes:
+    return json.dumps(asdict(message)).encode()
+
+
+def bench(label: str, func, number: int):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<28} {seconds / number * 1e6:>8.2f} µs")
+
+
+def main(number: int = 100_000):
+    json_body = json.dumps(REQUEST).encode()
+    msgpack_body = encode(InputSolveRequest(**REQUEST), MSGPACK)
+
+    bench("decode legacy json", lambda: legacy_decode(json_body), number)
+    bench("decode codec json", lambda: decode_control_message(json_body, JSON), number)
+    bench(
+        "decode codec msgpack",
+        lambda: decode_control_message(msgpack_body, MSGPACK),
+        number,
+    )
+    bench("encode legacy json", lambda: legacy_encode(OUTPUT), number)
+    bench("encode codec json", lambda: encode(OUTPUT, JSON), number)
+    bench("encode codec msgpack", lambda: encode(OUTPUT, MSGPACK), number)
+
+
+if __name__ == "__main__":
+    main()
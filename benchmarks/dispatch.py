@@ -0,0 +1,337 @@
+"""Dispatcher throughput benchmark against in-process stand-ins for RabbitMQ, Kubernetes and the director.
+
+Runs `start_dispatcher` once per concurrency level on a burst of control messages and reports
+messages/sec, p50/p99 dispatch latency (delivery to ack) and memory per in-flight message.
+
+    python -m benchmarks.dispatch --concurrency 1,8,32,128 --output results.json
+    python -m benchmarks.dispatch --baseline benchmarks/baseline.json  # exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from unittest.mock import patch
+
+for name, value in {
+    "RABBITMQ_HOST": "localhost",
+    "RABBITMQ_PORT": "5672",
+    "RABBITMQ_USER": "guest",
+    "RABBITMQ_PASSWORD": "guest",
+    "PROJECT_ID": "benchmark",
+    "SOLVERS_NAMESPACE": "solvers",
+    "CONTROL_QUEUE": "control",
+    "MAX_TOTAL_SOLVER_REPLICAS": "100",
+    "PROJECT_SOLVER_RESULT_QUEUE": "results",
+    "SOLVER_TIMEOUT": "3600",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+from kubernetes.client.rest import ApiException
+
+from src import dispatcher, informer, kube
+from src.cache import AsyncTTLCache
+from src.config import Config
+from src.director import CircuitBreaker, SolverDirectorClient
+from src.informer import Informer
+from tests.amqp_stub import FakeBroker
+
+
+@dataclass
+class Scenario:
+    messages: int = 2000
+    solvers: int = 20
+    director_latency: float = 0.005
+    director_error_rate: float = 0.0
+    kube_latency: float = 0.02
+    kube_error_rate: float = 0.0
+    confirm_delay: float = 0.0005
+    seed: int = 0
+
+
+@dataclass
+class Result:
+    concurrency: int
+    messages: int
+    retried: int
+    seconds: float
+    messages_per_second: float
+    p50_ms: float
+    p99_ms: float
+    memory_per_in_flight_kib: float = 0.0
+
+
+@dataclass
+class Report:
+    scenario: Scenario
+    results: list[Result] = field(default_factory=list)
+    python: str = sys.version.split()[0]
+
+
+def fake_director(scenario: Scenario, rng: random.Random) -> httpx.AsyncBaseTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(scenario.director_latency)
+        if rng.random() < scenario.director_error_rate:
+            return httpx.Response(503)
+        if ids := request.url.params.get("ids"):
+            return httpx.Response(
+                200, json=[solver(int(solver_id)) for solver_id in ids.split(",")]
+            )
+        return httpx.Response(
+            200, json=solver(int(request.url.path.rsplit("/", 1)[-1]))
+        )
+
+    def solver(solver_id: int) -> dict:
+        return {
+            "id": solver_id,
+            "name": f"solver{solver_id}",
+            "image_path": f"solver{solver_id}:latest",
+        }
+
+    return httpx.MockTransport(handler)
+
+
+class FakeKubernetes:
+    """Synchronous API stand-in: calls block their worker thread like the real client does"""
+
+    def __init__(self, scenario: Scenario, rng: random.Random):
+        self._scenario = scenario
+        self._rng = rng
+        self.created: list[str] = []
+
+    def _create(self, body: dict):
+        time.sleep(self._scenario.kube_latency)
+        if self._rng.random() < self._scenario.kube_error_rate:
+            raise ApiException(status=500, reason="Injected error")
+        self.created.append(body["metadata"]["name"])
+
+    def create_namespaced_deployment(self, namespace: str, body: dict):
+        self._create(body)
+
+    def create_namespaced_custom_object(
+        self, group: str, version: str, namespace: str, plural: str, body: dict
+    ):
+        self._create(body)
+
+
+def control_messages(scenario: Scenario, rng: random.Random) -> list[bytes]:
+    return [
+        json.dumps(
+            {
+                "problem_id": 1,
+                "instance_id": instance_id,
+                "solver_id": rng.randrange(scenario.solvers),
+                "vcpus": 2,
+                "memory_gib": 4,
+            }
+        ).encode()
+        for instance_id in range(scenario.messages)
+    ]
+
+
+async def run_level(
+    scenario: Scenario, concurrency: int, messages: int, trace_memory: bool = False
+) -> Result:
+    rng = random.Random(scenario.seed)
+    broker = FakeBroker()
+    broker.confirm_delay = scenario.confirm_delay
+    director = SolverDirectorClient(
+        transport=fake_director(scenario, rng),
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=0.05),
+    )
+    fake_kube = FakeKubernetes(scenario, rng)
+    control_queue = Config.Controller.CONTROL_QUEUE
+    for body in control_messages(scenario, rng)[:messages]:
+        broker.put(control_queue, body)
+
+    latencies: list[float] = []
+    handle_message = dispatcher.handle_message
+
+    async def timed_handle_message(*args):
+        start = time.perf_counter()
+        await handle_message(*args)
+        latencies.append(time.perf_counter() - start)
+
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.object(dispatcher.aio_pika, "connect_robust", broker.connect_robust)
+        )
+        stack.enter_context(
+            patch.object(dispatcher, "handle_message", timed_handle_message)
+        )
+        stack.enter_context(patch.object(dispatcher, "director", director))
+        stack.enter_context(
+            patch.object(
+                dispatcher,
+                "solver_cache",
+                AsyncTTLCache("benchmark", director.get_solver, ttl=300, max_size=1024),
+            )
+        )
+        stack.enter_context(patch.object(kube, "apps_v1", lambda: fake_kube))
+        stack.enter_context(patch.object(kube, "custom_objects", lambda: fake_kube))
+        stack.enter_context(
+            patch.object(informer, "deployments", Informer("deployment", None))
+        )
+        stack.enter_context(
+            patch.object(informer, "scaled_objects", Informer("scaledobject", None))
+        )
+        stack.enter_context(
+            patch.object(Config.Dispatcher, "MAX_IN_FLIGHT", concurrency)
+        )
+        stack.enter_context(
+            patch.object(Config.Dispatcher, "PREFETCH_COUNT", concurrency * 2)
+        )
+
+        if trace_memory:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        task = asyncio.create_task(dispatcher.start_dispatcher())
+        try:
+            await broker.wait_for(lambda: len(latencies) == messages, timeout=600)
+        finally:
+            seconds = time.perf_counter() - start
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await director.aclose()
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        kube.shutdown()
+
+    latencies.sort()
+    result = Result(
+        concurrency=concurrency,
+        messages=messages,
+        retried=len(broker.bodies(f"{control_queue}.retry.5s")),
+        seconds=round(seconds, 4),
+        messages_per_second=round(messages / seconds, 1),
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+    )
+    if trace_memory:
+        result.memory_per_in_flight_kib = round(
+            (peak - baseline) / min(concurrency, messages) / 1024, 2
+        )
+    return result
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run(scenario: Scenario, levels: list[int]) -> Report:
+    report = Report(scenario)
+    for concurrency in levels:
+        result = await run_level(scenario, concurrency, scenario.messages)
+        # tracemalloc slows everything down, so memory is measured on a separate, shorter run
+        traced = await run_level(
+            scenario,
+            concurrency,
+            min(scenario.messages, concurrency * 4),
+            trace_memory=True,
+        )
+        result.memory_per_in_flight_kib = traced.memory_per_in_flight_kib
+        report.results.append(result)
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists every level whose throughput dropped or p99 latency grew by more than `tolerance`"""
+    previous = {result["concurrency"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(result["concurrency"])
+        if before is None:
+            continue
+        if result["messages_per_second"] < before["messages_per_second"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"concurrency {result['concurrency']}: {result['messages_per_second']} msg/s, "
+                f"baseline {before['messages_per_second']} msg/s"
+            )
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(
+                f"concurrency {result['concurrency']}: p99 {result['p99_ms']} ms, baseline {before['p99_ms']} ms"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    defaults = Scenario()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        default="1,8,32,128",
+        help="Comma-separated MAX_IN_FLIGHT levels",
+    )
+    parser.add_argument("--messages", type=int, default=defaults.messages)
+    parser.add_argument("--solvers", type=int, default=defaults.solvers)
+    parser.add_argument(
+        "--director-latency", type=float, default=defaults.director_latency
+    )
+    parser.add_argument(
+        "--director-error-rate", type=float, default=defaults.director_error_rate
+    )
+    parser.add_argument("--kube-latency", type=float, default=defaults.kube_latency)
+    parser.add_argument(
+        "--kube-error-rate", type=float, default=defaults.kube_error_rate
+    )
+    parser.add_argument("--confirm-delay", type=float, default=defaults.confirm_delay)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Fail if results regressed against this results file"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed relative regression"
+    )
+    args = parser.parse_args(argv)
+
+    scenario = Scenario(
+        messages=args.messages,
+        solvers=args.solvers,
+        director_latency=args.director_latency,
+        director_error_rate=args.director_error_rate,
+        kube_latency=args.kube_latency,
+        kube_error_rate=args.kube_error_rate,
+        confirm_delay=args.confirm_delay,
+        seed=args.seed,
+    )
+    levels = [int(level) for level in args.concurrency.split(",")]
+    report = asdict(asyncio.run(run(scenario, levels)))
+
+    print(
+        f"{'in flight':>9} {'msg/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'KiB/msg':>9} {'retried':>8}"
+    )
+    for result in report["results"]:
+        print(
+            f"{result['concurrency']:>9} {result['messages_per_second']:>10} {result['p50_ms']:>9} "
+            f"{result['p99_ms']:>9} {result['memory_per_in_flight_kib']:>9} {result['retried']:>8}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
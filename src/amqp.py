@@ -0,0 +1,135 @@
+"""App-lifetime AMQP connection and bounded channel pool shared by the HTTP API and health checks"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aio_pika
+
+from src.config import Config
+from src.metrics import (
+    AMQP_POOL_ACQUIRE_SECONDS,
+    AMQP_POOL_CHANNELS_IN_USE,
+    AMQP_POOL_CHANNELS_OPEN,
+    AMQP_POOL_TIMEOUTS,
+)
+
+logger = logging.getLogger(__name__)
+
+# What talking to the broker raises: AMQP errors, lost connections, and timeouts (including waiting for a channel)
+BROKER_ERRORS = (
+    aio_pika.exceptions.AMQPError,
+    aio_pika.exceptions.ChannelInvalidStateError,
+    OSError,
+    TimeoutError,
+)
+
+
+class ChannelPool:
+    """Hands out channels of one robust connection, at most `max_channels` at a time.
+
+    The connection is opened on first use and reopened if it was closed. Channels are reused
+    between requests; channels the broker closed (e.g. after a failed passive declare) are dropped.
+    Every channel gets the same QoS when it is opened, so borrowers must not change it.
+    """
+
+    def __init__(self, max_channels: int, acquire_timeout: float):
+        self._max_channels = max_channels
+        self._acquire_timeout = acquire_timeout
+        self._connection: aio_pika.abc.AbstractRobustConnection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_channels)
+        self._idle: list[aio_pika.abc.AbstractChannel] = []
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed
+
+    async def connection(self) -> aio_pika.abc.AbstractRobustConnection:
+        if self.is_connected:
+            return self._connection
+        async with self._connect_lock:
+            if not self.is_connected:
+                logger.info("Opening shared AMQP connection")
+                self._idle.clear()
+                self._connection = await aio_pika.connect_robust(
+                    host=Config.RabbitMQ.HOST,
+                    port=Config.RabbitMQ.PORT,
+                    login=Config.RabbitMQ.USER,
+                    password=Config.RabbitMQ.PASSWORD,
+                )
+        return self._connection
+
+    async def acquire(self) -> aio_pika.abc.AbstractChannel:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._acquire_timeout)
+        except TimeoutError:
+            AMQP_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            AMQP_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - start)
+
+        try:
+            channel = await self._idle_or_new_channel()
+        except BaseException:
+            self._slots.release()
+            raise
+        AMQP_POOL_CHANNELS_IN_USE.inc()
+        return channel
+
+    async def release(self, channel: aio_pika.abc.AbstractChannel):
+        AMQP_POOL_CHANNELS_IN_USE.dec()
+        if channel.is_closed or not self.is_connected:
+            AMQP_POOL_CHANNELS_OPEN.dec()
+        else:
+            self._idle.append(channel)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def channel(self) -> AsyncIterator[aio_pika.abc.AbstractChannel]:
+        channel = await self.acquire()
+        try:
+            yield channel
+        finally:
+            await self.release(channel)
+
+    async def ping(self) -> bool:
+        """Whether the connection is up; takes no channel slot, so a busy pool does not fail readiness"""
+        try:
+            connection = await self.connection()
+        except BROKER_ERRORS as e:
+            logger.warning(f"AMQP connection is not available: {e}")
+            return False
+        # A robust connection stays open while it reconnects, but is not connected meanwhile
+        return connection.connected.is_set()
+
+    async def close(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        AMQP_POOL_CHANNELS_OPEN.dec(len(self._idle))
+        self._idle.clear()
+
+    async def _idle_or_new_channel(self) -> aio_pika.abc.AbstractChannel:
+        while self._idle:
+            channel = self._idle.pop()
+            if not channel.is_closed:
+                return channel
+            AMQP_POOL_CHANNELS_OPEN.dec()
+
+        connection = await self.connection()
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        # Long-poll consumers are pushed one message at a time; basic.get ignores the prefetch
+        await channel.set_qos(prefetch_count=1)
+        AMQP_POOL_CHANNELS_OPEN.inc()
+        return channel
+
+
+channel_pool = ChannelPool(
+    Config.RabbitMQ.API_MAX_CHANNELS, Config.RabbitMQ.CHANNEL_ACQUIRE_TIMEOUT
+)
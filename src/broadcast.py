@@ -0,0 +1,232 @@
+"""Fans out the messages of result queues to any number of streaming clients.
+
+The result queue belongs to the project, which consumes it, so streams never read it. The result
+relay also publishes a copy of every result to the fanout exchange `<queue>.broadcast`. While
+anybody is subscribed to a queue, one consumer on the shared API connection reads those copies
+through an exclusive queue bound to that exchange, which goes away with the last subscriber.
+Only the project result queue is relayed, so it is the only queue that can be streamed.
+
+A bounded buffer of recent events lets clients that reconnect resume after the last event id
+they received. The buffer belongs to the API process that served the stream: a client that
+reconnects to another replica or worker, or after a restart, gets whatever that process buffered.
+"""
+
+import asyncio
+import itertools
+import logging
+import secrets
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import aio_pika
+
+from src.amqp import channel_pool
+from src.codec import as_text
+from src.config import Config
+from src.metrics import BROADCAST_EVENTS, BROADCAST_LAGGED, BROADCAST_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+def broadcast_exchange(queue_name: str) -> str:
+    """The fanout exchange that copies of the results for `queue_name` are published to"""
+    return f"{queue_name}.broadcast"
+
+
+def streamable(queue_name: str) -> bool:
+    """Whether the result relay copies the results of `queue_name` to a broadcast exchange"""
+    return (
+        Config.Broadcast.ENABLED
+        and queue_name == Config.Controller.PROJECT_SOLVER_RESULT_QUEUE
+    )
+
+
+@dataclass(frozen=True)
+class Event:
+    epoch: str
+    sequence: int
+    data: str
+
+    @property
+    def id(self) -> str:
+        return f"{self.epoch}-{self.sequence}"
+
+
+class Subscription:
+    """Events waiting for one client.
+
+    Closed once the client falls more than `max_pending` events behind; it can then resume
+    from the buffer with the id of the last event it received.
+    """
+
+    def __init__(self, max_pending: int, backlog: list[Event]):
+        self._pending: deque[Event] = deque(backlog)
+        self._max_pending = max_pending
+        self._wakeup = asyncio.Event()
+        self.closed = False
+
+    def push(self, event: Event) -> bool:
+        if self.closed:
+            return False
+        if len(self._pending) >= self._max_pending:
+            self.close()
+            return False
+        self._pending.append(event)
+        self._wakeup.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def next(self, timeout: float) -> Event | None:
+        """Returns the next event, or None if none arrived within `timeout` seconds.
+
+        Raises SubscriptionClosed once the subscription is closed and all events were taken.
+        """
+        while not self._pending:
+            if self.closed:
+                raise SubscriptionClosed()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                return None
+        return self._pending.popleft()
+
+
+class Topic:
+    def __init__(self, queue_name: str, buffer_size: int, max_pending: int):
+        self.queue_name = queue_name
+        self._epoch = secrets.token_hex(4)
+        self._sequence = itertools.count(1)
+        self._buffer: deque[Event] = deque(maxlen=buffer_size)
+        self._max_pending = max_pending
+        self._subscriptions: set[Subscription] = set()
+        self._consumer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, last_event_id: str | None) -> Subscription:
+        subscription = Subscription(self._max_pending, self._replay(last_event_id))
+        self._subscriptions.add(subscription)
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._consume())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        self._subscriptions.discard(subscription)
+        if not self._subscriptions:
+            self.stop()
+
+    def stop(self):
+        if self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+
+    def _replay(self, last_event_id: str | None) -> list[Event]:
+        if last_event_id is None:
+            return []
+        epoch, _, sequence = last_event_id.rpartition("-")
+        if epoch != self._epoch or not sequence.isdigit():
+            # Ids of an earlier topic (e.g. before a restart): all we can do is replay everything buffered
+            return list(self._buffer)
+        return [event for event in self._buffer if event.sequence > int(sequence)]
+
+    def _publish(self, data: str):
+        event = Event(self._epoch, next(self._sequence), data)
+        self._buffer.append(event)
+        BROADCAST_EVENTS.inc()
+        for subscription in list(self._subscriptions):
+            if not subscription.push(event):
+                logger.info(
+                    f"Subscriber of {self.queue_name} fell behind, disconnecting it"
+                )
+                BROADCAST_LAGGED.inc()
+                self._subscriptions.discard(subscription)
+
+    async def _consume(self):
+        while True:
+            try:
+                connection = await channel_pool.connection()
+                channel = await connection.channel()
+                try:
+                    await channel.set_qos(
+                        prefetch_count=Config.Broadcast.PREFETCH_COUNT
+                    )
+                    exchange = await channel.declare_exchange(
+                        broadcast_exchange(self.queue_name),
+                        aio_pika.ExchangeType.FANOUT,
+                        durable=True,
+                    )
+                    queue = await channel.declare_queue(
+                        f"{exchange.name}.{self._epoch}",
+                        exclusive=True,
+                        auto_delete=True,
+                    )
+                    await queue.bind(exchange)
+                    async with queue.iterator() as queue_iter:
+                        async for message in queue_iter:
+                            self._publish(as_text(message.body, message.content_type))
+                            await message.ack()
+                finally:
+                    await channel.close()
+            except asyncio.CancelledError:
+                raise
+            # Whatever went wrong, the subscribers are better served by a restart than by no consumer
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Consumer of {self.queue_name} failed, restarting: {e}")
+            await asyncio.sleep(Config.Broadcast.RETRY_BACKOFF)
+
+
+class Broadcaster:
+    """Keeps one topic per streamed queue, dropping it `linger` seconds after its last subscriber left."""
+
+    def __init__(self, buffer_size: int, max_pending: int, linger: float):
+        self._buffer_size = buffer_size
+        self._max_pending = max_pending
+        self._linger = linger
+        self._topics: dict[str, Topic] = {}
+
+    @contextmanager
+    def subscribe(
+        self, queue_name: str, last_event_id: str | None = None
+    ) -> Iterator[Subscription]:
+        topic = self._topics.get(queue_name)
+        if topic is None:
+            topic = self._topics[queue_name] = Topic(
+                queue_name, self._buffer_size, self._max_pending
+            )
+        subscription = topic.subscribe(last_event_id)
+        BROADCAST_SUBSCRIBERS.inc()
+        try:
+            yield subscription
+        finally:
+            BROADCAST_SUBSCRIBERS.dec()
+            topic.unsubscribe(subscription)
+            if not topic:
+                asyncio.get_running_loop().call_later(
+                    self._linger, self._drop_idle, queue_name, topic
+                )
+
+    def close(self):
+        for topic in self._topics.values():
+            topic.stop()
+        self._topics.clear()
+
+    def _drop_idle(self, queue_name: str, topic: Topic):
+        if self._topics.get(queue_name) is topic and not topic:
+            del self._topics[queue_name]
+
+
+broadcaster = Broadcaster(
+    Config.Broadcast.BUFFER_SIZE, Config.Broadcast.MAX_PENDING, Config.Broadcast.LINGER
+)
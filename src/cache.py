@@ -0,0 +1,198 @@
+"""In-process async cache with TTL expiry, LRU eviction, negative caching and single-flight loads"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from src.metrics import CACHE_EVICTIONS, CACHE_REQUESTS, CACHE_SIZE
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    value: Any = None
+    error: Exception | None = None
+
+
+class AsyncTTLCache:
+    """Caches the results of an async `loader(key)`.
+
+    Exceptions of a type listed in `negative_exceptions` are cached for `negative_ttl`
+    seconds and re-raised on hits. Concurrent misses for the same key share one loader call.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        ttl: float,
+        max_size: int,
+        negative_ttl: float = 0,
+        negative_exceptions: tuple[type[Exception], ...] = (),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self._loader = loader
+        self._ttl = ttl
+        self._max_size = max_size
+        self._negative_ttl = negative_ttl
+        self._negative_exceptions = negative_exceptions
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable) -> Any:
+        while True:
+            entry = self._lookup(key)
+            if entry is not None:
+                if entry.error is not None:
+                    CACHE_REQUESTS.labels(self.name, "negative_hit").inc()
+                    raise entry.error
+                CACHE_REQUESTS.labels(self.name, "hit").inc()
+                return entry.value
+
+            future = self._inflight.get(key)
+            if future is None:
+                CACHE_REQUESTS.labels(self.name, "miss").inc()
+                return await self._load(key)
+
+            CACHE_REQUESTS.labels(self.name, "coalesced").inc()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The loading caller was cancelled, not us: try again.
+                if future.cancelled():
+                    continue
+                raise
+
+    async def get_many(
+        self,
+        keys: Iterable[Hashable],
+        bulk_loader: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]],
+    ) -> dict[Hashable, Any]:
+        """Looks up many keys, loading all misses with one `bulk_loader(keys)` call.
+
+        The bulk loader maps each key to its value or to the exception loading it raised. The
+        result has the same shape: exceptions are returned per key instead of raised.
+        """
+        results: dict[Hashable, Any] = {}
+        waiting: list[Hashable] = []
+        missing: list[Hashable] = []
+        for key in dict.fromkeys(keys):
+            entry = self._lookup(key)
+            if entry is not None:
+                CACHE_REQUESTS.labels(
+                    self.name, "hit" if entry.error is None else "negative_hit"
+                ).inc()
+                results[key] = entry.value if entry.error is None else entry.error
+            elif key in self._inflight:
+                waiting.append(key)
+            else:
+                missing.append(key)
+
+        if missing:
+            CACHE_REQUESTS.labels(self.name, "miss").inc(len(missing))
+            futures = {
+                key: asyncio.get_running_loop().create_future() for key in missing
+            }
+            self._inflight.update(futures)
+            try:
+                loaded = await bulk_loader(missing)
+                for key, future in futures.items():
+                    value = loaded.get(key, KeyError(key))
+                    results[key] = value
+                    if not isinstance(value, Exception):
+                        self._store(
+                            key, future, _Entry(self._clock() + self._ttl, value=value)
+                        )
+                        future.set_result(value)
+                        continue
+                    if isinstance(value, self._negative_exceptions):
+                        self._store(
+                            key,
+                            future,
+                            _Entry(self._clock() + self._negative_ttl, error=value),
+                        )
+                    future.set_exception(value)
+                    future.exception()
+            finally:
+                for key, future in futures.items():
+                    future.cancel()  # No-op once resolved; otherwise waiters retry on their own
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+
+        if waiting:
+            values = await asyncio.gather(
+                *(self.get(key) for key in waiting), return_exceptions=True
+            )
+            results.update(zip(waiting, values))
+        return results
+
+    def invalidate(self, key: Hashable) -> bool:
+        self._inflight.pop(key, None)
+        if self._entries.pop(key, None) is None:
+            return False
+        CACHE_EVICTIONS.labels(self.name, "invalidated").inc()
+        CACHE_SIZE.labels(self.name).set(len(self._entries))
+        return True
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        self._inflight.clear()
+        CACHE_EVICTIONS.labels(self.name, "invalidated").inc(count)
+        CACHE_SIZE.labels(self.name).set(0)
+        return count
+
+    def _lookup(self, key: Hashable) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self._clock():
+            del self._entries[key]
+            CACHE_EVICTIONS.labels(self.name, "expired").inc()
+            CACHE_SIZE.labels(self.name).set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _load(self, key: Hashable) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, self._negative_exceptions):
+                self._store(
+                    key, future, _Entry(self._clock() + self._negative_ttl, error=e)
+                )
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else is waiting
+            raise
+        else:
+            self._store(key, future, _Entry(self._clock() + self._ttl, value=value))
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _store(self, key: Hashable, future: asyncio.Future, entry: _Entry):
+        # An invalidation while loading means the result may already be stale.
+        if self._inflight.get(key) is not future:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.labels(self.name, "lru").inc()
+        CACHE_SIZE.labels(self.name).set(len(self._entries))
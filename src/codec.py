@@ -0,0 +1,80 @@
+"""Validated encoding and decoding of queue messages, as JSON or msgpack depending on the content type.
+
+Decoders are compiled once per message type and read the body bytes directly, checking field
+types as they go, so a string where an int belongs is rejected instead of reaching a manifest.
+"""
+
+import base64
+from typing import Any
+
+import msgspec
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CONTENT_TYPES = (JSON, MSGPACK)
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def negotiate(content_type: str | None) -> str:
+    """Maps a message content type to a supported encoding; anything unknown is treated as JSON"""
+    if content_type in (
+        "application/msgpack",
+        "application/x-msgpack",
+        "application/vnd.msgpack",
+    ):
+        return MSGPACK
+    return JSON
+
+
+def decode_any(body: bytes, content_type: str | None = None) -> Any:
+    """Decodes a body without validating it, for messages whose type depends on their fields"""
+    try:
+        return _untyped_decoders[negotiate(content_type)].decode(body)
+    except msgspec.DecodeError as e:
+        raise DecodeError(str(e)) from e
+
+
+class Codec[T]:
+    def __init__(self, message_type: type[T]):
+        self._type = message_type
+        self._decoders = {
+            JSON: msgspec.json.Decoder(message_type),
+            MSGPACK: msgspec.msgpack.Decoder(message_type),
+        }
+
+    def decode(self, body: bytes, content_type: str | None = None) -> T:
+        try:
+            return self._decoders[negotiate(content_type)].decode(body)
+        except msgspec.DecodeError as e:
+            raise DecodeError(str(e)) from e
+
+    def convert(self, message: Any) -> T:
+        """Validates a message decoded by `decode_any`"""
+        try:
+            return msgspec.convert(message, self._type)
+        except msgspec.ValidationError as e:
+            raise DecodeError(str(e)) from e
+
+
+_untyped_decoders = {JSON: msgspec.json.Decoder(), MSGPACK: msgspec.msgpack.Decoder()}
+_encoders = {JSON: msgspec.json.Encoder(), MSGPACK: msgspec.msgpack.Encoder()}
+
+
+def encode(message: Any, content_type: str | None = None) -> bytes:
+    return _encoders[negotiate(content_type)].encode(message)
+
+
+def as_text(body: bytes, content_type: str | None = None) -> str:
+    """A body as text for clients: msgpack as JSON, other bodies that are not UTF-8 base64-encoded"""
+    if negotiate(content_type) == MSGPACK:
+        try:
+            return msgspec.json.encode(msgspec.msgpack.decode(body)).decode("utf-8")
+        except (msgspec.MsgspecError, TypeError):
+            pass
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode("ascii")
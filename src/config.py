@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 class Config:
@@ -12,6 +13,13 @@ class Config:
         DESCRIPTION = "Manages solver and instances"
         VERSION = "v1"
         ROOT_PATH = "/"
+        STATUS_DEFAULT_MESSAGES = int(os.getenv("STATUS_DEFAULT_MESSAGES", "1000"))
+        STATUS_MAX_MESSAGES = int(os.getenv("STATUS_MAX_MESSAGES", "10000"))
+        STATUS_DEFAULT_BYTES = int(
+            os.getenv("STATUS_DEFAULT_BYTES", str(4 * 1024 * 1024))
+        )
+        STATUS_MAX_BYTES = int(os.getenv("STATUS_MAX_BYTES", str(64 * 1024 * 1024)))
+        STATUS_MAX_WAIT = float(os.getenv("STATUS_MAX_WAIT", "30"))
 
     class RabbitMQ:
         HOST = os.getenv("RABBITMQ_HOST")
@@ -19,11 +27,35 @@ class Config:
         MANAGEMENT_PORT = 15672
         USER = os.getenv("RABBITMQ_USER")
         PASSWORD = os.getenv("RABBITMQ_PASSWORD")
+        CONFIRM_TIMEOUT = float(os.getenv("RABBITMQ_CONFIRM_TIMEOUT", "30"))
+        API_MAX_CHANNELS = int(os.getenv("RABBITMQ_API_MAX_CHANNELS", "16"))
+        CHANNEL_ACQUIRE_TIMEOUT = float(
+            os.getenv("RABBITMQ_CHANNEL_ACQUIRE_TIMEOUT", "5")
+        )
+
+    class Broadcast:
+        # Off: the result stream endpoints are disabled; on, the result relay copies every result to them
+        ENABLED = os.getenv("BROADCAST_ENABLED", "false").lower() == "true"
+        BUFFER_SIZE = int(os.getenv("BROADCAST_BUFFER_SIZE", "1000"))
+        MAX_PENDING = int(os.getenv("BROADCAST_MAX_PENDING", "256"))
+        PREFETCH_COUNT = int(os.getenv("BROADCAST_PREFETCH_COUNT", "64"))
+        HEARTBEAT_INTERVAL = float(os.getenv("BROADCAST_HEARTBEAT_INTERVAL", "15"))
+        LINGER = float(os.getenv("BROADCAST_LINGER", "60"))
+        RETRY_BACKOFF = float(os.getenv("BROADCAST_RETRY_BACKOFF", "1"))
 
     class Solver:
         QUEUE_LENGTH_PER_REPLICA = int(float(os.getenv("KEDA_QUEUE_LENGTH", "1")))
         MIN_REPLICAS = 0
         IMAGE = os.getenv("SOLVER_IMAGE")
+        # Comma-separated, ascending; requested shapes are rounded up to the next bucket
+        VCPU_BUCKETS = tuple(
+            int(v) for v in os.getenv("SOLVER_VCPU_BUCKETS", "").split(",") if v.strip()
+        )
+        MEMORY_BUCKETS_GIB = tuple(
+            float(v)
+            for v in os.getenv("SOLVER_MEMORY_BUCKETS_GIB", "").split(",")
+            if v.strip()
+        )
 
     class SolverDirector:
         SOLVERS_URL = os.getenv(
@@ -38,6 +70,31 @@ class Config:
             "SOLVER_DIRECTOR_INSTANCES_URL",
             "http://solver-director.psp.svc.cluster.local:8080/v1/instances",
         )
+        MAX_CONNECTIONS = int(os.getenv("SOLVER_DIRECTOR_MAX_CONNECTIONS", "20"))
+        MAX_KEEPALIVE_CONNECTIONS = int(
+            os.getenv("SOLVER_DIRECTOR_MAX_KEEPALIVE_CONNECTIONS", "10")
+        )
+        KEEPALIVE_EXPIRY = float(os.getenv("SOLVER_DIRECTOR_KEEPALIVE_EXPIRY", "30"))
+        TIMEOUT = float(os.getenv("SOLVER_DIRECTOR_TIMEOUT", "10"))
+        CONNECT_TIMEOUT = float(os.getenv("SOLVER_DIRECTOR_CONNECT_TIMEOUT", "5"))
+        POOL_TIMEOUT = float(os.getenv("SOLVER_DIRECTOR_POOL_TIMEOUT", "5"))
+        REQUEST_BUDGET = float(os.getenv("SOLVER_DIRECTOR_REQUEST_BUDGET", "15"))
+        BREAKER_FAILURE_THRESHOLD = int(
+            os.getenv("SOLVER_DIRECTOR_BREAKER_FAILURE_THRESHOLD", "5")
+        )
+        BREAKER_RESET_TIMEOUT = float(
+            os.getenv("SOLVER_DIRECTOR_BREAKER_RESET_TIMEOUT", "30")
+        )
+
+    class SolverCache:
+        TTL = float(os.getenv("SOLVER_CACHE_TTL", "300"))
+        NEGATIVE_TTL = float(os.getenv("SOLVER_CACHE_NEGATIVE_TTL", "30"))
+        MAX_SIZE = int(os.getenv("SOLVER_CACHE_MAX_SIZE", "1024"))
+
+    class Kubernetes:
+        MAX_WORKERS = int(os.getenv("KUBERNETES_MAX_WORKERS", "8"))
+        WATCH_TIMEOUT = int(os.getenv("KUBERNETES_WATCH_TIMEOUT", "300"))
+        RESYNC_BACKOFF = float(os.getenv("KUBERNETES_RESYNC_BACKOFF", "5"))
 
     class Controller:
         PROJECT_ID = os.getenv("PROJECT_ID")
@@ -46,3 +103,119 @@ class Config:
         MAX_TOTAL_SOLVER_REPLICAS = int(float(os.getenv("MAX_TOTAL_SOLVER_REPLICAS")))
         PROJECT_SOLVER_RESULT_QUEUE = os.getenv("PROJECT_SOLVER_RESULT_QUEUE")
         SOLVER_TIMEOUT = int(os.getenv("SOLVER_TIMEOUT"))
+        # all: API and dispatch; api: only the HTTP API; dispatcher: dispatch, the leader duties and admin routes
+        ROLE = os.getenv("ROLE", "all")
+        # Fanout exchange carrying admin cache invalidations to every dispatching process
+        INVALIDATION_EXCHANGE = (
+            os.getenv("INVALIDATION_EXCHANGE")
+            or f"project-{os.getenv('PROJECT_ID')}-solver-controller-invalidations"
+        )
+
+    class Leader:
+        # Off: every dispatching process runs the scheduler, reaper and other singleton duties itself,
+        # which is only safe with a single process (one replica and WEB_CONCURRENCY=1)
+        ELECTION = os.getenv("LEADER_ELECTION", "true").lower() == "true"
+        LEASE_NAME = os.getenv("LEADER_LEASE_NAME", "solver-controller-leader")
+        NAMESPACE = os.getenv("POD_NAMESPACE") or os.getenv("SOLVERS_NAMESPACE")
+        IDENTITY = f"{os.getenv('POD_NAME') or socket.gethostname()}-{os.getpid()}"
+        LEASE_DURATION = float(os.getenv("LEADER_LEASE_DURATION", "15"))
+        RENEW_DEADLINE = float(os.getenv("LEADER_RENEW_DEADLINE", "10"))
+        RETRY_PERIOD = float(os.getenv("LEADER_RETRY_PERIOD", "2"))
+
+    class Scheduler:
+        INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "10"))
+        CPU_BUDGET = float(
+            os.getenv("SCHEDULER_CPU_BUDGET", "0")
+        )  # 0: only the replica budget applies
+        MEMORY_BUDGET_GIB = float(os.getenv("SCHEDULER_MEMORY_BUDGET_GIB", "0"))
+
+    class Reaper:
+        IDLE_SECONDS = float(os.getenv("REAPER_IDLE_SECONDS", str(24 * 3600)))
+        INTERVAL = float(os.getenv("REAPER_INTERVAL", "300"))
+        DRY_RUN = os.getenv("REAPER_DRY_RUN", "false").lower() == "true"
+
+    class Prewarm:
+        INTERVAL = float(os.getenv("PREWARM_INTERVAL", "15"))
+        # Arrival rates are averaged over an exponentially decaying window with this half-life
+        HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", "600"))
+        # Messages per second above which a queue keeps a warm replica, and per extra warm replica
+        MIN_RATE = float(os.getenv("PREWARM_MIN_RATE", "0.002"))
+        RATE_PER_REPLICA = float(os.getenv("PREWARM_RATE_PER_REPLICA", "0.05"))
+        MAX_REPLICAS_PER_QUEUE = int(os.getenv("PREWARM_MAX_REPLICAS_PER_QUEUE", "1"))
+        MAX_WARM_REPLICAS = int(
+            os.getenv("PREWARM_MAX_WARM_REPLICAS", "4")
+        )  # 0 disables pre-warming
+        PREPULL = os.getenv("PREWARM_PREPULL", "false").lower() == "true"
+        PREPULL_NAME = os.getenv("PREWARM_PREPULL_NAME", "solver-image-prepull")
+        PAUSE_IMAGE = os.getenv("PREWARM_PAUSE_IMAGE", "registry.k8s.io/pause:3.10")
+        # Supplies the statically linked `true` the solver images run, so they need no binaries of their own
+        TRUE_IMAGE = os.getenv("PREWARM_TRUE_IMAGE", "busybox:1.37-musl")
+
+    class FairShare:
+        # Off: solver messages go straight to their solver queue, in arrival order
+        ENABLED = os.getenv("FAIR_SHARE_ENABLED", "false").lower() == "true"
+        # Weight of each priority level, lowest first; a request's priority is clamped to these levels
+        PRIORITY_WEIGHTS = tuple(
+            int(w)
+            for w in os.getenv("FAIR_SHARE_PRIORITY_WEIGHTS", "1,4,16").split(",")
+        )
+        # Staging queues per priority level and solver queue; submitters are hashed onto them
+        SHARDS = int(os.getenv("FAIR_SHARE_SHARDS", "4"))
+        INTERVAL = float(os.getenv("FAIR_SHARE_INTERVAL", "2"))
+        # How often the forwarder looks for work other replicas staged, since only it forwards
+        SCAN_INTERVAL = float(os.getenv("FAIR_SHARE_SCAN_INTERVAL", "30"))
+
+    class ResultCache:
+        # Off: solvers publish straight to the project result queue and every request is solved
+        ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+        RELAY_QUEUE = (
+            os.getenv("RESULT_CACHE_RELAY_QUEUE")
+            or f"{os.getenv('PROJECT_SOLVER_RESULT_QUEUE')}.relay"
+        )
+        # Fanout exchange on which the process relaying a result passes it on to the other processes
+        RELAYED_EXCHANGE = (
+            os.getenv("RESULT_CACHE_RELAYED_EXCHANGE") or f"{RELAY_QUEUE}.relayed"
+        )
+        TTL = float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))
+        MAX_SIZE = int(os.getenv("RESULT_CACHE_MAX_SIZE", "10000"))
+        MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        PREFETCH_COUNT = int(os.getenv("RESULT_CACHE_PREFETCH_COUNT", "64"))
+
+    class Race:
+        # Off: batches with `race` set run every solver to completion, like plain batches
+        ENABLED = os.getenv("RACE_ENABLED", "false").lower() == "true"
+        # Fanout exchange every solver pod binds to, to hear which races were decided
+        CANCEL_EXCHANGE = (
+            os.getenv("RACE_CANCEL_EXCHANGE")
+            or f"project-{os.getenv('PROJECT_ID')}-solver-cancel"
+        )
+        # Field of a JSON result holding the solver status, and the statuses that end a race
+        STATUS_FIELD = os.getenv("RACE_STATUS_FIELD", "status")
+        FINAL_STATUSES = frozenset(
+            os.getenv(
+                "RACE_FINAL_STATUSES",
+                "OPTIMAL_SOLUTION,ALL_SOLUTIONS,UNSATISFIABLE,UNBOUNDED,UNSAT_OR_UNBOUNDED",
+            ).split(",")
+        )
+
+    class Codec:
+        # Encoding of the messages sent to solvers; control messages are decoded by their own content type
+        SOLVER_CONTENT_TYPE = os.getenv("SOLVER_CONTENT_TYPE", "application/json")
+
+    class Metrics:
+        MAX_SOLVER_LABELS = int(os.getenv("METRICS_MAX_SOLVER_LABELS", "50"))
+
+    class Dispatcher:
+        PREFETCH_COUNT = int(os.getenv("DISPATCHER_PREFETCH_COUNT", "64"))
+        MAX_IN_FLIGHT = int(os.getenv("DISPATCHER_MAX_IN_FLIGHT", "32"))
+        DRAIN_TIMEOUT = float(os.getenv("DISPATCHER_DRAIN_TIMEOUT", "20"))
+
+    class Retry:
+        # Delays of the retry ladder; changing one renames its queue, since a queue's TTL is fixed at declaration
+        DELAYS = tuple(
+            int(delay) for delay in os.getenv("RETRY_DELAYS", "5,30,60").split(",")
+        )
+        # Retries expire up to this fraction of their delay early, so a burst of failures does not come back at once
+        JITTER = float(os.getenv("RETRY_JITTER", "0.2"))
+        THROTTLE_DELAY = float(os.getenv("RETRY_THROTTLE_DELAY", "30"))
+        MAX_REASON_LENGTH = int(os.getenv("RETRY_MAX_REASON_LENGTH", "512"))
@@ -0,0 +1,217 @@
+"""Long-lived client for the solver-director, with a shared connection pool and a circuit breaker"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable, Iterable
+
+import httpx
+
+from src.config import Config
+from src.metrics import DIRECTOR_BREAKER_OPEN, DIRECTOR_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class SolverNotFoundError(Exception):
+    def __init__(self, solver_id: int):
+        super().__init__(f"Solver {solver_id} does not exist in the solver-director")
+        self.solver_id = solver_id
+
+
+class DirectorUnavailableError(Exception):
+    """Raised without contacting the director while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"Solver-director circuit breaker is open, retry in {retry_after:.1f}s"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds a single trial request is let through: success closes the
+    breaker again, failure re-opens it for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self._reset_timeout - self._clock())
+
+    def acquire(self):
+        """Raises DirectorUnavailableError if a request may not be sent right now"""
+        if self._opened_at is None:
+            return
+        if self._trial_in_flight or self.retry_after() > 0:
+            raise DirectorUnavailableError(max(self.retry_after(), 1.0))
+        self._trial_in_flight = True
+
+    def release(self):
+        """Gives up a trial slot without judging the director, e.g. when the request was cancelled"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("Solver-director recovered, closing circuit breaker")
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        DIRECTOR_BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self._failure_threshold:
+            if self._opened_at is None:
+                logger.error(
+                    f"Solver-director failed {self._failures} times in a row, opening circuit breaker"
+                )
+            self._opened_at = self._clock()
+            DIRECTOR_BREAKER_OPEN.set(1)
+
+
+class SolverDirectorClient:
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._bulk_supported = True
+        self.breaker = breaker or CircuitBreaker(
+            Config.SolverDirector.BREAKER_FAILURE_THRESHOLD,
+            Config.SolverDirector.BREAKER_RESET_TIMEOUT,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(
+                    Config.SolverDirector.TIMEOUT,
+                    connect=Config.SolverDirector.CONNECT_TIMEOUT,
+                    pool=Config.SolverDirector.POOL_TIMEOUT,
+                ),
+                limits=httpx.Limits(
+                    max_connections=Config.SolverDirector.MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.SolverDirector.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=Config.SolverDirector.KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        self.breaker.acquire()
+        try:
+            async with asyncio.timeout(Config.SolverDirector.REQUEST_BUDGET):
+                response = await self.client.get(url, **kwargs)
+        except (httpx.TransportError, TimeoutError):
+            DIRECTOR_REQUESTS.labels("error").inc()
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        if response.status_code >= 500:
+            DIRECTOR_REQUESTS.labels("error").inc()
+            self.breaker.record_failure()
+        else:
+            DIRECTOR_REQUESTS.labels("ok").inc()
+            self.breaker.record_success()
+        return response
+
+    async def get_solver(self, solver_id: int) -> tuple[str, str]:
+        response = await self.get(solver_url(solver_id))
+        if response.status_code == 404:
+            raise SolverNotFoundError(solver_id)
+        response.raise_for_status()
+        solver = response.json()
+        return solver["name"], solver["image_path"]
+
+    async def get_solvers(
+        self, solver_ids: Iterable[int]
+    ) -> dict[int, tuple[str, str] | Exception]:
+        """Looks up many solvers at once, mapping each id to its (name, image_path) or the error it hit.
+
+        Uses the director's bulk lookup when available and falls back to parallel pooled requests
+        for any id the bulk response did not cover.
+        """
+        solver_ids = list(dict.fromkeys(solver_ids))
+        results: dict[int, tuple[str, str] | Exception] = {}
+
+        if self._bulk_supported and len(solver_ids) > 1:
+            try:
+                results.update(await self._get_solvers_bulk(solver_ids))
+            # Like the gather below, the error is handed to the caller, once per id, to classify
+            except Exception as e:  # noqa: BLE001
+                return {solver_id: e for solver_id in solver_ids}
+
+        missing = [solver_id for solver_id in solver_ids if solver_id not in results]
+        fetched = await asyncio.gather(
+            *(self.get_solver(solver_id) for solver_id in missing),
+            return_exceptions=True,
+        )
+        results.update(zip(missing, fetched))
+        return results
+
+    async def _get_solvers_bulk(
+        self, solver_ids: list[int]
+    ) -> dict[int, tuple[str, str]]:
+        response = await self.get(
+            Config.SolverDirector.SOLVERS_URL,
+            params={"ids": ",".join(str(solver_id) for solver_id in solver_ids)},
+        )
+        if response.status_code < 500 and response.status_code != 200:
+            solvers = None
+        else:
+            response.raise_for_status()
+            solvers = response.json()
+
+        if not isinstance(solvers, list):
+            logger.info(
+                "Solver-director has no bulk solver lookup, falling back to single lookups"
+            )
+            self._bulk_supported = False
+            return {}
+
+        wanted = set(solver_ids)
+        return {
+            solver["id"]: (solver["name"], solver["image_path"])
+            for solver in solvers
+            if solver.get("id") in wanted
+        }
+
+
+def solver_url(solver_id: int) -> str:
+    return f"{Config.SolverDirector.SOLVERS_URL}/{solver_id}"
+
+
+director = SolverDirectorClient()
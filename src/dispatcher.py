@@ -1,16 +1,55 @@
 from __future__ import annotations
-from dataclasses import asdict, dataclass
-import json
+
+import asyncio
+import copy
 import logging
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
 import aio_pika
-from src.config import Config
-from src.queues import retry_or_dlq
-import httpx
-from kubernetes import client
+from aio_pika.exceptions import PublishError
 from kubernetes.client.rest import ApiException
+
+from src import informer, kube
+from src.amqp import BROKER_ERRORS
+from src.cache import AsyncTTLCache
+from src.codec import Codec, decode_any, encode, negotiate
+from src.config import Config
+from src.director import SolverNotFoundError, director
+from src.errors import ErrorClass, classifier, retry_after
+from src.fairshare import forwarder, lane, observe_queueing, priority_level
+from src.metrics import (
+    DEPLOY_OBJECTS,
+    DISPATCH_MESSAGE_SECONDS,
+    DISPATCH_REQUESTS,
+    EXPIRED_REQUESTS,
+    solver_label,
+    stage,
+)
+from src.prewarm import prewarmer
+from src.publisher import publish, publish_many
+from src.queues import park_or_requeue, retry_many, retry_or_dlq, topology
+from src.race import is_final, races
+from src.reaper import reaper
+from src.results import (
+    CachedResult,
+    relay_enabled,
+    result_key,
+    results,
+    solver_result_queue,
+)
+from src.scheduler import scheduler
 from src.spawner import (
-    create_solver_deployment_manifest,
+    annotated_spec_hash,
+    bucket_shape,
     create_keda_scaled_object_manifest,
+    deployment_name,
+    scaled_object_name,
+    solver_deployment_template,
+    template_update,
 )
 
 
@@ -21,16 +60,66 @@ class InputSolveRequest:
     solver_id: int
     vcpus: int
     memory_gib: float
+    # Higher runs first when fair share is enabled; requests share capacity by submitter, else by problem
+    priority: int = 0
+    submitter: str | None = None
+    # Unix time the request was submitted, taken from the control message when not given
+    submitted_at: float | None = None
+    # Unix time after which nobody waits for the answer, and/or seconds it may take from submission
+    deadline: float | None = None
+    time_budget: float | None = None
+    # Solve even if a result of the same solve is cached, and cache the new result instead
+    bypass_cache: bool = False
+    # Set on the items of a race, which end as soon as one of them has a final result
+    race_id: str | None = None
+
+    @property
+    def fair_key(self) -> str:
+        return self.submitter or f"problem-{self.problem_id}"
 
-    def from_dict(request: dict) -> InputSolveRequest:
-        logger.info(f"request: {request}")
-        return InputSolveRequest(
-            problem_id=request["problem_id"],
-            instance_id=request["instance_id"],
-            solver_id=request["solver_id"],
-            vcpus=request["vcpus"],
-            memory_gib=request["memory_gib"],
-        )
+
+@dataclass
+class InputSolveBatchRequest:
+    """One problem x many instances x many solvers, all with the same resource shape"""
+
+    problem_id: int
+    instance_ids: list[int]
+    solver_ids: list[int]
+    vcpus: int
+    memory_gib: float
+    priority: int = 0
+    submitter: str | None = None
+    submitted_at: float | None = None
+    deadline: float | None = None
+    time_budget: float | None = None
+    bypass_cache: bool = False
+    # Race the solvers on each instance, cancelling the others once one has a final result
+    race: bool = False
+    race_id: str | None = None
+
+    def __post_init__(self):
+        self.solver_ids = list(dict.fromkeys(self.solver_ids))
+
+    def requests(self, solver_id: int) -> list[InputSolveRequest]:
+        return [
+            InputSolveRequest(
+                problem_id=self.problem_id,
+                instance_id=instance_id,
+                solver_id=solver_id,
+                vcpus=self.vcpus,
+                memory_gib=self.memory_gib,
+                priority=self.priority,
+                submitter=self.submitter,
+                submitted_at=self.submitted_at,
+                deadline=self.deadline,
+                time_budget=self.time_budget,
+                bypass_cache=self.bypass_cache,
+                race_id=f"{self.race_id}.{instance_id}"
+                if self.race and self.race_id
+                else None,
+            )
+            for instance_id in self.instance_ids
+        ]
 
 
 @dataclass
@@ -43,6 +132,33 @@ class OutputSolveRequest:
     instance_url: str
 
 
+def expires_at(request: InputSolveRequest | InputSolveBatchRequest) -> float | None:
+    """Unix time the request expires, by its deadline or time budget, whichever comes first"""
+    candidates = [request.deadline]
+    if request.time_budget is not None and request.submitted_at is not None:
+        candidates.append(request.submitted_at + request.time_budget)
+    return min(
+        (candidate for candidate in candidates if candidate is not None), default=None
+    )
+
+
+request_codec = Codec(InputSolveRequest)
+batch_codec = Codec(InputSolveBatchRequest)
+
+
+def decode_control_message(
+    body: bytes, content_type: str | None = None
+) -> InputSolveRequest | InputSolveBatchRequest:
+    """Decodes a single or a batch request, validating every field.
+
+    Batches are told apart by having `instance_ids`.
+    """
+    message = decode_any(body, content_type)
+    if isinstance(message, dict) and "instance_ids" in message:
+        return batch_codec.convert(message)
+    return request_codec.convert(message)
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,26 +174,382 @@ async def start_dispatcher():
         password=Config.RabbitMQ.PASSWORD,
     )
 
+    topology.attach(connection)
+
     async with connection:
-        channel = await connection.channel()
-        queue = await channel.declare_queue(controller_queue, durable=True, arguments={"x-queue-type": "quorum"})
+        # Confirms let each control message be acked only after its forwarded copy is stored,
+        # and returns fail the publish instead of dropping a message no queue took
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        await channel.set_qos(prefetch_count=Config.Dispatcher.PREFETCH_COUNT)
+        queue = await topology.declare(channel, controller_queue, retries=True)
+
+        in_flight: set[asyncio.Task] = set()
+        slots = asyncio.Semaphore(Config.Dispatcher.MAX_IN_FLIGHT)
+        try:
+            async with queue.iterator() as queue_iter:
+                async for message in queue_iter:
+                    await slots.acquire()
+                    task = asyncio.create_task(
+                        handle_message(channel, controller_queue, message)
+                    )
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    task.add_done_callback(lambda _: slots.release())
+        finally:
+            await drain(in_flight)
+
+
+async def handle_message(
+    channel: aio_pika.abc.AbstractRobustChannel,
+    controller_queue: str,
+    message: aio_pika.abc.AbstractIncomingMessage,
+):
+    start = time.perf_counter()
+    kind = "single"
+    solver = "unknown"
+    try:
+        request = decode_control_message(message.body, message.content_type)
+        if request.submitted_at is None:
+            request.submitted_at = (
+                message.timestamp.timestamp() if message.timestamp else time.time()
+            )
+        logger.debug(f"request: {request}")
+        expired = (
+            deadline := expires_at(request)
+        ) is not None and deadline <= time.time()
+        if expired:
+            drop_expired(request)
+        elif isinstance(request, InputSolveBatchRequest):
+            kind = "batch"
+            logger.info(
+                f"Received batch request: problem {request.problem_id}, {len(request.instance_ids)} instance(s) "
+                f"x {len(request.solver_ids)} solver(s), {request.vcpus} vCPUs, {request.memory_gib} GiB"
+            )
+            failures = await process_batch(channel, request)
+            if failures:
+                await retry_many(
+                    channel,
+                    controller_queue,
+                    message.headers,
+                    [
+                        (encode(item, message.content_type), exc)
+                        for item, exc in failures
+                    ],
+                    content_type=message.content_type,
+                )
+        else:
+            logger.info(
+                f"Received request: solver {request.solver_id}, problem {request.problem_id}"
+            )
+            solver = solver_label(request.solver_id)
+            await process_request(channel, request)
+        await message.ack()
+        outcome = "expired" if expired else "acked"
+    # Every failure is classified, and the message retried, parked or dead-lettered accordingly
+    except Exception as e:  # noqa: BLE001
+        if classifier.classify(e) is ErrorClass.THROTTLED:
+            outcome = "parked"
+            if kind == "single":
+                DISPATCH_REQUESTS.labels(solver, "parked").inc()
+            await park(channel, controller_queue, message, e)
+        else:
+            outcome = "retried"
+            if kind == "single":
+                DISPATCH_REQUESTS.labels(solver, "failed").inc()
+            await retry_or_dlq(channel, controller_queue, message, e)
+    DISPATCH_MESSAGE_SECONDS.labels(kind, outcome).observe(time.perf_counter() - start)
+
+
+def drop_expired(request: InputSolveRequest | InputSolveBatchRequest):
+    """Counts a request whose requester no longer waits for the answer; the caller acks it"""
+    if isinstance(request, InputSolveBatchRequest):
+        dropped = len(request.instance_ids) * len(request.solver_ids)
+        for solver_id in request.solver_ids:
+            DISPATCH_REQUESTS.labels(solver_label(solver_id), "expired").inc(
+                len(request.instance_ids)
+            )
+    else:
+        dropped = 1
+        DISPATCH_REQUESTS.labels(solver_label(request.solver_id), "expired").inc()
+    EXPIRED_REQUESTS.labels("dispatch").inc(dropped)
+    logger.info(
+        f"Dropping {dropped} solve request(s) of problem {request.problem_id} past their deadline"
+    )
+
 
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                try:
-                    logger.info("Received request message")
-                    result_data = message.body.decode()
-                    request = InputSolveRequest.from_dict(json.loads(result_data))
-                    await process_request(channel, request)
-                    await message.ack()
-                except Exception as e:
-                    await retry_or_dlq(channel, controller_queue, message, e)
+async def park(
+    channel: aio_pika.abc.AbstractChannel,
+    controller_queue: str,
+    message: aio_pika.abc.AbstractIncomingMessage,
+    exc: Exception,
+):
+    """Hold the message until the throttling dependency may have recovered, without using a retry attempt"""
+    delay = retry_after(exc)
+    logger.warning(f"Parking message for {delay:.1f}s: {exc}")
+    await park_or_requeue(channel, controller_queue, message, delay)
+
+
+async def drain(in_flight: set[asyncio.Task]):
+    """Wait for in-flight requests to finish, cancelling any that outlive the drain timeout.
+
+    Cancelled requests were never acked, so the broker redelivers them once the channel closes.
+    """
+    if not in_flight:
+        return
+
+    logger.info(f"Draining {len(in_flight)} in-flight request(s)")
+    _, pending = await asyncio.wait(
+        set(in_flight), timeout=Config.Dispatcher.DRAIN_TIMEOUT
+    )
+    if pending:
+        logger.warning(
+            f"Cancelling {len(pending)} request(s) still running after drain timeout"
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
 
 async def process_request(
     channel: aio_pika.abc.AbstractRobustChannel, request: InputSolveRequest
 ):
-    solver_name, solver_image_url = await get_solver_info(request.solver_id)
+    solver = solver_label(request.solver_id)
+    with stage("lookup", solver):
+        solver_name, solver_image_url = await get_solver_info(request.solver_id)
+
+    vcpus, memory_gib = bucket_shape(request.vcpus, request.memory_gib)
+    key = solve_key(request, solver_image_url, vcpus, memory_gib)
+    # Only a final result may settle a race, which process_batch checks for all solvers at once
+    if (
+        key is not None
+        and request.race_id is None
+        and (cached := cached_result(request, key)) is not None
+    ):
+        with stage("publish", solver):
+            errors = await results.answer(channel, [cached])
+        if errors[0] is not None:
+            raise errors[0]
+        DISPATCH_REQUESTS.labels(solver, "cached").inc()
+        logger.info(
+            f"Answered request from the result cache: solver {request.solver_id}, instance {request.instance_id}"
+        )
+        return
+
+    solver_message = create_solver_message(request, solver_name, key)
+    queue_name = solver_queue_name(request.solver_id, vcpus, memory_gib)
+    reaper.touch(queue_name)
+    routing_key = staging_queue(queue_name, request)
+    with stage("declare", solver):
+        await topology.ensure(channel, queue_name)
+        if routing_key != queue_name:
+            await topology.ensure(channel, routing_key)
+        if relay_enabled():
+            await topology.ensure(channel, Config.ResultCache.RELAY_QUEUE)
+    with stage("publish", solver):
+        try:
+            await publish(channel, solver_message, routing_key)
+        except PublishError as e:
+            await redeclare(channel, queue_name, routing_key, e)
+            await publish(channel, solver_message, routing_key)
+    delivered(queue_name, routing_key, request, solver_message, key, vcpus)
+    prewarmer.record(queue_name, deployment_name(solver_name, vcpus, memory_gib))
+
+    logger.info(f"Routed message to {queue_name}: {solver_message.body}")
+
+    with stage("deploy", solver):
+        await deploy_solver(
+            solver_name,
+            solver_image_url,
+            Config.Controller.SOLVERS_NAMESPACE,
+            queue_name,
+            solver_result_queue(),
+            Config.Controller.SOLVER_TIMEOUT,
+            vcpus,
+            memory_gib,
+        )
+    DISPATCH_REQUESTS.labels(solver, "routed").inc()
+
+
+async def process_batch(
+    channel: aio_pika.abc.AbstractRobustChannel, batch: InputSolveBatchRequest
+) -> list[tuple[InputSolveRequest, Exception]]:
+    """Fans a batch out to the solver queues, doing the lookup, declare and deploy once per solver.
+
+    Returns the items that could not be forwarded, with the error each one hit.
+    """
+    with stage("lookup", "batch"):
+        solvers = await get_solvers_info(batch.solver_ids)
+    for result in solvers.values():
+        # Nothing is published yet, so the whole batch can be parked as one message
+        if (
+            isinstance(result, Exception)
+            and classifier.classify(result) is ErrorClass.THROTTLED
+        ):
+            for solver_id in solvers:
+                DISPATCH_REQUESTS.labels(solver_label(solver_id), "parked").inc(
+                    len(batch.instance_ids)
+                )
+            raise result
+
+    if batch.race and not Config.Race.ENABLED:
+        logger.warning(
+            "Racing is disabled, running every solver of the batch to completion"
+        )
+        batch.race = False
+    if batch.race and batch.race_id is None:
+        batch.race_id = uuid.uuid4().hex
+
+    vcpus, memory_gib = bucket_shape(batch.vcpus, batch.memory_gib)
+    failures: list[tuple[InputSolveRequest, Exception]] = []
+    hits: list[tuple[InputSolveRequest, CachedResult]] = []
+    # Instances of a race already decided by a cached final result of one of its solvers
+    decided = set()
+    if batch.race:
+        for solver_id, solver in solvers.items():
+            if isinstance(solver, Exception):
+                continue
+            for request in batch.requests(solver_id):
+                if request.instance_id in decided:
+                    continue
+                cached = cached_result(
+                    request, solve_key(request, solver[1], vcpus, memory_gib)
+                )
+                if cached is not None and is_final(
+                    cached.body, cached.properties.get("content_type")
+                ):
+                    hits.append((request, cached))
+                    decided.add(request.instance_id)
+
+    forwarded: list[InputSolveRequest] = []
+    targets: list[tuple[str, str, str | None]] = []
+    messages: list[tuple[aio_pika.Message, str]] = []
+    deploys = []
+    for solver_id, solver in solvers.items():
+        requests = batch.requests(solver_id)
+        if isinstance(solver, Exception):
+            failures.extend((request, solver) for request in requests)
+            continue
+
+        solver_name, solver_image_url = solver
+        keys = {}
+        misses = []
+        for request in requests:
+            key = keys[request.instance_id] = solve_key(
+                request, solver_image_url, vcpus, memory_gib
+            )
+            if batch.race:
+                if request.instance_id not in decided:
+                    misses.append(request)
+            elif (
+                key is not None and (cached := cached_result(request, key)) is not None
+            ):
+                hits.append((request, cached))
+            else:
+                misses.append(request)
+        requests = misses
+        if not requests:
+            continue
+
+        queue_name = solver_queue_name(solver_id, vcpus, memory_gib)
+        reaper.touch(queue_name)
+        # Every item of a batch has the same priority and submitter, so they share a staging queue
+        routing_key = staging_queue(queue_name, requests[0])
+        try:
+            with stage("declare", solver_label(solver_id)):
+                await topology.ensure(channel, queue_name)
+                if routing_key != queue_name:
+                    await topology.ensure(channel, routing_key)
+                if relay_enabled():
+                    await topology.ensure(channel, Config.ResultCache.RELAY_QUEUE)
+        except BROKER_ERRORS as e:
+            failures.extend((request, e) for request in requests)
+            continue
+
+        forwarded.extend(requests)
+        targets.extend(
+            (queue_name, routing_key, keys[request.instance_id]) for request in requests
+        )
+        prewarmer.record(
+            queue_name, deployment_name(solver_name, vcpus, memory_gib), len(requests)
+        )
+        messages.extend(
+            (
+                create_solver_message(request, solver_name, keys[request.instance_id]),
+                routing_key,
+            )
+            for request in requests
+        )
+        deploys.append(
+            deploy_solver(
+                solver_name,
+                solver_image_url,
+                Config.Controller.SOLVERS_NAMESPACE,
+                queue_name,
+                solver_result_queue(),
+                Config.Controller.SOLVER_TIMEOUT,
+                vcpus,
+                memory_gib,
+            )
+        )
+
+    with stage("publish", "batch"):
+        errors = await publish_many(channel, messages)
+        # Items whose queue vanished are published once more; if that fails too, they are retried
+        returned = [
+            i for i, error in enumerate(errors) if isinstance(error, PublishError)
+        ]
+        for (queue_name, routing_key), error in {
+            targets[i][:2]: errors[i] for i in returned
+        }.items():
+            try:
+                await redeclare(channel, queue_name, routing_key, error)
+            except BROKER_ERRORS as e:
+                logger.warning(f"Failed to declare {routing_key} again: {e}")
+        if returned:
+            for i, error in zip(
+                returned, await publish_many(channel, [messages[i] for i in returned])
+            ):
+                errors[i] = error
+    failures.extend(
+        (request, error)
+        for request, error in zip(forwarded, errors)
+        if error is not None
+    )
+    with stage("deploy", "batch"):
+        await asyncio.gather(*deploys)
+
+    for request, (queue_name, routing_key, key), (message, _), error in zip(
+        forwarded, targets, messages, errors
+    ):
+        if error is None:
+            delivered(queue_name, routing_key, request, message, key, vcpus)
+            DISPATCH_REQUESTS.labels(solver_label(request.solver_id), "routed").inc()
+    if hits:
+        with stage("publish", "batch"):
+            answered = await results.answer(channel, [cached for _, cached in hits])
+        for (request, _), error in zip(hits, answered):
+            if error is None:
+                DISPATCH_REQUESTS.labels(
+                    solver_label(request.solver_id), "cached"
+                ).inc()
+            else:
+                failures.append((request, error))
+    for request, _ in failures:
+        DISPATCH_REQUESTS.labels(solver_label(request.solver_id), "failed").inc()
+
+    routed = sum(error is None for error in errors)
+    cached = sum(error is None for error in answered) if hits else 0
+    logger.info(
+        f"Routed {routed} message(s) from batch, answered {cached} from the result cache, {len(failures)} failed"
+    )
+    return failures
+
+
+def create_solver_message(
+    request: InputSolveRequest, solver_name: str, key: str | None = None
+) -> aio_pika.Message:
     solver_request = OutputSolveRequest(
         solver_id=request.solver_id,
         solver_name=solver_name,
@@ -86,33 +558,104 @@ async def process_request(
         problem_url=problem_url(request.problem_id),
         instance_url=instance_url(request.problem_id, request.instance_id),
     )
-    solver_request_body = json.dumps(asdict(solver_request)).encode()
-
-    queue_name = solver_queue_name(request.solver_id, request.vcpus)
-    await channel.declare_queue(queue_name, durable=True, arguments={"x-queue-type": "quorum"})
-    await channel.default_exchange.publish(
-        aio_pika.Message(
-            body=solver_request_body,
-            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-        ),
-        routing_key=queue_name,
+    headers = {
+        "x-submitted-at": request.submitted_at or time.time(),
+        "x-priority": priority_level(request.priority),
+    }
+    if request.race_id:
+        headers["x-race-id"] = request.race_id
+    expiration = None
+    if (deadline := expires_at(request)) is not None:
+        # The broker drops the message once nobody waits for it; solvers stop by the deadline
+        expiration = max(deadline - time.time(), 0.001)
+        headers["x-deadline"] = deadline
+        headers["x-solver-timeout"] = max(
+            1, min(Config.Controller.SOLVER_TIMEOUT, int(expiration))
+        )
+    return aio_pika.Message(
+        body=encode(solver_request, Config.Codec.SOLVER_CONTENT_TYPE),
+        headers=headers,
+        content_type=negotiate(Config.Codec.SOLVER_CONTENT_TYPE),
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        # Quorum queues deliver priorities above 4 ahead of the rest
+        priority=min(max(request.priority, 0), 255) or None,
+        # Solvers copy it onto their result, which is how the relay knows what to cache it as
+        correlation_id=key,
+        expiration=expiration,
     )
 
-    logger.info(f"Routed message to {queue_name}: {solver_request_body}")
 
-    deploy_solver(
-        solver_name,
+def staging_queue(queue_name: str, request: InputSolveRequest) -> str:
+    """Where a solver message is published: its staging queue when fair share is on, else the solver queue"""
+    if not Config.FairShare.ENABLED:
+        return queue_name
+    _, staging = lane(queue_name, request.priority, request.fair_key)
+    return staging
+
+
+async def redeclare(
+    channel: aio_pika.abc.AbstractChannel,
+    queue_name: str,
+    routing_key: str,
+    exc: Exception,
+):
+    """Declares a route's queues again after the broker returned a message sent along it.
+
+    The topology only remembers what this process declared, so it misses queues the reaper of
+    another replica deleted, or deleted between our declare and publish.
+    """
+    logger.warning(f"{routing_key} no longer exists, declaring it again: {exc}")
+    topology.discard(queue_name)
+    topology.discard(routing_key)
+    await topology.ensure(channel, queue_name)
+    if routing_key != queue_name:
+        await topology.ensure(channel, routing_key)
+
+
+def delivered(
+    queue_name: str,
+    routing_key: str,
+    request: InputSolveRequest,
+    message: aio_pika.Message,
+    key: str | None,
+    vcpus: int,
+):
+    if routing_key == queue_name:
+        observe_queueing(message.headers)
+    else:
+        forwarder.staged(queue_name, priority_level(request.priority), routing_key)
+    if key is not None:
+        results.dispatched(key, vcpus)
+    if request.race_id is not None and key is not None:
+        races.add(request.race_id, key, request.solver_id, vcpus)
+
+
+def solve_key(
+    request: InputSolveRequest, solver_image_url: str, vcpus: int, memory_gib: float
+) -> str | None:
+    """The result cache key of the request, or None unless it is cached or raced"""
+    if not Config.ResultCache.ENABLED and request.race_id is None:
+        return None
+    return result_key(
+        request.solver_id,
         solver_image_url,
-        Config.Controller.SOLVERS_NAMESPACE,
-        queue_name,
-        Config.Controller.PROJECT_SOLVER_RESULT_QUEUE,
-        Config.Controller.SOLVER_TIMEOUT,
-        request.vcpus,
-        request.memory_gib,
+        request.problem_id,
+        request.instance_id,
+        vcpus,
+        memory_gib,
     )
 
 
-def deploy_solver(
+def cached_result(request: InputSolveRequest, key: str) -> CachedResult | None:
+    if not Config.ResultCache.ENABLED:
+        return None
+    if request.bypass_cache:
+        results.bypass(key)
+        return None
+    return results.get(key)
+
+
+async def deploy_solver(
     solver_type: str,
     solver_image_url: str,
     solvers_namespace: str,
@@ -122,63 +665,179 @@ def deploy_solver(
     pod_cpu_request: int,
     pod_memory_gib: float,
 ) -> bool:
-    logger.info(f"Deploying solver: {solver_type} in namespace: {solvers_namespace}")
+    name = deployment_name(solver_type, pod_cpu_request, pod_memory_gib)
+    _, digest = solver_deployment_template(
+        solver_type,
+        solvers_namespace,
+        solver_image_url,
+        pod_cpu_request,
+        pod_memory_gib,
+        queue_in_name,
+        queue_out_name,
+        solver_timeout,
+    )
+    # The common case: both objects exist and the Deployment is up to date, so no API call at all
+    current = informer.deployments.get(name)
+    if (
+        current is not None
+        and annotated_spec_hash(current) == digest
+        and scaled_object_name(solver_type, pod_cpu_request, pod_memory_gib)
+        in informer.scaled_objects
+    ):
+        return True
+
+    # Serialize deploys of one solver shape so concurrent messages do not race on the same create
+    async with deploy_lock(name):
+        logger.info(f"Deploying solver: {name} in namespace: {solvers_namespace}")
+        results = await asyncio.gather(
+            ensure_deployment(
+                solver_type,
+                solver_image_url,
+                solvers_namespace,
+                queue_in_name,
+                queue_out_name,
+                solver_timeout,
+                pod_cpu_request,
+                pod_memory_gib,
+            ),
+            ensure_scaled_object(
+                solver_type,
+                solvers_namespace,
+                queue_in_name,
+                pod_cpu_request,
+                pod_memory_gib,
+            ),
+        )
+    return all(results)
 
-    deployment_manifest = create_solver_deployment_manifest(
-        solver_type=solver_type,
-        solvers_namespace=solvers_namespace,
-        solver_image=solver_image_url,
-        pod_cpu_request=pod_cpu_request,
-        pod_memory_gib=pod_memory_gib,
-        queue_in_name=queue_in_name,
-        queue_out_name=queue_out_name,
-        solver_timeout=solver_timeout,
+
+_deploy_locks: dict[str, asyncio.Lock] = {}
+# Deploys holding or waiting for each lock, so it is dropped once the last one is done
+_deploy_lock_users: Counter[str] = Counter()
+
+
+@asynccontextmanager
+async def deploy_lock(name: str):
+    lock = _deploy_locks.setdefault(name, asyncio.Lock())
+    _deploy_lock_users[name] += 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _deploy_lock_users[name] -= 1
+        if not _deploy_lock_users[name]:
+            del _deploy_lock_users[name]
+            del _deploy_locks[name]
+
+
+async def ensure_deployment(
+    solver_type: str,
+    solver_image_url: str,
+    solvers_namespace: str,
+    queue_in_name: str,
+    queue_out_name: str,
+    solver_timeout: int,
+    pod_cpu_request: int,
+    pod_memory_gib: float,
+) -> bool:
+    """Creates the Deployment, or updates it if its spec hash differs from the current manifest's"""
+    name = deployment_name(solver_type, pod_cpu_request, pod_memory_gib)
+    manifest, digest = solver_deployment_template(
+        solver_type,
+        solvers_namespace,
+        solver_image_url,
+        pod_cpu_request,
+        pod_memory_gib,
+        queue_in_name,
+        queue_out_name,
+        solver_timeout,
     )
+    current = informer.deployments.get(name)
+    if current is not None and annotated_spec_hash(current) == digest:
+        return True
 
-    apps_v1 = client.AppsV1Api()
+    deployment_manifest = copy.deepcopy(manifest)
     try:
-        apps_v1.create_namespaced_deployment(
-            namespace=solvers_namespace, body=deployment_manifest
-        )
-        logger.info(f"✓ Created Deployment: solver-{solver_type}")
+        if current is None:
+            try:
+                await kube.call(
+                    "create_deployment",
+                    kube.apps_v1().create_namespaced_deployment,
+                    namespace=solvers_namespace,
+                    body=deployment_manifest,
+                )
+                logger.info(f"✓ Created Deployment: {name}")
+                DEPLOY_OBJECTS.labels("deployment", "created").inc()
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                # Created by someone else and not indexed yet, so its spec is unknown
+                logger.warning(f"⚠ Deployment {name} already exists, updating it")
+                current = {}
+        if current is not None:
+            await kube.call(
+                "patch_deployment",
+                kube.apps_v1().patch_namespaced_deployment,
+                name=name,
+                namespace=solvers_namespace,
+                body=template_update(deployment_manifest),
+                _content_type="application/merge-patch+json",
+            )
+            logger.info(f"✓ Updated Deployment: {name} (spec hash {digest})")
+            DEPLOY_OBJECTS.labels("deployment", "updated").inc()
     except ApiException as e:
-        if e.status == 409:
-            logger.warning(f"⚠ Deployment solver-{solver_type} already exists")
-        else:
-            logger.error(f"✗ Failed to create Deployment: {e}")
-            return False
+        logger.error(f"✗ Failed to apply Deployment: {e}")
+        DEPLOY_OBJECTS.labels("deployment", "error").inc()
+        return False
+    informer.deployments.update(deployment_manifest)
+    return True
+
+
+async def ensure_scaled_object(
+    solver_type: str,
+    solvers_namespace: str,
+    queue_in_name: str,
+    vcpus: int,
+    memory_gib: float,
+) -> bool:
+    name = scaled_object_name(solver_type, vcpus, memory_gib)
+    if name in informer.scaled_objects:
+        return True
 
     scaled_object_manifest = create_keda_scaled_object_manifest(
         solver_type=solver_type,
         solvers_namespace=solvers_namespace,
         queue_name=queue_in_name,
+        vcpus=vcpus,
+        memory_gib=memory_gib,
     )
 
-    custom_api = client.CustomObjectsApi()
     try:
-        custom_api.create_namespaced_custom_object(
+        await kube.call(
+            "create_scaled_object",
+            kube.custom_objects().create_namespaced_custom_object,
             group="keda.sh",
             version="v1alpha1",
             namespace=solvers_namespace,
             plural="scaledobjects",
             body=scaled_object_manifest,
         )
-        logger.info(f"✓ Created ScaledObject: solver-{solver_type}-scaler")
+        logger.info(f"✓ Created ScaledObject: {name}")
         logger.info(f"  Queue: {queue_in_name}")
+        scheduler.request_rebalance()
+        DEPLOY_OBJECTS.labels("scaledobject", "created").inc()
     except ApiException as e:
         if e.status == 409:
-            logger.warning(f"⚠ ScaledObject solver-{solver_type}-scaler already exists")
+            logger.warning(f"⚠ ScaledObject {name} already exists")
+            DEPLOY_OBJECTS.labels("scaledobject", "exists").inc()
         else:
             logger.error(f"✗ Failed to create ScaledObject: {e}")
+            DEPLOY_OBJECTS.labels("scaledobject", "error").inc()
             return False
-
+    informer.scaled_objects.add(scaled_object_manifest)
     return True
 
 
-def solver_url(solver_id: int) -> str:
-    return f"{Config.SolverDirector.SOLVERS_URL}/{solver_id}"
-
-
 def problem_url(problem_id: int) -> str:
     return f"{Config.SolverDirector.PROBLEMS_URL}/{problem_id}/file"
 
@@ -187,18 +846,25 @@ def instance_url(problem_id: int, instance_id: int) -> str:
     return f"{Config.SolverDirector.PROBLEMS_URL}/{problem_id}/instances/{instance_id}/file"
 
 
-async def make_get_request(url: str) -> httpx.Response:
-    timeout = httpx.Timeout(10.0, connect=5.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        return await client.get(url)
+solver_cache = AsyncTTLCache(
+    "solver",
+    director.get_solver,
+    ttl=Config.SolverCache.TTL,
+    max_size=Config.SolverCache.MAX_SIZE,
+    negative_ttl=Config.SolverCache.NEGATIVE_TTL,
+    negative_exceptions=(SolverNotFoundError,),
+)
 
 
 async def get_solver_info(solver_id: int) -> tuple[str, str]:
-    response = await make_get_request(solver_url(solver_id))
-    response.raise_for_status()
-    response = response.json()
-    return response["name"], response["image_path"]
+    return await solver_cache.get(solver_id)
+
+
+async def get_solvers_info(
+    solver_ids: list[int],
+) -> dict[int, tuple[str, str] | Exception]:
+    return await solver_cache.get_many(solver_ids, director.get_solvers)
 
 
-def solver_queue_name(solver_id: int, vcpus: int) -> str:
-    return f"project-{Config.Controller.PROJECT_ID}-solver-{solver_id}-vcpus-{vcpus}"
+def solver_queue_name(solver_id: int, vcpus: int, memory_gib: float) -> str:
+    return f"project-{Config.Controller.PROJECT_ID}-solver-{solver_id}-vcpus-{vcpus}-memory-{memory_gib:g}gib"
@@ -0,0 +1,76 @@
+"""Sorts dispatch failures into the ones worth retrying and the ones that never will succeed.
+
+Permanent errors go straight to the DLQ, transient ones through the retry ladder, and throttling
+errors park the message until the dependency that pushed back is expected to have recovered.
+Other modules register their own exception types on the shared `classifier`.
+"""
+
+import enum
+import logging
+from collections.abc import Callable
+
+import httpx
+
+from src.codec import DecodeError
+from src.config import Config
+from src.director import DirectorUnavailableError, SolverNotFoundError
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorClass(enum.Enum):
+    PERMANENT = "permanent"
+    TRANSIENT = "transient"
+    THROTTLED = "throttled"
+
+
+Rule = ErrorClass | Callable[[BaseException], ErrorClass]
+
+
+class ErrorClassifier:
+    """Classifies an exception by the rule registered for the closest class in its MRO.
+
+    A rule is either an ErrorClass or a function of the exception returning one, for types like
+    HTTP errors whose class depends on the status. Unregistered exceptions are `default`.
+    """
+
+    def __init__(self, default: ErrorClass = ErrorClass.TRANSIENT):
+        self._default = default
+        self._rules: dict[type[BaseException], Rule] = {}
+
+    def register(self, exc_type: type[BaseException], rule: Rule):
+        self._rules[exc_type] = rule
+
+    def classify(self, exc: BaseException) -> ErrorClass:
+        for cls in type(exc).__mro__:
+            if (rule := self._rules.get(cls)) is not None:
+                try:
+                    return rule if isinstance(rule, ErrorClass) else rule(exc)
+                # A broken rule must not keep the message it classifies from being retried or dead-lettered
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(
+                        f"Failed to classify {type(exc).__name__}, treating it as {self._default.value}: {e}"
+                    )
+                    break
+        return self._default
+
+
+def http_status_class(exc: httpx.HTTPStatusError) -> ErrorClass:
+    status = exc.response.status_code
+    if status == 429:
+        return ErrorClass.THROTTLED
+    if 400 <= status < 500 and status != 408:
+        return ErrorClass.PERMANENT
+    return ErrorClass.TRANSIENT
+
+
+def retry_after(exc: BaseException) -> float:
+    """How long to park a message for a throttling error, from the error itself if it says"""
+    return float(getattr(exc, "retry_after", None) or Config.Retry.THROTTLE_DELAY)
+
+
+classifier = ErrorClassifier()
+classifier.register(DecodeError, ErrorClass.PERMANENT)
+classifier.register(SolverNotFoundError, ErrorClass.PERMANENT)
+classifier.register(DirectorUnavailableError, ErrorClass.THROTTLED)
+classifier.register(httpx.HTTPStatusError, http_status_class)
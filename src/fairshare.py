@@ -0,0 +1,288 @@
+"""Meters solve requests into the solver queues by priority and fair share.
+
+Solver queues are FIFO, and solvers consume them directly, so once a 50k-instance sweep is in
+a solver queue everything behind it waits. With FAIR_SHARE_ENABLED the dispatcher stages solver
+messages instead, in one quorum queue per solver queue, priority level and shard (submitters are
+hashed onto the shards). The forwarder keeps each solver queue just deep enough for KEDA to
+scale to its maxReplicaCount, and tops it up from the staging queues by weighted round-robin:
+every round takes up to PRIORITY_WEIGHTS[level] messages from each level, rotating over its shards.
+Staged messages past their deadline are dropped instead of forwarded.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+
+import aio_pika
+
+from src import informer
+from src.amqp import BROKER_ERRORS, channel_pool
+from src.config import Config
+from src.metrics import (
+    EXPIRED_REQUESTS,
+    FAIR_SHARE_PENDING,
+    FAIR_SHARE_QUEUEING_SECONDS,
+)
+from src.publisher import publish_many
+from src.queues import QUORUM
+from src.spawner import trigger_queue_name
+
+logger = logging.getLogger(__name__)
+
+PROPERTIES = (
+    "content_type",
+    "correlation_id",
+    "message_id",
+    "priority",
+    "timestamp",
+    "type",
+)
+
+
+def priority_level(priority: int) -> int:
+    return min(max(priority, 0), len(Config.FairShare.PRIORITY_WEIGHTS) - 1)
+
+
+def lane_name(queue_name: str, level: int, shard: int) -> str:
+    return f"{queue_name}.staged.{level}.{shard}"
+
+
+def lane(queue_name: str, priority: int, fair_key: str) -> tuple[int, str]:
+    """The priority level and staging queue of a request for the solver queue"""
+    level = priority_level(priority)
+    shard = (
+        int(hashlib.sha256(fair_key.encode()).hexdigest()[:8], 16)
+        % Config.FairShare.SHARDS
+    )
+    return level, lane_name(queue_name, level, shard)
+
+
+def lanes(queue_name: str) -> list[tuple[int, str]]:
+    return [
+        (level, lane_name(queue_name, level, shard))
+        for level in range(len(Config.FairShare.PRIORITY_WEIGHTS))
+        for shard in range(Config.FairShare.SHARDS)
+    ]
+
+
+def observe_queueing(headers: dict | None):
+    """Records the queueing delay of a solver message as it reaches its solver queue"""
+    headers = headers or {}
+    if (submitted_at := headers.get("x-submitted-at")) is not None:
+        FAIR_SHARE_QUEUEING_SECONDS.labels(str(headers.get("x-priority", 0))).observe(
+            max(0.0, time.time() - float(submitted_at))
+        )
+
+
+def remaining(headers: dict | None) -> float | None:
+    """Seconds until a solver message's deadline, 0 once it passed, None if it has none"""
+    deadline = (headers or {}).get("x-deadline")
+    if deadline is None:
+        return None
+    left = float(deadline) - time.time()
+    return max(0, left)
+
+
+def copy(message: aio_pika.abc.AbstractIncomingMessage) -> aio_pika.Message:
+    """A staged message to publish again, with what is left of the time to live it was staged with"""
+    return aio_pika.Message(
+        body=message.body,
+        headers=message.headers,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        expiration=remaining(message.headers),
+        **{
+            name: value
+            for name in PROPERTIES
+            if (value := getattr(message, name, None)) is not None
+        },
+    )
+
+
+class FairShareForwarder:
+    def __init__(
+        self,
+        interval: float,
+        scan_interval: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._interval = interval
+        self._scan_interval = scan_interval
+        self._clock = clock
+        self._wakeup: asyncio.Event | None = None
+        # Non-empty staging queues per solver queue and level, rotated as they are served
+        self._active: dict[str, dict[int, deque[str]]] = {}
+        self._scanned_at: float | None = None
+        # Staged messages per solver queue and level, as of the last forwarding round
+        self._pending: dict[str, dict[int, int]] = {}
+
+    def staged(self, queue_name: str, level: int, lane: str):
+        """Called by the dispatcher after staging a message in `lane`"""
+        shards = self._active.setdefault(queue_name, {}).setdefault(level, deque())
+        if lane not in shards:
+            shards.append(lane)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def discard(self, queue_name: str):
+        self._active.pop(queue_name, None)
+        self._pending.pop(queue_name, None)
+
+    def pending(self, queue_name: str) -> int:
+        return sum(self._pending.get(queue_name, {}).values())
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        # Work was staged while another replica was forwarding, so look before the first round
+        self._scanned_at = None
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.forward_all()
+            # The forwarder must keep running whatever a round ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to forward staged solve requests: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._interval)
+            except TimeoutError:
+                pass
+
+    async def forward_all(self) -> int:
+        """Tops up every solver queue with staged work; returns how many messages were forwarded"""
+        targets = {}
+        for name in informer.scaled_objects.names():
+            if (obj := informer.scaled_objects.get(name)) is not None and (
+                queue_name := trigger_queue_name(obj)
+            ):
+                targets[queue_name] = (
+                    obj["spec"].get("maxReplicaCount", 1)
+                    * Config.Solver.QUEUE_LENGTH_PER_REPLICA
+                )
+        if (
+            self._scanned_at is None
+            or self._clock() - self._scanned_at >= self._scan_interval
+        ):
+            # Only work this process staged is announced; other replicas' and older work is found here
+            await asyncio.gather(*(self._scan(queue_name) for queue_name in targets))
+            self._scanned_at = self._clock()
+
+        forwarded = 0
+        for queue_name in list(self._active):
+            forwarded += await self.forward(
+                queue_name, max(targets.get(queue_name, 1), 1)
+            )
+
+        for queue_name in self._pending.keys() - self._active.keys():
+            del self._pending[queue_name]
+        for level in range(len(Config.FairShare.PRIORITY_WEIGHTS)):
+            FAIR_SHARE_PENDING.labels(str(level)).set(
+                sum(counts.get(level, 0) for counts in self._pending.values())
+            )
+        return forwarded
+
+    async def forward(self, queue_name: str, target: int) -> int:
+        """Moves staged messages into the solver queue until it holds `target` ready messages"""
+        async with channel_pool.channel() as channel:
+            solver_queue = await channel.declare_queue(
+                queue_name, durable=True, arguments=QUORUM
+            )
+            room = target - solver_queue.declaration_result.message_count
+
+            levels = self._active.get(queue_name, {})
+            queues = {}
+            pending = {}
+            for level, shards in list(levels.items()):
+                for name in list(shards):
+                    queues[name] = await channel.declare_queue(
+                        name, durable=True, arguments=QUORUM
+                    )
+                    pending[level] = (
+                        pending.get(level, 0)
+                        + queues[name].declaration_result.message_count
+                    )
+
+            batch: list[aio_pika.abc.AbstractIncomingMessage] = []
+            while room > 0 and levels:
+                for level in sorted(levels, reverse=True):
+                    shards = levels[level]
+                    for _ in range(max(1, Config.FairShare.PRIORITY_WEIGHTS[level])):
+                        if room <= 0 or not shards:
+                            break
+                        name = shards[0]
+                        shards.rotate(-1)
+                        if name not in queues:  # Staged while this round was running
+                            queues[name] = await channel.declare_queue(
+                                name, durable=True, arguments=QUORUM
+                            )
+                        message = await queues[name].get(fail=False)
+                        if message is None:
+                            shards.remove(name)
+                            continue
+                        if remaining(message.headers) == 0:
+                            await message.ack()
+                            EXPIRED_REQUESTS.labels("forward").inc()
+                            pending[level] = max(0, pending.get(level, 0) - 1)
+                            continue
+                        batch.append(message)
+                        room -= 1
+                    if not shards:
+                        del levels[level]
+            if not levels:
+                self._active.pop(queue_name, None)
+
+            errors = await publish_many(
+                channel, [(copy(message), queue_name) for message in batch]
+            )
+            failed = []
+            for message, error in zip(batch, errors, strict=True):
+                if error is None:
+                    observe_queueing(message.headers)
+                    await message.ack()
+                    level = priority_level(
+                        int((message.headers or {}).get("x-priority", 0))
+                    )
+                    pending[level] = max(0, pending.get(level, 0) - 1)
+                else:
+                    failed.append(message)
+
+            # A nack would count against the staging queue's x-delivery-limit, and enough failed rounds
+            # would dead-letter the request, so it goes back to the tail of its lane as a copy instead
+            restaged = await publish_many(
+                channel, [(copy(message), message.routing_key) for message in failed]
+            )
+            for message, error in zip(failed, restaged, strict=True):
+                if error is None:
+                    await message.ack()
+                else:
+                    await message.nack(requeue=True)
+                level = priority_level(
+                    int((message.headers or {}).get("x-priority", 0))
+                )
+                self.staged(queue_name, level, message.routing_key)
+
+        self._pending[queue_name] = pending
+        if batch:
+            logger.info(
+                f"Forwarded {errors.count(None)} staged message(s) to {queue_name}"
+            )
+        return errors.count(None)
+
+    async def _scan(self, queue_name: str):
+        for level, name in lanes(queue_name):
+            # Passive declares of missing queues close the channel, so each one gets its own
+            try:
+                async with channel_pool.channel() as channel:
+                    queue = await channel.declare_queue(name, passive=True)
+            except BROKER_ERRORS as e:
+                # Most lanes of a queue were never used, so this is usually NOT_FOUND
+                logger.debug(f"Skipping staging queue {name}: {e}")
+                continue
+            if queue.declaration_result.message_count:
+                self.staged(queue_name, level, name)
+
+
+forwarder = FairShareForwarder(
+    Config.FairShare.INTERVAL, Config.FairShare.SCAN_INTERVAL
+)
@@ -0,0 +1,168 @@
+"""Watch-based in-memory index of the solver Deployments and ScaledObjects in the solvers namespace"""
+
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+from src import kube
+from src.config import Config
+from src.metrics import INFORMER_LAST_SYNC, INFORMER_OBJECTS, INFORMER_STALENESS
+
+logger = logging.getLogger(__name__)
+
+
+class Informer:
+    """Mirrors the objects returned by `list_func` by listing once and then following a watch.
+
+    Objects are kept as plain dicts keyed by name. The watch runs on a daemon thread, since the
+    Kubernetes client is synchronous, and relists whenever the API server expires it (410 Gone).
+    """
+
+    def __init__(self, kind: str, list_func: Callable, **list_kwargs):
+        self.kind = kind
+        self._list_func = list_func
+        self._list_kwargs = list_kwargs
+        self._items: dict[str, dict] = {}
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._watch: watch.Watch | None = None
+        self._last_sync = 0.0
+        INFORMER_STALENESS.labels(kind).set_function(self.staleness)
+
+    @property
+    def synced(self) -> bool:
+        return self._synced.is_set()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, name: str) -> dict | None:
+        return self._items.get(name)
+
+    def names(self) -> list[str]:
+        return list(self._items)
+
+    def staleness(self) -> float:
+        """Seconds since the index was last confirmed up to date by the API server"""
+        if not self._last_sync:
+            return 0.0
+        return time.time() - self._last_sync
+
+    def add(self, obj: dict):
+        """Records an object this controller created, without waiting for the watch to report it"""
+        self._items.setdefault(obj["metadata"]["name"], obj)
+        INFORMER_OBJECTS.labels(self.kind).set(len(self._items))
+
+    def update(self, obj: dict):
+        """Records an object this controller changed, replacing the indexed copy"""
+        self._items[obj["metadata"]["name"]] = obj
+        INFORMER_OBJECTS.labels(self.kind).set(len(self._items))
+
+    def discard(self, name: str):
+        self._items.pop(name, None)
+        INFORMER_OBJECTS.labels(self.kind).set(len(self._items))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"informer-{self.kind}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                resource_version = self._list()
+                while not self._stopped.is_set():
+                    resource_version = self._follow(resource_version)
+            except ApiException as e:
+                if e.status == 410:
+                    logger.info(f"Watch on {self.kind} objects expired, resyncing")
+                    continue
+                logger.warning(
+                    f"Failed to sync {self.kind} objects: {e.status} {e.reason}"
+                )
+            # The index must keep following the API server whatever a sync ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to sync {self.kind} objects: {e}")
+            self._synced.clear()
+            self._stopped.wait(Config.Kubernetes.RESYNC_BACKOFF)
+
+    def _list(self) -> str:
+        response = self._list_func(**self._list_kwargs, _preload_content=False)
+        result = json.loads(response.data)
+        self._items = {item["metadata"]["name"]: item for item in result["items"]}
+        self._mark_synced()
+        logger.info(f"Indexed {len(self._items)} {self.kind} object(s)")
+        return result["metadata"]["resourceVersion"]
+
+    def _follow(self, resource_version: str) -> str:
+        self._watch = watch.Watch()
+        for event in self._watch.stream(
+            self._list_func,
+            **self._list_kwargs,
+            resource_version=resource_version,
+            timeout_seconds=Config.Kubernetes.WATCH_TIMEOUT,
+            allow_watch_bookmarks=True,
+        ):
+            obj = event["raw_object"]
+            resource_version = obj["metadata"]["resourceVersion"]
+            if event["type"] in ("ADDED", "MODIFIED"):
+                self._items[obj["metadata"]["name"]] = obj
+            elif event["type"] == "DELETED":
+                self._items.pop(obj["metadata"]["name"], None)
+            self._mark_synced()
+        # The watch timed out server-side; the index was current up to now.
+        self._mark_synced()
+        return resource_version
+
+    def _mark_synced(self):
+        self._last_sync = time.time()
+        self._synced.set()
+        INFORMER_OBJECTS.labels(self.kind).set(len(self._items))
+        INFORMER_LAST_SYNC.labels(self.kind).set(self._last_sync)
+
+
+def _list_deployments(**kwargs):
+    return kube.apps_v1().list_namespaced_deployment(**kwargs)
+
+
+def _list_scaled_objects(**kwargs):
+    return kube.custom_objects().list_namespaced_custom_object(
+        group="keda.sh", version="v1alpha1", plural="scaledobjects", **kwargs
+    )
+
+
+deployments = Informer(
+    "deployment", _list_deployments, namespace=Config.Controller.SOLVERS_NAMESPACE
+)
+scaled_objects = Informer(
+    "scaledobject", _list_scaled_objects, namespace=Config.Controller.SOLVERS_NAMESPACE
+)
+
+
+def start_informers():
+    deployments.start()
+    scaled_objects.start()
+
+
+def stop_informers():
+    deployments.stop()
+    scaled_objects.stop()
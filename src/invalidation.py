@@ -0,0 +1,127 @@
+"""Admin cache invalidations, applied by every dispatching process.
+
+The solver metadata cache and the result cache live in each process, but an admin request reaches
+one worker of one replica. That process applies the invalidation at once and publishes it to the
+fanout exchange INVALIDATION_EXCHANGE, where every dispatching process has a queue of its own, so
+the other workers and replicas drop the same entries moments later. A process that is not
+listening at that moment (e.g. while it reconnects) keeps its entries until they expire.
+"""
+
+import asyncio
+import logging
+import secrets
+from dataclasses import dataclass
+
+import aio_pika
+
+from src.amqp import BROKER_ERRORS, channel_pool
+from src.codec import JSON, Codec, DecodeError, encode
+from src.config import Config
+from src.dispatcher import solver_cache
+from src.publisher import publish
+from src.results import results
+
+logger = logging.getLogger(__name__)
+
+SOLVER = "solver"
+RESULT = "result"
+
+
+@dataclass
+class Invalidation:
+    cache: str
+    # One solver's entry, or the whole cache if None
+    solver_id: int | None = None
+    # The process that published it, which applied it already
+    origin: str = ""
+
+
+codec = Codec(Invalidation)
+
+
+def apply(invalidation: Invalidation) -> int:
+    """Drops the entries an invalidation names from the caches of this process; returns how many"""
+    if invalidation.cache == RESULT:
+        return results.clear()
+    if invalidation.solver_id is None:
+        return solver_cache.clear()
+    return int(solver_cache.invalidate(invalidation.solver_id))
+
+
+class Invalidator:
+    def __init__(self, exchange_name: str):
+        self._exchange_name = exchange_name
+        self.identity = secrets.token_hex(4)
+
+    async def invalidate(self, cache: str, solver_id: int | None = None) -> int:
+        """Applies an invalidation here and sends it to the other processes; returns the entries dropped here"""
+        invalidation = Invalidation(cache, solver_id, self.identity)
+        count = apply(invalidation)
+        try:
+            async with channel_pool.channel() as channel:
+                exchange = await self._declare(channel)
+                await publish(
+                    channel,
+                    aio_pika.Message(body=encode(invalidation), content_type=JSON),
+                    "",
+                    exchange,
+                    # Nobody bound means no other process is listening
+                    mandatory=False,
+                )
+        except BROKER_ERRORS as e:
+            logger.warning(
+                f"Failed to send a {cache} cache invalidation to the other processes: {e}"
+            )
+        return count
+
+    async def run(self):
+        """Applies the invalidations the other processes send"""
+        while True:
+            try:
+                connection = await channel_pool.connection()
+                channel = await connection.channel()
+                try:
+                    exchange = await self._declare(channel)
+                    queue = await channel.declare_queue(
+                        f"{self._exchange_name}.{self.identity}",
+                        exclusive=True,
+                        auto_delete=True,
+                    )
+                    await queue.bind(exchange)
+                    async with queue.iterator() as queue_iter:
+                        async for message in queue_iter:
+                            self._receive(message.body, message.content_type)
+                            await message.ack()
+                finally:
+                    await channel.close()
+            except asyncio.CancelledError:
+                raise
+            # The listener must keep running whatever it ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(
+                    f"Listener of {self._exchange_name} failed, restarting: {e}"
+                )
+            await asyncio.sleep(Config.Broadcast.RETRY_BACKOFF)
+
+    async def _declare(
+        self, channel: aio_pika.abc.AbstractChannel
+    ) -> aio_pika.abc.AbstractExchange:
+        return await channel.declare_exchange(
+            self._exchange_name, aio_pika.ExchangeType.FANOUT, durable=True
+        )
+
+    def _receive(self, body: bytes, content_type: str | None):
+        try:
+            invalidation = codec.decode(body, content_type)
+        except DecodeError as e:
+            logger.warning(f"Dropping an undecodable cache invalidation: {e}")
+            return
+        if invalidation.origin == self.identity:
+            return
+        count = apply(invalidation)
+        logger.info(
+            f"Invalidated {count} {invalidation.cache} cache entries on request of {invalidation.origin}"
+        )
+
+
+invalidator = Invalidator(Config.Controller.INVALIDATION_EXCHANGE)
@@ -0,0 +1,73 @@
+"""Runs the synchronous Kubernetes client on a bounded thread pool so it never blocks the event loop"""
+
+import asyncio
+import functools
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from src.config import Config
+from src.metrics import KUBERNETES_REQUEST_SECONDS
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.Kubernetes.MAX_WORKERS, thread_name_prefix="kubernetes"
+        )
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+@functools.cache
+def api_client() -> client.ApiClient:
+    # One client for every API group, so connections are reused instead of reopened per call
+    configuration = client.Configuration.get_default_copy()
+    configuration.connection_pool_maxsize = Config.Kubernetes.MAX_WORKERS
+    return client.ApiClient(configuration)
+
+
+def apps_v1() -> client.AppsV1Api:
+    return client.AppsV1Api(api_client())
+
+
+def custom_objects() -> client.CustomObjectsApi:
+    return client.CustomObjectsApi(api_client())
+
+
+def coordination_v1() -> client.CoordinationV1Api:
+    return client.CoordinationV1Api(api_client())
+
+
+async def call(operation: str, func: Callable, *args, **kwargs) -> Any:
+    """Runs `func(*args, **kwargs)` on the Kubernetes thread pool, timing it as `operation`"""
+    loop = asyncio.get_running_loop()
+    outcome = "ok"
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(
+            executor(), functools.partial(func, *args, **kwargs)
+        )
+    except ApiException as e:
+        outcome = str(e.status)
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        KUBERNETES_REQUEST_SECONDS.labels(operation, outcome).observe(
+            time.perf_counter() - start
+        )
@@ -0,0 +1,209 @@
+"""Lease-based leader election, so the singleton duties run in one controller process at a time.
+
+Dispatch scales out as competing consumers on the control queue, but the capacity scheduler,
+reaper, pre-warmer and fair-share forwarder act on every solver in the namespace and must not
+run twice. The process holding the coordination.k8s.io Lease runs them; the others stand by and
+take over once the Lease has gone unrenewed for its duration.
+
+Expiry is judged like client-go does: by how long this process has seen the same Lease record,
+on its own clock, so clock skew between nodes does not matter.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from src import kube
+from src.config import Config
+from src.metrics import LEADER, LEADER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElector:
+    def __init__(
+        self,
+        lease_name: str,
+        namespace: str,
+        identity: str,
+        lease_duration: float,
+        renew_deadline: float,
+        retry_period: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._lease_name = lease_name
+        self._namespace = namespace
+        self.identity = identity
+        self._lease_duration = lease_duration
+        self._renew_deadline = renew_deadline
+        self._retry_period = retry_period
+        self._clock = clock
+        self._observed_version: str | None = None
+        self._observed_at = 0.0
+        self.is_leader = False
+
+    async def run(self, duties: list[Callable[[], Awaitable]]):
+        """Runs the duties while this process is leader, and cancels them as soon as it is not"""
+        tasks: list[asyncio.Task] = []
+        renewed_at: float | None = None
+        try:
+            while True:
+                try:
+                    renewed = await self.try_acquire_or_renew()
+                # Any failure counts as a missed renewal, which the lease duration already allows for
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(
+                        f"Failed to acquire or renew leader Lease {self._lease_name}: {e}"
+                    )
+                    renewed = None
+                if renewed:
+                    renewed_at = self._clock()
+                # A failed renewal is retried until the renew deadline; losing the Lease ends leadership at once
+                leading = renewed or (
+                    renewed is None
+                    and renewed_at is not None
+                    and self._clock() - renewed_at < self._renew_deadline
+                )
+
+                if leading and not tasks:
+                    logger.info(
+                        f"Became leader as {self.identity}, starting {len(duties)} duties"
+                    )
+                    tasks = [asyncio.create_task(duty()) for duty in duties]
+                    self._set_leader(True)
+                elif not leading and tasks:
+                    logger.warning(
+                        f"Lost leadership as {self.identity}, stopping duties"
+                    )
+                    await self._stop(tasks)
+                    tasks = []
+                    renewed_at = None
+                    self._set_leader(False)
+                await asyncio.sleep(self._retry_period)
+        finally:
+            await self._stop(tasks)
+            if self.is_leader:
+                self._set_leader(False)
+                await self.release()
+
+    async def try_acquire_or_renew(self) -> bool:
+        """Takes the Lease if it is free or expired, or renews it if held; False if another process holds it"""
+        api = kube.coordination_v1()
+        now = datetime.now(UTC)
+        try:
+            lease = await kube.call(
+                "read_lease",
+                api.read_namespaced_lease,
+                name=self._lease_name,
+                namespace=self._namespace,
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return await self._create(api, now)
+
+        spec = lease.spec
+        if lease.metadata.resource_version != self._observed_version:
+            self._observed_version = lease.metadata.resource_version
+            self._observed_at = self._clock()
+        if spec.holder_identity != self.identity:
+            duration = spec.lease_duration_seconds or self._lease_duration
+            if spec.holder_identity and self._clock() - self._observed_at < duration:
+                return False
+            logger.info(
+                f"Leader Lease {self._lease_name} of {spec.holder_identity or 'nobody'} expired, taking it"
+            )
+            spec.holder_identity = self.identity
+            spec.acquire_time = now
+            spec.lease_transitions = (spec.lease_transitions or 0) + 1
+        spec.renew_time = now
+        spec.lease_duration_seconds = math.ceil(self._lease_duration)
+        return await self._replace(api, lease)
+
+    async def release(self):
+        """Gives the Lease up on shutdown, so another process need not wait for it to expire"""
+        api = kube.coordination_v1()
+        try:
+            lease = await kube.call(
+                "read_lease",
+                api.read_namespaced_lease,
+                name=self._lease_name,
+                namespace=self._namespace,
+            )
+            if lease.spec.holder_identity == self.identity:
+                lease.spec.holder_identity = None
+                await self._replace(api, lease)
+        # Releasing is a courtesy on the way out; an unreleased Lease simply expires
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Failed to release leader Lease {self._lease_name}: {e}")
+
+    async def _create(self, api: client.CoordinationV1Api, now: datetime) -> bool:
+        lease = client.V1Lease(
+            metadata=client.V1ObjectMeta(
+                name=self._lease_name, namespace=self._namespace
+            ),
+            spec=client.V1LeaseSpec(
+                holder_identity=self.identity,
+                lease_duration_seconds=math.ceil(self._lease_duration),
+                acquire_time=now,
+                renew_time=now,
+                lease_transitions=0,
+            ),
+        )
+        try:
+            await kube.call(
+                "create_lease",
+                api.create_namespaced_lease,
+                namespace=self._namespace,
+                body=lease,
+            )
+        except ApiException as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    async def _replace(
+        self, api: client.CoordinationV1Api, lease: client.V1Lease
+    ) -> bool:
+        # The read resourceVersion makes this a compare-and-swap: a concurrent writer gets 409
+        try:
+            await kube.call(
+                "replace_lease",
+                api.replace_namespaced_lease,
+                name=self._lease_name,
+                namespace=self._namespace,
+                body=lease,
+            )
+        except ApiException as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    def _set_leader(self, leader: bool):
+        self.is_leader = leader
+        LEADER.set(int(leader))
+        LEADER_TRANSITIONS.labels("acquired" if leader else "lost").inc()
+
+    @staticmethod
+    async def _stop(tasks: list[asyncio.Task]):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+elector = LeaderElector(
+    Config.Leader.LEASE_NAME,
+    Config.Leader.NAMESPACE,
+    Config.Leader.IDENTITY,
+    Config.Leader.LEASE_DURATION,
+    Config.Leader.RENEW_DEADLINE,
+    Config.Leader.RETRY_PERIOD,
+)
@@ -1,12 +1,26 @@
-from fastapi import FastAPI
-from contextlib import asynccontextmanager
 import asyncio
 import logging
+from contextlib import asynccontextmanager
+
+import prometheus_fastapi_instrumentator
+from fastapi import FastAPI
 from kubernetes import config
+
+from . import kube
+from .amqp import channel_pool
+from .broadcast import broadcaster
 from .config import Config
-from .routers import health, version, api
+from .director import director
 from .dispatcher import start_dispatcher
-import prometheus_fastapi_instrumentator
+from .fairshare import forwarder
+from .informer import start_informers, stop_informers
+from .invalidation import invalidator
+from .leader import elector
+from .prewarm import prewarmer
+from .reaper import reaper
+from .results import relay_enabled, results
+from .routers import api, health, version
+from .scheduler import scheduler
 
 config.load_incluster_config()
 
@@ -20,9 +34,32 @@ logging.basicConfig(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # deploy_all_solvers()
-    asyncio.create_task(start_dispatcher())
+    # await deploy_all_solvers()
+    tasks = []
+    if Config.Controller.ROLE in ("all", "dispatcher"):
+        start_informers()
+        tasks.append(asyncio.create_task(start_dispatcher()))
+        tasks.append(asyncio.create_task(invalidator.run()))
+        if relay_enabled():
+            tasks.append(asyncio.create_task(results.run()))
+            tasks.append(asyncio.create_task(results.follow()))
+        # Duties acting on the whole namespace, which must run in one process only
+        duties = [scheduler.run, reaper.run, prewarmer.run]
+        if Config.FairShare.ENABLED:
+            duties.append(forwarder.run)
+        if Config.Leader.ELECTION:
+            tasks.append(asyncio.create_task(elector.run(duties)))
+        else:
+            tasks.extend(asyncio.create_task(duty()) for duty in duties)
     yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stop_informers()
+    kube.shutdown()
+    await director.aclose()
+    broadcaster.close()
+    await channel_pool.close()
 
 
 app = FastAPI(
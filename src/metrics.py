@@ -0,0 +1,257 @@
+"""Prometheus metrics for the controller internals, exported on the existing /metrics endpoint"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.config import Config
+
+CACHE_REQUESTS = Counter(
+    "solver_controller_cache_requests_total",
+    "Cache lookups by result (hit, negative_hit, miss, coalesced)",
+    ["cache", "result"],
+)
+CACHE_EVICTIONS = Counter(
+    "solver_controller_cache_evictions_total",
+    "Cache entries removed by reason (expired, lru, invalidated)",
+    ["cache", "reason"],
+)
+CACHE_SIZE = Gauge(
+    "solver_controller_cache_entries",
+    "Number of entries currently held in the cache",
+    ["cache"],
+)
+
+DIRECTOR_REQUESTS = Counter(
+    "solver_controller_director_requests_total",
+    "Requests sent to the solver-director by outcome (ok, error)",
+    ["outcome"],
+)
+DIRECTOR_BREAKER_OPEN = Gauge(
+    "solver_controller_director_circuit_open",
+    "1 while the solver-director circuit breaker is open",
+)
+
+INFORMER_OBJECTS = Gauge(
+    "solver_controller_informer_objects",
+    "Number of objects held in the Kubernetes informer index",
+    ["kind"],
+)
+INFORMER_LAST_SYNC = Gauge(
+    "solver_controller_informer_last_sync_timestamp_seconds",
+    "Unix time the informer index was last confirmed up to date",
+    ["kind"],
+)
+INFORMER_STALENESS = Gauge(
+    "solver_controller_informer_staleness_seconds",
+    "Seconds since the informer index was last confirmed up to date",
+    ["kind"],
+)
+
+KUBERNETES_REQUEST_SECONDS = Histogram(
+    "solver_controller_kubernetes_request_seconds",
+    "Latency of Kubernetes API calls, including time queued for a worker thread",
+    ["operation", "outcome"],
+)
+
+PUBLISH_CONFIRM_SECONDS = Histogram(
+    "solver_controller_publish_confirm_seconds",
+    "Time from publishing a message until the broker confirmed it",
+    ["outcome"],
+)
+PUBLISH_OUTSTANDING = Gauge(
+    "solver_controller_publish_outstanding_confirms",
+    "Messages published but not yet confirmed by the broker",
+)
+
+AMQP_POOL_CHANNELS_IN_USE = Gauge(
+    "solver_controller_amqp_pool_channels_in_use",
+    "Channels of the shared API pool currently handed out",
+)
+AMQP_POOL_CHANNELS_OPEN = Gauge(
+    "solver_controller_amqp_pool_channels_open",
+    "Channels of the shared API pool currently open, in use or idle",
+)
+AMQP_POOL_ACQUIRE_SECONDS = Histogram(
+    "solver_controller_amqp_pool_acquire_seconds",
+    "Time spent waiting for a free channel in the shared API pool",
+)
+AMQP_POOL_TIMEOUTS = Counter(
+    "solver_controller_amqp_pool_timeouts_total",
+    "Channel requests that gave up because the shared API pool stayed saturated",
+)
+
+BROADCAST_SUBSCRIBERS = Gauge(
+    "solver_controller_broadcast_subscribers",
+    "Clients currently subscribed to a streamed result queue",
+)
+BROADCAST_EVENTS = Counter(
+    "solver_controller_broadcast_events_total",
+    "Result messages consumed and fanned out to streaming subscribers",
+)
+BROADCAST_LAGGED = Counter(
+    "solver_controller_broadcast_lagged_total",
+    "Streaming subscribers disconnected because they fell too far behind",
+)
+
+SCHEDULER_MAX_REPLICAS = Gauge(
+    "solver_controller_scheduler_max_replicas",
+    "Replica limit the capacity scheduler assigned to a solver ScaledObject",
+    ["scaled_object"],
+)
+SCHEDULER_WANTED_REPLICAS = Gauge(
+    "solver_controller_scheduler_wanted_replicas",
+    "Replicas a solver queue could use given its backlog and consumers",
+    ["scaled_object"],
+)
+SCHEDULER_REBALANCES = Counter(
+    "solver_controller_scheduler_rebalances_total",
+    "Capacity re-balancing rounds",
+    ["outcome"],
+)
+SCHEDULER_LAST_REBALANCE = Gauge(
+    "solver_controller_scheduler_last_rebalance_timestamp_seconds",
+    "Unix time the solver replica limits were last re-balanced",
+)
+SCHEDULER_STALENESS = Gauge(
+    "solver_controller_scheduler_staleness_seconds",
+    "Seconds since the solver replica limits were last re-balanced",
+)
+
+REAPER_RECLAIMED = Counter(
+    "solver_controller_reaper_reclaimed_total",
+    "Idle solver objects deleted, or that would have been in dry-run mode",
+    ["kind", "mode"],
+)
+REAPER_SWEEPS = Counter(
+    "solver_controller_reaper_sweeps_total",
+    "Idle-solver garbage collection rounds",
+    ["outcome"],
+)
+
+DISPATCH_MESSAGE_SECONDS = Histogram(
+    "solver_controller_dispatch_message_seconds",
+    "Time to handle one control message, by kind (single, batch) and outcome (acked, expired, retried, parked)",
+    ["kind", "outcome"],
+)
+DISPATCH_STAGE_SECONDS = Histogram(
+    "solver_controller_dispatch_stage_seconds",
+    "Time spent in each dispatch stage (lookup, declare, publish, deploy), by solver and outcome",
+    ["stage", "solver", "outcome"],
+)
+DISPATCH_REQUESTS = Counter(
+    "solver_controller_dispatch_requests_total",
+    "Solve requests by solver and outcome (routed, cached, expired, failed, parked)",
+    ["solver", "outcome"],
+)
+DISPATCH_RETRIES = Counter(
+    "solver_controller_dispatch_retries_total",
+    "Failed messages by destination (retry, dlq, requeued) and exception type",
+    ["destination", "exception"],
+)
+DEPLOY_OBJECTS = Counter(
+    "solver_controller_deploy_objects_total",
+    "Solver objects the dispatcher tried to create or update, by kind and outcome (created, updated, exists, error)",
+    ["kind", "outcome"],
+)
+PREWARM_WARM_REPLICAS = Gauge(
+    "solver_controller_prewarm_warm_replicas",
+    "Replicas kept running ahead of expected load, summed over the solver queues",
+)
+PREWARM_ARRIVALS = Counter(
+    "solver_controller_prewarm_arrivals_total",
+    "Messages routed to solver queues, by whether a solver replica was already available (warm, cold)",
+    ["outcome"],
+)
+PREWARM_PREPULL_IMAGES = Gauge(
+    "solver_controller_prewarm_prepull_images",
+    "Solver images the pre-pull DaemonSet keeps on every node",
+)
+FAIR_SHARE_QUEUEING_SECONDS = Histogram(
+    "solver_controller_fair_share_queueing_seconds",
+    "Time from submission until a solve request is forwarded to its solver queue, by priority level",
+    ["priority"],
+    buckets=(0.1, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600),
+)
+FAIR_SHARE_PENDING = Gauge(
+    "solver_controller_fair_share_pending",
+    "Solve requests held in staging queues, by priority level",
+    ["priority"],
+)
+RESULT_CACHE_BYTES = Gauge(
+    "solver_controller_result_cache_bytes",
+    "Size of the result messages held in the result cache",
+)
+RESULT_CACHE_SAVED_VCPU_SECONDS = Counter(
+    "solver_controller_result_cache_saved_vcpu_seconds_total",
+    "Solver vCPU-seconds not spent because a request was answered from the result cache",
+)
+EXPIRED_REQUESTS = Counter(
+    "solver_controller_expired_requests_total",
+    "Solve requests dropped because their deadline passed, by where (dispatch, forward)",
+    ["stage"],
+)
+RACES = Counter(
+    "solver_controller_races_total",
+    "Portfolio races by outcome (won, expired)",
+    ["outcome"],
+)
+RACE_SAVED_SOLVER_SECONDS = Histogram(
+    "solver_controller_race_saved_solver_seconds",
+    "Per won race, solver seconds the cancelled losers would have run until their timeout",
+    buckets=(
+        10,
+        60,
+        300,
+        900,
+        1800,
+        3600,
+        4 * 3600,
+        12 * 3600,
+        24 * 3600,
+        7 * 24 * 3600,
+    ),
+)
+LEADER = Gauge(
+    "solver_controller_leader",
+    "1 while this process holds the leader Lease and runs the singleton duties",
+)
+LEADER_TRANSITIONS = Counter(
+    "solver_controller_leader_transitions_total",
+    "Times this process became leader (acquired) or stopped being leader (lost)",
+    ["transition"],
+)
+
+_solver_labels: set[str] = set()
+
+
+def solver_label(solver_id: int | str) -> str:
+    """Bounds the cardinality of the solver label.
+
+    The first MAX_SOLVER_LABELS solvers seen get a series of their own, later ones share "other".
+    """
+    label = str(solver_id)
+    if label in _solver_labels:
+        return label
+    if len(_solver_labels) < Config.Metrics.MAX_SOLVER_LABELS:
+        _solver_labels.add(label)
+        return label
+    return "other"
+
+
+@contextmanager
+def stage(name: str, solver: str) -> Iterator[None]:
+    """Times the enclosed dispatch stage"""
+    outcome = "ok"
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        DISPATCH_STAGE_SECONDS.labels(name, solver, outcome).observe(
+            time.perf_counter() - start
+        )
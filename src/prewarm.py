@@ -0,0 +1,223 @@
+"""Keeps solver replicas running ahead of expected load, so the first message of a burst skips the cold start.
+
+Each dispatcher records the messages it routes; with several dispatchers sharing the control
+queue, the one running the pre-warmer scales its own rates by their number. Per queue, arrivals
+are averaged into a rate over an exponentially decaying window, and queues above PREWARM_MIN_RATE get a temporary
+`minReplicaCount` on their ScaledObject, busiest first, within PREWARM_MAX_WARM_REPLICAS. Once
+arrivals stop, the rate decays and the ScaledObject goes back to scaling from zero.
+
+Optionally a DaemonSet pre-pulls every known solver image onto every node.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from kubernetes.client.rest import ApiException
+
+from src import informer, kube
+from src.amqp import BROKER_ERRORS, channel_pool
+from src.config import Config
+from src.metrics import PREWARM_ARRIVALS, PREWARM_PREPULL_IMAGES, PREWARM_WARM_REPLICAS
+from src.scheduler import queue_demand
+from src.spawner import (
+    annotated_spec_hash,
+    create_prepull_daemonset_manifest,
+    template_update,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArrivalRate:
+    rate: float = 0.0
+    updated_at: float = 0.0
+
+
+async def dispatchers() -> int:
+    """Dispatchers consuming the control queue, which split the arrivals about evenly"""
+    try:
+        async with channel_pool.channel() as channel:
+            queue = await channel.declare_queue(
+                Config.Controller.CONTROL_QUEUE, passive=True
+            )
+    except BROKER_ERRORS:
+        return 1
+    return max(1, queue.declaration_result.consumer_count)
+
+
+class Prewarmer:
+    def __init__(
+        self,
+        interval: float,
+        half_life: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._interval = interval
+        self._half_life = half_life
+        self._clock = clock
+        self._rates: dict[str, ArrivalRate] = {}
+        self._prepull_hash: str | None = None
+        self.warm: dict[str, int] = {}
+
+    def record(self, queue_name: str, deployment: str, count: int = 1):
+        """Counts messages routed to a queue, and whether a replica of its solver was already available"""
+        now = self._clock()
+        arrivals = self._rates.setdefault(queue_name, ArrivalRate(updated_at=now))
+        # Each arrival adds a decaying impulse; their sum averages to the arrival rate
+        arrivals.rate = (
+            self._decayed(arrivals, now) + count * math.log(2) / self._half_life
+        )
+        arrivals.updated_at = now
+
+        obj = informer.deployments.get(deployment)
+        available = ((obj or {}).get("status") or {}).get("availableReplicas") or 0
+        PREWARM_ARRIVALS.labels("warm" if available else "cold").inc(count)
+
+    def rate(self, queue_name: str) -> float:
+        """Messages per second recently routed to the queue"""
+        arrivals = self._rates.get(queue_name)
+        return self._decayed(arrivals, self._clock()) if arrivals else 0.0
+
+    def _decayed(self, arrivals: ArrivalRate, now: float) -> float:
+        return arrivals.rate * 0.5 ** ((now - arrivals.updated_at) / self._half_life)
+
+    async def run(self):
+        while True:
+            try:
+                await self.adjust()
+                if Config.Prewarm.PREPULL:
+                    await self.prepull()
+            # The pre-warmer must keep running whatever a round ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to pre-warm solvers: {e}")
+            await asyncio.sleep(self._interval)
+
+    async def adjust(self) -> dict[str, int]:
+        """Sets the minReplicaCount of every solver ScaledObject from its queue's arrival rate.
+
+        Returns the warm replicas per ScaledObject.
+        """
+        scaled_objects = {
+            name: informer.scaled_objects.get(name)
+            for name in informer.scaled_objects.names()
+        }
+        demands = [
+            demand
+            for obj in scaled_objects.values()
+            if obj is not None and (demand := queue_demand(obj)) is not None
+        ]
+        # Every dispatcher records only the messages it handled itself
+        share = await dispatchers()
+        rates = {
+            demand.queue_name: self.rate(demand.queue_name) * share
+            for demand in demands
+        }
+        budget = Config.Prewarm.MAX_WARM_REPLICAS
+        warm = {}
+        for demand in sorted(demands, key=lambda d: rates[d.queue_name], reverse=True):
+            rate = rates[demand.queue_name]
+            replicas = 0
+            if rate >= Config.Prewarm.MIN_RATE:
+                replicas = min(
+                    max(1, math.ceil(rate / Config.Prewarm.RATE_PER_REPLICA)),
+                    Config.Prewarm.MAX_REPLICAS_PER_QUEUE,
+                    # KEDA rejects a minimum above the maximum the capacity scheduler set
+                    scaled_objects[demand.scaled_object]["spec"].get(
+                        "maxReplicaCount", 1
+                    ),
+                    budget,
+                )
+            budget -= replicas
+            warm[demand.scaled_object] = replicas
+
+        await asyncio.gather(
+            *(
+                self._apply(
+                    scaled_objects[name], max(replicas, Config.Solver.MIN_REPLICAS)
+                )
+                for name, replicas in warm.items()
+                if scaled_objects[name]["spec"].get("minReplicaCount", 0)
+                != max(replicas, Config.Solver.MIN_REPLICAS)
+            )
+        )
+
+        # Forget queues whose solver is gone
+        for queue_name in self._rates.keys() - {
+            demand.queue_name for demand in demands
+        }:
+            del self._rates[queue_name]
+        self.warm = {name: replicas for name, replicas in warm.items() if replicas}
+        PREWARM_WARM_REPLICAS.set(sum(self.warm.values()))
+        return self.warm
+
+    async def _apply(self, scaled_object: dict, min_replicas: int):
+        name = scaled_object["metadata"]["name"]
+        try:
+            await kube.call(
+                "patch_scaled_object",
+                kube.custom_objects().patch_namespaced_custom_object,
+                group="keda.sh",
+                version="v1alpha1",
+                namespace=Config.Controller.SOLVERS_NAMESPACE,
+                plural="scaledobjects",
+                name=name,
+                body={"spec": {"minReplicaCount": min_replicas}},
+            )
+        except ApiException as e:
+            logger.warning(
+                f"Failed to set minReplicaCount of {name}: {e.status} {e.reason}"
+            )
+            return
+        logger.info(f"Set minReplicaCount of {name} to {min_replicas}")
+        # Keep the index current until the watch reports the change
+        scaled_object["spec"]["minReplicaCount"] = min_replicas
+
+    async def prepull(self):
+        """Creates or updates the pre-pull DaemonSet when the set of solver images changed"""
+        images = sorted(
+            {
+                container["image"]
+                for name in informer.deployments.names()
+                if (obj := informer.deployments.get(name)) is not None
+                and obj["metadata"].get("labels", {}).get("app") == "minizinc-solver"
+                for container in obj["spec"]["template"]["spec"]["containers"]
+            }
+        )
+        manifest = create_prepull_daemonset_manifest(
+            Config.Controller.SOLVERS_NAMESPACE, images
+        )
+        if annotated_spec_hash(manifest) == self._prepull_hash:
+            return
+
+        name = manifest["metadata"]["name"]
+        namespace = Config.Controller.SOLVERS_NAMESPACE
+        try:
+            await kube.call(
+                "create_daemon_set",
+                kube.apps_v1().create_namespaced_daemon_set,
+                namespace=namespace,
+                body=manifest,
+            )
+            logger.info(f"Created pre-pull DaemonSet {name} for {len(images)} image(s)")
+        except ApiException as e:
+            if e.status != 409:
+                raise
+            await kube.call(
+                "patch_daemon_set",
+                kube.apps_v1().patch_namespaced_daemon_set,
+                name=name,
+                namespace=namespace,
+                body=template_update(manifest),
+                _content_type="application/merge-patch+json",
+            )
+            logger.info(f"Updated pre-pull DaemonSet {name} to {len(images)} image(s)")
+        self._prepull_hash = annotated_spec_hash(manifest)
+        PREWARM_PREPULL_IMAGES.set(len(images))
+
+
+prewarmer = Prewarmer(Config.Prewarm.INTERVAL, Config.Prewarm.HALF_LIFE)
@@ -0,0 +1,61 @@
+"""Publishing on confirm-mode channels, with many publishes in flight at once.
+
+Every publish resolves only once the broker has confirmed it, so callers ack their source
+message after the forwarded copy is safely stored. Concurrent callers share the channel, so
+their publishes are pipelined instead of waiting one broker round trip each.
+"""
+
+import asyncio
+import time
+from collections.abc import Iterable
+
+import aio_pika
+
+from src.config import Config
+from src.metrics import PUBLISH_CONFIRM_SECONDS, PUBLISH_OUTSTANDING
+
+
+async def publish(
+    channel: aio_pika.abc.AbstractChannel,
+    message: aio_pika.Message,
+    routing_key: str,
+    exchange: aio_pika.abc.AbstractExchange | None = None,
+    mandatory: bool = True,
+):
+    """Publishes to `exchange`, by default the default exchange, and waits for the broker confirm.
+
+    Raises if the broker nacks the message, returns it as unroutable (unless not `mandatory`), or
+    the confirm does not arrive in time. Returns only raise on channels opened with
+    `on_return_raises=True`; aio-pika's default silently drops them.
+    """
+    PUBLISH_OUTSTANDING.inc()
+    start = time.perf_counter()
+    outcome = "ack"
+    try:
+        await (exchange or channel.default_exchange).publish(
+            message,
+            routing_key=routing_key,
+            mandatory=mandatory,
+            timeout=Config.RabbitMQ.CONFIRM_TIMEOUT,
+        )
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        PUBLISH_OUTSTANDING.dec()
+        PUBLISH_CONFIRM_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+
+
+async def publish_many(
+    channel: aio_pika.abc.AbstractChannel,
+    messages: Iterable[tuple[aio_pika.Message, str]],
+) -> list[BaseException | None]:
+    """Publishes all (message, routing_key) pairs at once and waits for every confirm.
+
+    Returns, per message, None if it was confirmed or the exception it failed with.
+    """
+    results = await asyncio.gather(
+        *(publish(channel, message, routing_key) for message, routing_key in messages),
+        return_exceptions=True,
+    )
+    return [result if isinstance(result, BaseException) else None for result in results]
@@ -1,13 +1,24 @@
+import asyncio
 import logging
+import random
+from collections import defaultdict
+from datetime import UTC, datetime
+
 import aio_pika
 
+from src.config import Config
+from src.errors import ErrorClass, classifier
+from src.metrics import DISPATCH_RETRIES
+from src.publisher import publish, publish_many
+
 logger = logging.getLogger(__name__)
 
-RETRY_DELAYS = [5, 30, 60]
+RETRY_DELAYS = Config.Retry.DELAYS
+QUORUM = {"x-queue-type": "quorum"}
 
 
 async def declare_quorum_queue(channel, name: str) -> aio_pika.abc.AbstractQueue:
-    queue = await channel.declare_queue(name, durable=True, arguments={"x-queue-type": "quorum"})
+    queue = await channel.declare_queue(name, durable=True, arguments=QUORUM)
     for delay in RETRY_DELAYS:
         await channel.declare_queue(
             f"{name}.retry.{delay}s",
@@ -19,32 +30,199 @@ async def declare_quorum_queue(channel, name: str) -> aio_pika.abc.AbstractQueue
                 "x-dead-letter-routing-key": name,
             },
         )
-    await channel.declare_queue(f"{name}.dlq", durable=True, arguments={"x-queue-type": "quorum"})
+    # Parked messages expire one by one after their own delay, back into the queue
+    await channel.declare_queue(
+        f"{name}.parked",
+        durable=True,
+        arguments={
+            "x-queue-type": "quorum",
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": name,
+        },
+    )
+    await channel.declare_queue(f"{name}.dlq", durable=True, arguments=QUORUM)
     return queue
 
 
-async def retry_or_dlq(channel, queue_name: str, message: aio_pika.abc.AbstractIncomingMessage, exc: Exception):
-    attempt = int((message.headers or {}).get("x-attempt", 0))
-    headers = {**dict(message.headers or {}), "x-attempt": attempt + 1}
+class Topology:
+    """Remembers which queues have been declared on the current connection, so each is declared once.
+
+    The memory is dropped when the robust connection reconnects, since the broker may have lost
+    the queues in the meantime.
+    """
+
+    def __init__(self):
+        self._declared: set[str] = set()
+        self._locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def attach(self, connection: aio_pika.abc.AbstractRobustConnection):
+        self._declared.clear()
+        connection.reconnect_callbacks.add(self._on_reconnect)
+
+    def _on_reconnect(self, *args):
+        logger.info("AMQP connection re-established, forgetting declared topology")
+        self._declared.clear()
+
+    def discard(self, name: str):
+        self._declared.discard(name)
+        self._declared.discard(f"{name}.dlq")
+
+    async def declare(
+        self, channel, name: str, retries: bool = False
+    ) -> aio_pika.abc.AbstractQueue:
+        """Declares the queue, and its retry queues and DLQ if `retries` is set"""
+        if retries:
+            queue = await declare_quorum_queue(channel, name)
+            self._declared.update(f"{name}.retry.{delay}s" for delay in RETRY_DELAYS)
+            self._declared.update((f"{name}.parked", f"{name}.dlq"))
+        else:
+            queue = await channel.declare_queue(name, durable=True, arguments=QUORUM)
+        self._declared.add(name)
+        return queue
+
+    async def ensure(self, channel, name: str, retries: bool = False):
+        """Declares the queue unless that already happened on this connection"""
+        key = f"{name}.dlq" if retries else name
+        if key in self._declared:
+            return
+        async with self._locks[name]:
+            if key not in self._declared:
+                await self.declare(channel, name, retries)
+
+
+topology = Topology()
+
+
+def retry_route(
+    queue_name: str, headers: dict | None, exc: Exception
+) -> tuple[str, dict, float | None]:
+    """Picks the next retry queue (or the DLQ) for a failed message.
+
+    Returns it with the updated headers and the message expiration in seconds. Permanent errors
+    skip the ladder; the error is recorded in the headers either way.
+    """
+    error_class = classifier.classify(exc)
+    attempt = int((headers or {}).get("x-attempt", 0))
+    headers = {
+        **dict(headers or {}),
+        "x-attempt": attempt + 1,
+        "x-error-class": error_class.value,
+        "x-error-type": type(exc).__name__,
+        "x-error": str(exc)[: Config.Retry.MAX_REASON_LENGTH],
+    }
+
+    if error_class is ErrorClass.PERMANENT:
+        logger.error(f"Message failed with a permanent error, routing to DLQ: {exc}")
+        DISPATCH_RETRIES.labels("dlq", type(exc).__name__).inc()
+        return f"{queue_name}.dlq", headers, None
 
     if attempt < len(RETRY_DELAYS):
         delay = RETRY_DELAYS[attempt]
-        routing_key = f"{queue_name}.retry.{delay}s"
-        logger.warning(f"Retrying message (attempt {attempt + 1}/{len(RETRY_DELAYS)}, delay {delay}s): {exc}")
-    else:
-        routing_key = f"{queue_name}.dlq"
-        logger.error(f"Message failed after {len(RETRY_DELAYS)} attempts, routing to DLQ: {exc}")
+        # Expiring early within the queue's TTL spreads retries out without redeclaring the queue
+        expiration = delay * (1 - Config.Retry.JITTER * random.random())  # nosec B311
+        logger.warning(
+            f"Retrying message (attempt {attempt + 1}/{len(RETRY_DELAYS)}, delay {expiration:.1f}s): {exc}"
+        )
+        DISPATCH_RETRIES.labels("retry", type(exc).__name__).inc()
+        return f"{queue_name}.retry.{delay}s", headers, expiration
+
+    logger.error(
+        f"Message failed after {len(RETRY_DELAYS)} attempts, routing to DLQ: {exc}"
+    )
+    DISPATCH_RETRIES.labels("dlq", type(exc).__name__).inc()
+    return f"{queue_name}.dlq", headers, None
+
+
+async def retry_or_dlq(
+    channel,
+    queue_name: str,
+    message: aio_pika.abc.AbstractIncomingMessage,
+    exc: Exception,
+):
+    routing_key, headers, expiration = retry_route(queue_name, message.headers, exc)
 
     try:
-        await channel.default_exchange.publish(
+        await topology.ensure(channel, queue_name, retries=True)
+        await publish(
+            channel,
             aio_pika.Message(
                 body=message.body,
                 headers=headers,
+                content_type=message.content_type,
+                # Deadlines count from the first submission, so retries keep it (or the first receipt)
+                timestamp=message.timestamp or datetime.now(UTC),
+                expiration=expiration,
                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
             ),
-            routing_key=routing_key,
+            routing_key,
         )
         await message.ack()
     except Exception:
         logger.exception("Failed to publish to retry/DLQ, requeueing original message")
+        DISPATCH_RETRIES.labels("requeued", type(exc).__name__).inc()
         await message.nack(requeue=True)
+
+
+async def park_or_requeue(
+    channel,
+    queue_name: str,
+    message: aio_pika.abc.AbstractIncomingMessage,
+    delay: float,
+):
+    """Sends a message back to its queue after `delay` seconds, without using a retry attempt.
+
+    The message waits in the queue's parking queue. Unlike a nack with requeue, this does not
+    count against the delivery limit of the quorum queue.
+    """
+    try:
+        await topology.ensure(channel, queue_name, retries=True)
+        await publish(
+            channel,
+            aio_pika.Message(
+                body=message.body,
+                headers=dict(message.headers or {}),
+                content_type=message.content_type,
+                timestamp=message.timestamp or datetime.now(UTC),
+                expiration=delay,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            f"{queue_name}.parked",
+        )
+        await message.ack()
+    except Exception:
+        logger.exception("Failed to park message, requeueing it")
+        await message.nack(requeue=True)
+
+
+async def retry_many(
+    channel,
+    queue_name: str,
+    headers: dict | None,
+    failures: list[tuple[bytes, Exception]],
+    content_type: str | None = None,
+):
+    """Routes each failed item of a batch through the retry ladder as a message of its own.
+
+    Raises if any of them could not be published, in which case the batch itself must be retried.
+    """
+    await topology.ensure(channel, queue_name, retries=True)
+    messages = []
+    for body, exc in failures:
+        routing_key, item_headers, expiration = retry_route(queue_name, headers, exc)
+        messages.append(
+            (
+                aio_pika.Message(
+                    body=body,
+                    headers=item_headers,
+                    content_type=content_type,
+                    expiration=expiration,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                ),
+                routing_key,
+            )
+        )
+    errors = [
+        error for error in await publish_many(channel, messages) if error is not None
+    ]
+    if errors:
+        raise errors[0]
@@ -0,0 +1,154 @@
+"""Portfolio races: one instance, several solvers, and the first final answer cancels the rest.
+
+A batch with `race` set runs each of its instances as a race between its solvers. The dispatcher
+registers the solve key of every solver message it routed for a race, and the result relay
+reports every result it passes on. The first result whose status is final (an optimal solution,
+unsatisfiability, ...) wins, and a cancel message naming the race goes to the fanout exchange
+RACE_CANCEL_EXCHANGE. Every running solver pod listens there, so the losers stop their run and
+skip queued messages of the race. Pods bind when they start, so a pod started after the race was
+decided does not know and runs its messages of the race anyway.
+
+Races are tracked in the process that dispatched them. The result relay passes every result on
+to the other dispatching processes (see src.results), so the race ends in its process whichever
+controller replica relays the winning result.
+"""
+
+import logging
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import aio_pika
+
+from src.codec import Codec, DecodeError, encode, negotiate
+from src.config import Config
+from src.metrics import RACE_SAVED_SOLVER_SECONDS, RACES
+from src.publisher import publish
+
+logger = logging.getLogger(__name__)
+
+result_codec = Codec(dict)
+
+
+@dataclass
+class RaceCancel:
+    race_id: str
+    winner_solver_id: int
+    solver_ids: list[int]
+
+
+@dataclass
+class Race:
+    race_id: str
+    started_at: float
+    vcpus: int
+    # Solver id by solve key, one per solver message routed for the race
+    solvers: dict[str, int] = field(default_factory=dict)
+
+
+def is_final(body: bytes, content_type: str | None = None) -> bool:
+    """Whether a solver result ends its race; results that are not a mapping never do"""
+    try:
+        result = result_codec.decode(body, content_type)
+    except DecodeError:
+        return False
+    return result.get(Config.Race.STATUS_FIELD) in Config.Race.FINAL_STATUSES
+
+
+class RaceTracker:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._races: dict[str, Race] = {}
+        # Races by solve key; two races of the same instance and solver share their result
+        self._keys: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._races)
+
+    def add(self, race_id: str, key: str, solver_id: int, vcpus: int):
+        """Registers a solver message routed for the race, starting the race with the first one"""
+        self._expire()
+        race = self._races.get(race_id)
+        if race is None:
+            race = self._races[race_id] = Race(race_id, self._clock(), vcpus)
+        race.solvers[key] = solver_id
+        self._keys.setdefault(key, set()).add(race_id)
+
+    async def result(
+        self,
+        channel: aio_pika.abc.AbstractChannel,
+        key: str,
+        body: bytes,
+        content_type: str | None = None,
+    ) -> list[str]:
+        """Ends the races a result wins and cancels their losers; returns the ids of those races"""
+        if key not in self._keys or not is_final(body, content_type):
+            return []
+        won = []
+        for race_id in sorted(self._keys[key]):
+            race = self._forget(race_id)
+            await self.cancel(channel, race, key)
+            won.append(race_id)
+        return won
+
+    async def cancel(
+        self, channel: aio_pika.abc.AbstractChannel, race: Race, winner_key: str
+    ):
+        winner = race.solvers[winner_key]
+        losers = [
+            solver_id for key, solver_id in race.solvers.items() if key != winner_key
+        ]
+        elapsed = self._clock() - race.started_at
+        # Every loser would otherwise have run until its timeout
+        saved = len(losers) * max(0.0, Config.Controller.SOLVER_TIMEOUT - elapsed)
+        RACES.labels("won").inc()
+        RACE_SAVED_SOLVER_SECONDS.observe(saved)
+        logger.info(
+            f"Race {race.race_id} won by solver {winner} after {elapsed:.0f}s, "
+            f"cancelling {len(losers)} solver(s) and saving about {saved:.0f} solver-seconds"
+        )
+        if not losers:
+            return
+
+        exchange = await channel.declare_exchange(
+            Config.Race.CANCEL_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True
+        )
+        await publish(
+            channel,
+            aio_pika.Message(
+                body=encode(
+                    RaceCancel(race.race_id, winner, losers),
+                    Config.Codec.SOLVER_CONTENT_TYPE,
+                ),
+                headers={"x-race-id": race.race_id},
+                content_type=negotiate(Config.Codec.SOLVER_CONTENT_TYPE),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            "",
+            exchange,
+            # Nobody bound means no solver pod is running, so there is nothing to stop
+            mandatory=False,
+        )
+
+    def _forget(self, race_id: str) -> Race:
+        race = self._races.pop(race_id)
+        for key in race.solvers:
+            races = self._keys.get(key, set())
+            races.discard(race_id)
+            if not races:
+                self._keys.pop(key, None)
+        return race
+
+    def _expire(self):
+        # By twice the solver timeout, every solver of a race nobody won has finished or given up
+        deadline = self._clock() - 2 * Config.Controller.SOLVER_TIMEOUT
+        for race_id in [
+            race_id
+            for race_id, race in self._races.items()
+            if race.started_at < deadline
+        ]:
+            self._forget(race_id)
+            RACES.labels("expired").inc()
+
+
+races = RaceTracker()
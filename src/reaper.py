@@ -0,0 +1,189 @@
+"""Deletes the ScaledObjects, Deployments and queues of solver shapes nobody used for a while.
+
+Last use is tracked in memory: the dispatcher touches a queue whenever it routes work to it,
+and every sweep counts ready, consumed or staged messages and running solver pods as use, which
+also covers work routed by other controller replicas. Queues are first seen as freshly
+used, so a controller restart can only delay reaping, never hasten it.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from kubernetes.client.rest import ApiException
+
+from src import informer, kube
+from src.amqp import BROKER_ERRORS, channel_pool
+from src.config import Config
+from src.fairshare import forwarder, lanes
+from src.metrics import REAPER_RECLAIMED, REAPER_SWEEPS
+from src.queues import topology
+from src.scheduler import QueueDemand, measure, queue_demand
+
+logger = logging.getLogger(__name__)
+
+
+class Reaper:
+    def __init__(
+        self,
+        idle_seconds: float,
+        interval: float,
+        dry_run: bool,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._idle_seconds = idle_seconds
+        self._interval = interval
+        self.dry_run = dry_run
+        self._clock = clock
+        self._last_used: dict[str, float] = {}
+        # Queues a dry run reported as reapable since their last use, so each is reported once
+        self._reported: set[str] = set()
+
+    def touch(self, queue_name: str):
+        self._last_used[queue_name] = self._clock()
+        self._reported.discard(queue_name)
+
+    def idle_for(self, queue_name: str) -> float:
+        return self._clock() - self._last_used.setdefault(queue_name, self._clock())
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+                REAPER_SWEEPS.labels("ok").inc()
+            # The reaper must keep running whatever a sweep ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to reap idle solvers: {e}")
+                REAPER_SWEEPS.labels("error").inc()
+            await asyncio.sleep(self._interval)
+
+    async def sweep(self) -> list[str]:
+        """Reaps every solver whose queue has been idle for longer than the idle window.
+
+        Returns the names of the reaped ScaledObjects. A dry run returns and counts each idle solver
+        once, until it is used again.
+        """
+        demands = [
+            demand
+            for name in informer.scaled_objects.names()
+            if (obj := informer.scaled_objects.get(name)) is not None
+            and (demand := queue_demand(obj)) is not None
+        ]
+        exists = await asyncio.gather(*(measure(demand) for demand in demands))
+
+        reaped = []
+        for demand, queue_exists in zip(demands, exists):
+            if (
+                demand.backlog
+                or demand.consumers
+                or forwarder.pending(demand.queue_name)
+                or self._running(demand)
+            ):
+                self.touch(demand.queue_name)
+            if self.idle_for(demand.queue_name) < self._idle_seconds:
+                continue
+            if await self._reap(demand, queue_exists):
+                reaped.append(demand.scaled_object)
+
+        # Forget queues whose solver is gone, whoever removed it
+        for queue_name in self._last_used.keys() - {
+            demand.queue_name for demand in demands
+        }:
+            del self._last_used[queue_name]
+            self._reported.discard(queue_name)
+        return reaped
+
+    @staticmethod
+    def _running(demand: QueueDemand) -> bool:
+        """Whether the solver has pods, e.g. because another controller replica just routed work to it"""
+        scaled_object = informer.scaled_objects.get(demand.scaled_object)
+        deployment = scaled_object and informer.deployments.get(
+            scaled_object["spec"]["scaleTargetRef"]["name"]
+        )
+        return bool(((deployment or {}).get("status") or {}).get("replicas"))
+
+    async def _reap(self, demand: QueueDemand, queue_exists: bool) -> bool:
+        scaled_object = informer.scaled_objects.get(demand.scaled_object)
+        if scaled_object is None:
+            return False
+        deployment = scaled_object["spec"]["scaleTargetRef"]["name"]
+
+        if self.dry_run:
+            if demand.queue_name in self._reported:
+                return False
+            logger.info(
+                f"Would reap idle solver {deployment} and queue {demand.queue_name} (dry run)"
+            )
+            for kind in ("scaledobject", "deployment") + (
+                ("queue",) if queue_exists else ()
+            ):
+                REAPER_RECLAIMED.labels(kind, "dry_run").inc()
+            self._reported.add(demand.queue_name)
+            return True
+
+        logger.info(f"Reaping idle solver {deployment} and queue {demand.queue_name}")
+        # The queue goes first: if work arrived in the meantime the delete fails and the solver stays
+        if queue_exists:
+            topology.discard(demand.queue_name)
+            try:
+                async with channel_pool.channel() as channel:
+                    queue = await channel.declare_queue(demand.queue_name, passive=True)
+                    await queue.delete(if_unused=True, if_empty=True)
+            except BROKER_ERRORS as e:
+                logger.info(
+                    f"Keeping solver {deployment}, its queue is in use again: {e}"
+                )
+                self.touch(demand.queue_name)
+                return False
+            REAPER_RECLAIMED.labels("queue", "deleted").inc()
+        if Config.FairShare.ENABLED:
+            await self._delete_staging_queues(demand.queue_name)
+
+        await self._delete(
+            "scaledobject",
+            demand.scaled_object,
+            kube.custom_objects().delete_namespaced_custom_object,
+            group="keda.sh",
+            version="v1alpha1",
+            plural="scaledobjects",
+        )
+        informer.scaled_objects.discard(demand.scaled_object)
+        await self._delete(
+            "deployment", deployment, kube.apps_v1().delete_namespaced_deployment
+        )
+        informer.deployments.discard(deployment)
+        self._last_used.pop(demand.queue_name, None)
+        return True
+
+    async def _delete_staging_queues(self, queue_name: str):
+        forwarder.discard(queue_name)
+        for _, name in lanes(queue_name):
+            topology.discard(name)
+            # Each passive declare gets its own channel, since a missing queue closes it
+            try:
+                async with channel_pool.channel() as channel:
+                    queue = await channel.declare_queue(name, passive=True)
+                    await queue.delete(if_unused=True, if_empty=True)
+            except BROKER_ERRORS as e:
+                # Missing, or holding messages a new deployment of the queue will forward
+                logger.debug(f"Kept staging queue {name}: {e}")
+
+    async def _delete(self, kind: str, name: str, func: Callable, **kwargs):
+        try:
+            await kube.call(
+                f"delete_{kind}",
+                func,
+                name=name,
+                namespace=Config.Controller.SOLVERS_NAMESPACE,
+                **kwargs,
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+        REAPER_RECLAIMED.labels(kind, "deleted").inc()
+
+
+reaper = Reaper(
+    Config.Reaper.IDLE_SECONDS, Config.Reaper.INTERVAL, Config.Reaper.DRY_RUN
+)
@@ -0,0 +1,159 @@
+"""Moves dead-lettered messages back onto their queue at a controlled rate.
+
+    python -m src.replay control --rate 5 --limit 100
+    python -m src.replay control --error-class transient  # leave permanent failures in the DLQ
+
+Replayed messages start the retry ladder afresh. Messages that do not match the filter (and, on a
+dry run, all of them) go back to the tail of the DLQ as they are looked at, and a run stops after
+the messages the DLQ held when it started, so each one is looked at only once per run.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import aio_pika
+
+from src.config import Config
+from src.errors import ErrorClass
+from src.publisher import publish
+
+logger = logging.getLogger(__name__)
+
+ERROR_HEADERS = ("x-attempt", "x-error-class", "x-error-type", "x-error")
+PROPERTIES = (
+    "content_type",
+    "correlation_id",
+    "message_id",
+    "priority",
+    "reply_to",
+    "timestamp",
+    "type",
+)
+
+
+async def move(
+    channel: aio_pika.abc.AbstractChannel,
+    message: aio_pika.abc.AbstractIncomingMessage,
+    headers: dict,
+    routing_key: str,
+):
+    """Publishes a copy of the message and acks the original once the copy is confirmed"""
+    properties = {
+        name: value
+        for name in PROPERTIES
+        if (value := getattr(message, name, None)) is not None
+    }
+    try:
+        await publish(
+            channel,
+            aio_pika.Message(
+                body=message.body,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                **properties,
+            ),
+            routing_key,
+        )
+    except Exception:
+        await message.nack(requeue=True)
+        raise
+    await message.ack()
+
+
+async def replay(
+    channel: aio_pika.abc.AbstractChannel,
+    queue_name: str,
+    rate: float,
+    limit: int | None = None,
+    error_class: str | None = None,
+    dry_run: bool = False,
+) -> int:
+    """Republishes up to `limit` messages from the queue's DLQ, at most `rate` per second.
+
+    Each message is acked from the DLQ only after its copy is confirmed. Returns how many
+    messages were replayed (or, on a dry run, would have been).
+    """
+    dlq = await channel.declare_queue(f"{queue_name}.dlq", passive=True)
+    # Messages put back go behind these, so the run ends once it has seen them all
+    unseen = dlq.declaration_result.message_count
+    interval = 1 / rate if rate > 0 else 0.0
+    next_at = time.monotonic()
+    put_back = 0
+    replayed = 0
+    while unseen > 0 and (limit is None or replayed < limit):
+        message = await dlq.get(fail=False)
+        if message is None:
+            break
+        unseen -= 1
+        headers = dict(message.headers or {})
+        matches = error_class is None or headers.get("x-error-class") == error_class
+        if dry_run or not matches:
+            await move(channel, message, headers, dlq.name)
+            put_back += 1
+            replayed += dry_run and matches
+            continue
+
+        if (delay := next_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        next_at = max(next_at, time.monotonic()) + interval
+
+        for name in ERROR_HEADERS:
+            headers.pop(name, None)
+        headers["x-replayed"] = int(headers.get("x-replayed", 0)) + 1
+        await move(channel, message, headers, queue_name)
+        replayed += 1
+    logger.info(
+        f"Replayed {replayed} message(s) from {queue_name}.dlq, left {put_back} in place"
+    )
+    return replayed
+
+
+async def run(args: argparse.Namespace) -> int:
+    connection = await aio_pika.connect_robust(
+        host=Config.RabbitMQ.HOST,
+        port=Config.RabbitMQ.PORT,
+        login=Config.RabbitMQ.USER,
+        password=Config.RabbitMQ.PASSWORD,
+    )
+    async with connection:
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        return await replay(
+            channel, args.queue, args.rate, args.limit, args.error_class, args.dry_run
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "queue",
+        nargs="?",
+        default=Config.Controller.CONTROL_QUEUE,
+        help="Queue whose DLQ to replay",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=10, help="Messages per second, 0 for unlimited"
+    )
+    parser.add_argument("--limit", type=int, help="Replay at most this many messages")
+    parser.add_argument(
+        "--error-class", choices=[c.value for c in ErrorClass], help="Only replay these"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Count the matching messages without replaying them",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    replayed = asyncio.run(run(args))
+    print(f"{'Would replay' if args.dry_run else 'Replayed'} {replayed} message(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""Answers repeated solve requests from the results of earlier solves.
+
+With RESULT_CACHE_ENABLED, solvers publish their results to a relay queue instead of the project
+result queue. The relay forwards every result to the project result queue and keeps the last one
+of each solve, keyed by a digest of the solver and its image, the problem, the instance and the
+resource shape. The dispatcher sends that key as the correlation id of the solver message, and
+solvers copy it onto their results; results without one are forwarded but not cached.
+
+A request whose key is cached is answered by publishing the cached result to the project result
+queue, without running a solver. Requests with `bypass_cache` are always solved, and their
+result replaces the cached one.
+
+Portfolio races (see src.race) and result streams (see src.broadcast) need the relay too, to see
+results as they arrive.
+
+The cache and the races live in each dispatching process, while the processes of all replicas
+compete for the relay queue. So the process that relays a result with a solve key also publishes
+it to the fanout exchange RELAYED_EXCHANGE, where every dispatching process has a queue of its own:
+each caches the result, and the one that dispatched a race ends it. A process that is not listening
+at that moment (e.g. while it reconnects) misses the result, and its races run to their timeout.
+"""
+
+import asyncio
+import hashlib
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import aio_pika
+
+from src.amqp import BROKER_ERRORS, channel_pool
+from src.broadcast import broadcast_exchange
+from src.config import Config
+from src.metrics import (
+    CACHE_EVICTIONS,
+    CACHE_REQUESTS,
+    CACHE_SIZE,
+    RESULT_CACHE_BYTES,
+    RESULT_CACHE_SAVED_VCPU_SECONDS,
+)
+from src.publisher import publish, publish_many
+from src.queues import QUORUM
+from src.race import RaceTracker, races
+
+logger = logging.getLogger(__name__)
+
+PROPERTIES = ("content_type", "correlation_id", "message_id", "timestamp", "type")
+# Names the process that relayed a result on the copies passed on to the others
+RELAYED_BY = "x-relayed-by"
+
+
+def result_key(
+    solver_id: int,
+    image: str,
+    problem_id: int,
+    instance_id: int,
+    vcpus: int,
+    memory_gib: float,
+) -> str:
+    """Content address of a solve; `vcpus` and `memory_gib` are the bucketed shape"""
+    return hashlib.sha256(
+        f"{solver_id}|{image}|{problem_id}|{instance_id}|{vcpus}|{memory_gib:g}".encode()
+    ).hexdigest()
+
+
+def relay_enabled() -> bool:
+    return Config.ResultCache.ENABLED or Config.Race.ENABLED or Config.Broadcast.ENABLED
+
+
+def solver_result_queue() -> str:
+    """Where solvers publish their results"""
+    if relay_enabled():
+        return Config.ResultCache.RELAY_QUEUE
+    return Config.Controller.PROJECT_SOLVER_RESULT_QUEUE
+
+
+@dataclass
+class CachedResult:
+    body: bytes
+    headers: dict
+    properties: dict = field(default_factory=dict)
+    expires_at: float = 0.0
+    # Estimated solver vCPU-seconds the result took, saved again by every hit
+    cost: float = 0.0
+
+
+class ResultCache:
+    """Result messages by solve key, with TTL expiry and LRU eviction by count and total size"""
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+        tracker: RaceTracker | None = None,
+    ):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict[str, CachedResult] = OrderedDict()
+        self._bytes = 0
+        # When each recent solve was dispatched and with how many vCPUs, to estimate its cost
+        self._dispatched: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        # The result stream exchange, as declared on the channel it was last used on
+        self._broadcast: (
+            tuple[aio_pika.abc.AbstractChannel, aio_pika.abc.AbstractExchange] | None
+        ) = None
+        self._races = tracker if tracker is not None else races
+        self.identity = secrets.token_hex(4)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> CachedResult | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= self._clock():
+            self._remove(key, "expired")
+            entry = None
+        if entry is None:
+            CACHE_REQUESTS.labels("result", "miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels("result", "hit").inc()
+        return entry
+
+    def bypass(self, key: str):
+        """Drops the cached result of a request that asked to be solved again"""
+        CACHE_REQUESTS.labels("result", "bypass").inc()
+        if key in self._entries:
+            self._remove(key, "invalidated")
+
+    def dispatched(self, key: str, vcpus: int):
+        self._dispatched[key] = (self._clock(), vcpus)
+        self._dispatched.move_to_end(key)
+        while len(self._dispatched) > self._max_size:
+            self._dispatched.popitem(last=False)
+
+    def put(self, key: str, body: bytes, headers: dict, properties: dict):
+        """Stores a solve's result, replacing any earlier result of the same solve"""
+        previous = self._entries.get(key)
+        cost = previous.cost if previous is not None else 0.0
+        if (dispatched := self._dispatched.get(key)) is not None:
+            started_at, vcpus = dispatched
+            cost = (
+                min(self._clock() - started_at, Config.Controller.SOLVER_TIMEOUT)
+                * vcpus
+            )
+        if previous is not None:
+            self._remove(key, None)
+        if len(body) > self._max_bytes:
+            return
+
+        self._entries[key] = CachedResult(
+            body, headers, properties, self._clock() + self._ttl, cost
+        )
+        self._bytes += len(body)
+        while len(self._entries) > self._max_size or self._bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)), "lru")
+        self._observe()
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        CACHE_EVICTIONS.labels("result", "invalidated").inc(count)
+        self._observe()
+        return count
+
+    def _remove(self, key: str, reason: str | None):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        if reason is not None:
+            CACHE_EVICTIONS.labels("result", reason).inc()
+        self._observe()
+
+    def _observe(self):
+        CACHE_SIZE.labels("result").set(len(self._entries))
+        RESULT_CACHE_BYTES.set(self._bytes)
+
+    async def answer(
+        self, channel: aio_pika.abc.AbstractChannel, hits: list[CachedResult]
+    ) -> list[BaseException | None]:
+        """Publishes cached results to the project result queue; returns per hit None or the error it failed with"""
+        messages = [
+            aio_pika.Message(
+                body=hit.body,
+                headers={**hit.headers, "x-cached": True},
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                **hit.properties,
+            )
+            for hit in hits
+        ]
+        errors = await publish_many(
+            channel,
+            [
+                (message, Config.Controller.PROJECT_SOLVER_RESULT_QUEUE)
+                for message in messages
+            ],
+        )
+        await self.broadcast(
+            channel,
+            [message for message, error in zip(messages, errors) if error is None],
+        )
+        RESULT_CACHE_SAVED_VCPU_SECONDS.inc(
+            sum(hit.cost for hit, error in zip(hits, errors) if error is None)
+        )
+        return errors
+
+    async def broadcast(
+        self, channel: aio_pika.abc.AbstractChannel, messages: list[aio_pika.Message]
+    ):
+        """Copies results to the result streams, if they are enabled"""
+        if not Config.Broadcast.ENABLED or not messages:
+            return
+        try:
+            if self._broadcast is None or self._broadcast[0] is not channel:
+                exchange = await channel.declare_exchange(
+                    broadcast_exchange(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE),
+                    aio_pika.ExchangeType.FANOUT,
+                    durable=True,
+                )
+                self._broadcast = (channel, exchange)
+            # Nobody bound means nobody is streaming
+            await asyncio.gather(
+                *(
+                    publish(channel, message, "", self._broadcast[1], mandatory=False)
+                    for message in messages
+                )
+            )
+        except BROKER_ERRORS as e:
+            # The results themselves are safely stored; a stream only misses a live update
+            logger.warning(f"Failed to copy results to the result streams: {e}")
+
+    async def run(self):
+        """Relays solver results from the relay queue to the project result queue, caching them on the way"""
+        while True:
+            try:
+                connection = await channel_pool.connection()
+                channel = await connection.channel(
+                    publisher_confirms=True, on_return_raises=True
+                )
+                try:
+                    await channel.set_qos(
+                        prefetch_count=Config.ResultCache.PREFETCH_COUNT
+                    )
+                    queue = await channel.declare_queue(
+                        Config.ResultCache.RELAY_QUEUE, durable=True, arguments=QUORUM
+                    )
+                    async with queue.iterator() as queue_iter:
+                        async for message in queue_iter:
+                            await self.relay(channel, message)
+                finally:
+                    await channel.close()
+            except asyncio.CancelledError:
+                raise
+            # The relay must keep running whatever it ran into, or results pile up unrelayed
+            except Exception as e:  # noqa: BLE001
+                logger.warning(
+                    f"Relay of {Config.ResultCache.RELAY_QUEUE} failed, restarting: {e}"
+                )
+            await asyncio.sleep(Config.Broadcast.RETRY_BACKOFF)
+
+    async def relay(
+        self,
+        channel: aio_pika.abc.AbstractChannel,
+        message: aio_pika.abc.AbstractIncomingMessage,
+    ):
+        headers = dict(message.headers or {})
+        properties = {
+            name: value
+            for name in PROPERTIES
+            if (value := getattr(message, name, None)) is not None
+        }
+        result = aio_pika.Message(
+            body=message.body,
+            headers=headers,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            **properties,
+        )
+        try:
+            await publish(
+                channel, result, Config.Controller.PROJECT_SOLVER_RESULT_QUEUE
+            )
+        except Exception:
+            await message.nack(requeue=True)
+            raise
+        await self.broadcast(channel, [result])
+        if message.correlation_id:
+            await self.relayed(
+                channel, message.correlation_id, message.body, headers, properties
+            )
+            try:
+                exchange = await self._declare_relayed(channel)
+                await publish(
+                    channel,
+                    aio_pika.Message(
+                        body=message.body,
+                        headers={**headers, RELAYED_BY: self.identity},
+                        **properties,
+                    ),
+                    "",
+                    exchange,
+                    # Nobody bound means no other process is listening
+                    mandatory=False,
+                )
+            except BROKER_ERRORS as e:
+                # The result itself is safely relayed; the other processes only miss a cache entry or a race
+                logger.warning(
+                    f"Failed to pass a relayed result on to the other processes: {e}"
+                )
+        await message.ack()
+
+    async def relayed(
+        self,
+        channel: aio_pika.abc.AbstractChannel,
+        key: str,
+        body: bytes,
+        headers: dict,
+        properties: dict,
+    ):
+        """Caches a relayed result and ends the races of this process it wins"""
+        if Config.ResultCache.ENABLED:
+            self.put(key, body, headers, properties)
+        try:
+            await self._races.result(channel, key, body, properties.get("content_type"))
+        except BROKER_ERRORS as e:
+            # The result itself is safely relayed; losing a cancellation only costs solver time
+            logger.warning(f"Failed to cancel the losers of a race: {e}")
+
+    async def follow(self):
+        """Takes in the results the other processes relay"""
+        while True:
+            try:
+                connection = await channel_pool.connection()
+                channel = await connection.channel()
+                try:
+                    exchange = await self._declare_relayed(channel)
+                    queue = await channel.declare_queue(
+                        f"{Config.ResultCache.RELAYED_EXCHANGE}.{self.identity}",
+                        exclusive=True,
+                        auto_delete=True,
+                    )
+                    await queue.bind(exchange)
+                    async with queue.iterator() as queue_iter:
+                        async for message in queue_iter:
+                            headers = dict(message.headers or {})
+                            if (
+                                headers.pop(RELAYED_BY, None) != self.identity
+                                and message.correlation_id
+                            ):
+                                properties = {
+                                    name: value
+                                    for name in PROPERTIES
+                                    if (value := getattr(message, name, None))
+                                    is not None
+                                }
+                                async with channel_pool.channel() as publish_channel:
+                                    await self.relayed(
+                                        publish_channel,
+                                        message.correlation_id,
+                                        message.body,
+                                        headers,
+                                        properties,
+                                    )
+                            await message.ack()
+                finally:
+                    await channel.close()
+            except asyncio.CancelledError:
+                raise
+            # The listener must keep running whatever it ran into
+            except Exception as e:  # noqa: BLE001
+                logger.warning(
+                    f"Listener of {Config.ResultCache.RELAYED_EXCHANGE} failed, restarting: {e}"
+                )
+            await asyncio.sleep(Config.Broadcast.RETRY_BACKOFF)
+
+    async def _declare_relayed(
+        self, channel: aio_pika.abc.AbstractChannel
+    ) -> aio_pika.abc.AbstractExchange:
+        return await channel.declare_exchange(
+            Config.ResultCache.RELAYED_EXCHANGE,
+            aio_pika.ExchangeType.FANOUT,
+            durable=True,
+        )
+
+
+results = ResultCache(
+    Config.ResultCache.TTL, Config.ResultCache.MAX_SIZE, Config.ResultCache.MAX_BYTES
+)
@@ -1,6 +1,9 @@
 from fastapi import APIRouter
-from . import routes
+
+from . import admin, routes, stream
 
 router = APIRouter()
 
 router.include_router(routes.router)
+router.include_router(stream.router)
+router.include_router(admin.router, prefix="/admin")
@@ -0,0 +1,114 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel, Field
+
+from src.config import Config
+from src.invalidation import RESULT, SOLVER, invalidator
+from src.leader import elector
+from src.scheduler import scheduler
+
+
+def dispatching():
+    """The caches and the scheduler the admin routes act on exist in dispatching processes only"""
+    if Config.Controller.ROLE not in ("all", "dispatcher"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Admin routes are served by dispatching processes, not by ROLE={Config.Controller.ROLE}",
+        )
+
+
+router = APIRouter(dependencies=[Depends(dispatching)])
+
+
+class InvalidateResponse(BaseModel):
+    invalidated: int = Field(
+        ...,
+        description="Number of cache entries removed by the process serving the request; "
+        "every other dispatching process removes the same entries from its own cache",
+    )
+
+
+@router.delete(
+    "/solvers/cache",
+    response_model=InvalidateResponse,
+    summary="Invalidate all cached solver metadata",
+)
+async def invalidate_solver_cache():
+    """
+    Drop every cached solver lookup, so the next request refetches from the solver-director.
+    """
+    return InvalidateResponse(invalidated=await invalidator.invalidate(SOLVER))
+
+
+@router.delete(
+    "/solvers/{solver_id}/cache",
+    response_model=InvalidateResponse,
+    summary="Invalidate the cached metadata of a solver",
+)
+async def invalidate_solver(solver_id: int):
+    """
+    Drop the cached lookup of a solver, e.g. after its image was updated.
+    """
+    return InvalidateResponse(
+        invalidated=await invalidator.invalidate(SOLVER, solver_id)
+    )
+
+
+@router.delete(
+    "/results/cache",
+    response_model=InvalidateResponse,
+    summary="Invalidate all cached solve results",
+)
+async def invalidate_result_cache():
+    """
+    Drop every cached solve result, so repeated requests are solved again.
+    """
+    return InvalidateResponse(invalidated=await invalidator.invalidate(RESULT))
+
+
+class AllocationResponse(BaseModel):
+    scaled_object: str = Field(..., description="Solver ScaledObject")
+    queue_name: str = Field(..., description="Queue it scales on")
+    vcpus: float = Field(..., description="vCPUs requested per replica")
+    memory_gib: float = Field(..., description="Memory requested per replica")
+    backlog: int = Field(..., description="Ready messages at the last re-balance")
+    wanted: int = Field(..., description="Replicas the queue could use")
+    max_replicas: int = Field(
+        ..., description="Replica limit assigned to the ScaledObject"
+    )
+
+
+class CapacityResponse(BaseModel):
+    max_total_replicas: int = Field(
+        ..., description="Replica budget shared by all solvers"
+    )
+    last_rebalance: float = Field(
+        ..., description="Unix time of the last re-balance, 0 if none yet"
+    )
+    allocations: list[AllocationResponse] = Field(default_factory=list)
+
+
+@router.get(
+    "/capacity",
+    response_model=CapacityResponse,
+    summary="Show how the replica budget is divided across solvers",
+)
+def get_capacity():
+    """
+    Allocation decisions of the capacity scheduler's last re-balance. With leader election, only
+    the leader runs the scheduler; other processes answer 409.
+    """
+    if Config.Leader.ELECTION and not elector.is_leader:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The capacity scheduler runs in the leader process, and this is not it",
+        )
+    return CapacityResponse(
+        max_total_replicas=Config.Controller.MAX_TOTAL_SOLVER_REPLICAS,
+        last_rebalance=scheduler.last_rebalance,
+        allocations=[
+            AllocationResponse(**asdict(allocation))
+            for allocation in scheduler.allocations
+        ],
+    )
@@ -1,7 +1,16 @@
-from fastapi import APIRouter, Query
-from pydantic import BaseModel, Field
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Annotated
+
 import aio_pika
-from aio_pika.exceptions import QueueEmpty
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.amqp import channel_pool
+from src.codec import as_text
 from src.config import Config
 
 router = APIRouter()
@@ -9,35 +18,223 @@ router = APIRouter()
 
 class StatusResponse(BaseModel):
     isFinished: bool = Field(..., description="Is it finished generating data")
-    messages: list[str] = Field(default_factory=list, description="Messages from queue")
+    messages: list[str] = Field(
+        default_factory=list,
+        description="Messages from queue; msgpack messages as JSON, other messages that are not UTF-8 base64-encoded",
+    )
+
+
+@dataclass
+class DrainLimits:
+    max_messages: int
+    max_bytes: int
+    wait: float
+
+
+def drain_limits(
+    max_messages: int = Query(
+        Config.Api.STATUS_DEFAULT_MESSAGES,
+        ge=1,
+        le=Config.Api.STATUS_MAX_MESSAGES,
+        description="Maximum number of messages to return",
+    ),
+    max_bytes: int = Query(
+        Config.Api.STATUS_DEFAULT_BYTES,
+        ge=1,
+        le=Config.Api.STATUS_MAX_BYTES,
+        description="Maximum total size of the returned messages; at least one message is always returned",
+    ),
+    wait: float = Query(
+        0,
+        ge=0,
+        le=Config.Api.STATUS_MAX_WAIT,
+        description="Seconds to wait for a message when the queue is empty",
+    ),
+) -> DrainLimits:
+    return DrainLimits(max_messages=max_messages, max_bytes=max_bytes, wait=wait)
+
+
+ACK_DESCRIPTION = "Remove messages from the queue only after the response was sent, requeueing them otherwise"
 
 
 @router.get("/status", response_model=StatusResponse)
 async def get_status(
+    limits: Annotated[DrainLimits, Depends(drain_limits)],
     queue_name: str = Query(..., description="Queue name (solver_controller_id)"),
+    ack: bool = Query(False, description=ACK_DESCRIPTION),
 ):
-    messages = []
+    channel = await channel_pool.acquire()
+    delivered = []
+    texts = []
+    try:
+        queue = await channel.declare_queue(queue_name, durable=True)
+        async for message in drain(channel, queue, limits):
+            delivered.append(message)
+            texts.append(as_text(message.body, message.content_type))
+            if not ack:
+                await message.ack()
+        status = StatusResponse(isFinished=len(delivered) == 0, messages=texts)
+    except BaseException:
+        await settle(channel, delivered, sent=False)
+        raise
 
-    connection = await aio_pika.connect_robust(
-        host=Config.RabbitMQ.HOST,
-        port=Config.RabbitMQ.PORT,
-        login=Config.RabbitMQ.USER,
-        password=Config.RabbitMQ.PASSWORD,
+    if not ack:
+        await channel_pool.release(channel)
+        return status
+    return AckAfterSendResponse(
+        status.model_dump(), lambda sent: settle(channel, delivered, sent)
     )
 
-    channel = await connection.channel()
-    queue = await channel.declare_queue(queue_name, durable=True)
 
-    while True:
+@router.get(
+    "/status/stream",
+    summary="Stream queued messages as newline-delimited JSON",
+    response_description='One {"message": ...} object per line, followed by a final {"isFinished": ...} line',
+)
+async def stream_status(
+    limits: Annotated[DrainLimits, Depends(drain_limits)],
+    queue_name: str = Query(..., description="Queue name (solver_controller_id)"),
+    ack: bool = Query(False, description=ACK_DESCRIPTION),
+):
+    channel = await channel_pool.acquire()
+    try:
+        queue = await channel.declare_queue(queue_name, durable=True)
+    except BaseException:
+        await channel_pool.release(channel)
+        raise
+    return ReleasingStreamingResponse(
+        channel,
+        stream_messages(channel, queue, limits, ack),
+        media_type="application/x-ndjson",
+    )
+
+
+async def stream_messages(
+    channel: aio_pika.abc.AbstractChannel,
+    queue: aio_pika.abc.AbstractQueue,
+    limits: DrainLimits,
+    ack: bool,
+) -> AsyncIterator[str]:
+    count = 0
+    unsent = None
+    try:
+        async for message in drain(channel, queue, limits):
+            unsent = message
+            line = (
+                json.dumps({"message": as_text(message.body, message.content_type)})
+                + "\n"
+            )
+            if not ack:
+                await message.ack()
+            yield line
+            if ack:
+                await message.ack()
+            unsent = None
+            count += 1
+        yield json.dumps({"isFinished": count == 0}) + "\n"
+    finally:
+        if ack and unsent is not None:
+            await unsent.nack(requeue=True)
+
+
+async def drain(
+    channel: aio_pika.abc.AbstractChannel,
+    queue: aio_pika.abc.AbstractQueue,
+    limits: DrainLimits,
+) -> AsyncIterator[aio_pika.abc.AbstractIncomingMessage]:
+    """Yields unacked messages until the queue is empty or a limit is reached.
+
+    When the queue starts out empty, waits up to `limits.wait` seconds for the first message.
+    """
+    count = 0
+    size = 0
+    while count < limits.max_messages:
+        message = await queue.get(no_ack=False, fail=False)
+        if message is None and count == 0 and limits.wait > 0:
+            message = await wait_for_message(channel, queue, limits.wait)
+        if message is None:
+            return
+
+        size += len(message.body)
+        if count > 0 and size > limits.max_bytes:
+            await message.nack(requeue=True)
+            return
+        count += 1
+        yield message
+
+
+async def wait_for_message(
+    channel: aio_pika.abc.AbstractChannel,
+    queue: aio_pika.abc.AbstractQueue,
+    timeout: float,
+) -> aio_pika.abc.AbstractIncomingMessage | None:
+    # A consumer is pushed the first message as soon as it arrives, instead of polling with basic.get.
+    # Pool channels already have a prefetch of one, so this takes at most one message.
+    async with queue.iterator() as queue_iter:
         try:
-            message = await queue.get(no_ack=True, timeout=0.1)
-            messages.append(message.body.decode("utf-8"))
-        except QueueEmpty:
-            break
+            return await asyncio.wait_for(anext(queue_iter), timeout)
+        except TimeoutError:
+            return None
 
-    await connection.close()
 
-    return StatusResponse(
-        isFinished=len(messages) == 0,
-        messages=messages,
-    )
+async def settle(
+    channel: aio_pika.abc.AbstractChannel,
+    messages: list[aio_pika.abc.AbstractIncomingMessage],
+    sent: bool,
+):
+    try:
+        for message in messages:
+            if message.processed:
+                continue
+            if sent:
+                await message.ack()
+            else:
+                await message.nack(requeue=True)
+    finally:
+        await channel_pool.release(channel)
+
+
+class AckAfterSendResponse(JSONResponse):
+    """JSON response that acks the delivered messages once the body was handed to the server.
+
+    If sending fails the messages are requeued instead of being lost.
+    """
+
+    def __init__(self, content, on_sent):
+        super().__init__(content)
+        self._on_sent = on_sent
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException:
+            await self._on_sent(False)
+            raise
+        await self._on_sent(True)
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """Streaming response that returns its channel to the pool once done.
+
+    The channel is released even if the client went away before the body was started, which
+    would otherwise leave the generator, and the release in it, never run.
+    """
+
+    def __init__(
+        self,
+        channel: aio_pika.abc.AbstractChannel,
+        content: AsyncIterator[str],
+        media_type: str,
+    ):
+        super().__init__(content, media_type=media_type)
+        self._channel = channel
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # Runs the generator's cleanup, requeueing an unsent message, if it was started
+                await self.body_iterator.aclose()
+            finally:
+                await channel_pool.release(self._channel)
@@ -0,0 +1,105 @@
+from collections.abc import AsyncIterator
+
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
+
+from src.broadcast import SubscriptionClosed, broadcaster, streamable
+from src.config import Config
+
+router = APIRouter()
+
+QUEUE_DESCRIPTION = (
+    "Queue name (solver_controller_id); only the project result queue can be streamed"
+)
+LAST_EVENT_DESCRIPTION = "Resume after this event id, from the events buffered by the API process serving the stream"
+
+
+def unavailable(queue_name: str) -> str | None:
+    """Why `queue_name` cannot be streamed, or None if it can"""
+    if not Config.Broadcast.ENABLED:
+        return "Result streaming is disabled (BROADCAST_ENABLED)"
+    if not streamable(queue_name):
+        return f"Only {Config.Controller.PROJECT_SOLVER_RESULT_QUEUE} is streamed"
+    return None
+
+
+@router.get(
+    "/results/stream",
+    summary="Stream results as server-sent events",
+    response_description="One event per result message, with comment lines as heartbeats",
+)
+async def stream_results(
+    queue_name: str = Query(
+        Config.Controller.PROJECT_SOLVER_RESULT_QUEUE, description=QUEUE_DESCRIPTION
+    ),
+    last_event_id: str | None = Query(None, description=LAST_EVENT_DESCRIPTION),
+    last_event_id_header: str | None = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Push each result to the client as soon as it is relayed. Browsers reconnecting with
+    `Last-Event-ID` receive the buffered events they missed, if they reach the same API process.
+    """
+    if reason := unavailable(queue_name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=reason)
+    return StreamingResponse(
+        sse_events(queue_name, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def sse_events(queue_name: str, last_event_id: str | None) -> AsyncIterator[str]:
+    with broadcaster.subscribe(queue_name, last_event_id) as subscription:
+        while True:
+            try:
+                event = await subscription.next(Config.Broadcast.HEARTBEAT_INTERVAL)
+            except SubscriptionClosed:
+                return
+            if event is None:
+                yield ": heartbeat\n\n"
+                continue
+            data = "".join(f"data: {line}\n" for line in event.data.split("\n"))
+            yield f"id: {event.id}\n{data}\n"
+
+
+@router.websocket("/results/ws")
+async def websocket_results(
+    websocket: WebSocket,
+    queue_name: str = Query(
+        Config.Controller.PROJECT_SOLVER_RESULT_QUEUE, description=QUEUE_DESCRIPTION
+    ),
+    last_event_id: str | None = Query(None, description=LAST_EVENT_DESCRIPTION),
+):
+    """
+    Same stream as `/results/stream`, as `{"type": "result", "id", "data"}` and
+    `{"type": "heartbeat"}` JSON frames.
+    """
+    if reason := unavailable(queue_name):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=reason)
+        return
+    await websocket.accept()
+    with broadcaster.subscribe(queue_name, last_event_id) as subscription:
+        try:
+            while True:
+                try:
+                    event = await subscription.next(Config.Broadcast.HEARTBEAT_INTERVAL)
+                except SubscriptionClosed:
+                    # Fell behind: the client should reconnect with the last id it received
+                    await websocket.close(code=1013, reason="subscriber lagged")
+                    return
+                if event is None:
+                    await websocket.send_json({"type": "heartbeat"})
+                else:
+                    await websocket.send_json(
+                        {"type": "result", "id": event.id, "data": event.data}
+                    )
+        except WebSocketDisconnect:
+            return
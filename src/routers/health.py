@@ -1,7 +1,10 @@
 from typing import Literal
-from fastapi import APIRouter
+
+from fastapi import APIRouter, Response, status
 from pydantic import BaseModel
 
+from src.amqp import channel_pool
+
 router = APIRouter()
 
 
@@ -23,7 +26,7 @@ def healthz():
 
 
 class ReadyResponse(BaseModel):
-    status: Literal["ready"]
+    status: Literal["ready", "not ready"]
 
 
 @router.get(
@@ -32,10 +35,13 @@ class ReadyResponse(BaseModel):
     summary="Get whether the service is ready",
     include_in_schema=False,
 )
-def readyz():
+async def readyz(response: Response):
     """
     Get whether the service is ready to serve requests
     """
+    if not await channel_pool.ping():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return ReadyResponse(status="not ready")
     return ReadyResponse(status="ready")
     # if is_keycloak_ready():
     #     status = "ready"
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from src.config import Config
 from pydantic import BaseModel, Field
 
+from src.config import Config
+
 router = APIRouter()
 
 
@@ -0,0 +1,264 @@
+"""Divides the project's solver capacity across the solver queues.
+
+KEDA scales each solver Deployment on its own queue, so without coordination every solver can
+grow to the whole budget. The scheduler periodically measures each queue's backlog and rewrites
+the `maxReplicaCount` of every ScaledObject so that together they stay within
+MAX_TOTAL_SOLVER_REPLICAS (and the optional vCPU and memory budgets).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from aio_pika.exceptions import ChannelNotFoundEntity
+from kubernetes.client.rest import ApiException
+from kubernetes.utils import parse_quantity
+
+from src import informer, kube
+from src.amqp import channel_pool
+from src.config import Config
+from src.fairshare import forwarder
+from src.metrics import (
+    SCHEDULER_LAST_REBALANCE,
+    SCHEDULER_MAX_REPLICAS,
+    SCHEDULER_REBALANCES,
+    SCHEDULER_STALENESS,
+    SCHEDULER_WANTED_REPLICAS,
+)
+from src.spawner import trigger_queue_name
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueDemand:
+    scaled_object: str
+    queue_name: str
+    vcpus: float
+    memory_gib: float
+    backlog: int = 0
+    consumers: int = 0
+
+    @property
+    def wanted(self) -> int:
+        """Replicas busy now plus those KEDA would add for the ready messages"""
+        return self.consumers + math.ceil(
+            self.backlog / Config.Solver.QUEUE_LENGTH_PER_REPLICA
+        )
+
+
+@dataclass
+class Allocation:
+    scaled_object: str
+    queue_name: str
+    vcpus: float
+    memory_gib: float
+    backlog: int
+    wanted: int
+    max_replicas: int
+
+
+def allocate(
+    demands: list[QueueDemand], replicas: int, cpus: float = 0, memory_gib: float = 0
+) -> dict[str, int]:
+    """Max-min fair split of the budget, weighted by resource shape.
+
+    Every queue keeps a limit of at least one replica, so KEDA can still start a worker when work
+    arrives. Those floors come out of the budget first; when there are more queues than replicas,
+    only the queues that want the most get one and the others are held at zero until the next
+    round, so the limits never add up to more than the budget. The rest is handed out one replica
+    at a time to the queue with the smallest dominant share (of the vCPU or memory budget, or raw vCPUs when no such budget is set)
+    that still wants more, so a queue of 8-vCPU jobs gets a quarter of the replicas of an equally
+    busy 2-vCPU queue. Ties go to the larger backlog.
+    """
+    allocated = {demand.scaled_object: 0 for demand in demands}
+    floored = sorted(demands, key=lambda d: (-d.wanted, -d.backlog, d.scaled_object))[
+        : max(replicas, 0)
+    ]
+    for demand in floored:
+        allocated[demand.scaled_object] = 1
+
+    def share(demand: QueueDemand) -> float:
+        count = allocated[demand.scaled_object]
+        cpu_share = count * demand.vcpus / cpus if cpus else count * demand.vcpus
+        memory_share = count * demand.memory_gib / memory_gib if memory_gib else 0
+        return max(cpu_share, memory_share)
+
+    used_cpus = sum(demand.vcpus for demand in floored)
+    used_memory = sum(demand.memory_gib for demand in floored)
+    remaining = replicas - len(floored)
+    candidates = [demand for demand in floored if demand.wanted > 1]
+    while remaining > 0 and candidates:
+        demand = min(candidates, key=lambda d: (share(d), -d.backlog, d.scaled_object))
+        if (cpus and used_cpus + demand.vcpus > cpus) or (
+            memory_gib and used_memory + demand.memory_gib > memory_gib
+        ):
+            candidates.remove(demand)
+            continue
+        allocated[demand.scaled_object] += 1
+        remaining -= 1
+        used_cpus += demand.vcpus
+        used_memory += demand.memory_gib
+        if allocated[demand.scaled_object] >= demand.wanted:
+            candidates.remove(demand)
+    return allocated
+
+
+def queue_demand(scaled_object: dict) -> QueueDemand | None:
+    """Reads the queue and the pod resource requests of an indexed solver ScaledObject"""
+    queue_name = trigger_queue_name(scaled_object)
+    if queue_name is None:
+        return None
+    spec = scaled_object["spec"]
+
+    vcpus, memory_gib = 1.0, 0.0
+    deployment = informer.deployments.get(spec["scaleTargetRef"]["name"])
+    if deployment is not None:
+        resource_requests = (
+            deployment["spec"]["template"]["spec"]["containers"][0]
+            .get("resources", {})
+            .get("requests", {})
+        )
+        vcpus = float(parse_quantity(resource_requests.get("cpu", "1")))
+        memory_gib = float(parse_quantity(resource_requests.get("memory", "0"))) / 2**30
+    return QueueDemand(scaled_object["metadata"]["name"], queue_name, vcpus, memory_gib)
+
+
+async def measure(demand: QueueDemand) -> bool:
+    """Fills in the backlog and consumers of the demand's queue; False if the queue does not exist.
+
+    Any other broker error is raised, so a round that cannot see the queues fails as a whole
+    instead of acting on a backlog of zero.
+    """
+    # Passive declares of missing queues close the channel, so each one gets its own
+    try:
+        async with channel_pool.channel() as channel:
+            queue = await channel.declare_queue(demand.queue_name, passive=True)
+    except ChannelNotFoundEntity:
+        return False
+    demand.backlog = queue.declaration_result.message_count
+    demand.consumers = queue.declaration_result.consumer_count
+    return True
+
+
+class CapacityScheduler:
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._wakeup: asyncio.Event | None = None
+        self.allocations: list[Allocation] = []
+        self.last_rebalance = 0.0
+        SCHEDULER_STALENESS.set_function(self.staleness)
+
+    def staleness(self) -> float:
+        """Seconds since the limits were last re-balanced, 0 if never"""
+        if not self.last_rebalance:
+            return 0.0
+        return time.time() - self.last_rebalance
+
+    def request_rebalance(self):
+        """Re-balance now instead of at the next interval, e.g. because a solver was deployed"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.rebalance()
+                SCHEDULER_REBALANCES.labels("ok").inc()
+            # The scheduler must keep running whatever a round ran into; the staleness gauge shows it
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to re-balance solver capacity: {e}")
+                SCHEDULER_REBALANCES.labels("error").inc()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._interval)
+            except TimeoutError:
+                pass
+
+    async def rebalance(self) -> list[Allocation]:
+        scaled_objects = {
+            name: informer.scaled_objects.get(name)
+            for name in informer.scaled_objects.names()
+        }
+        demands = [
+            demand
+            for obj in scaled_objects.values()
+            if obj is not None and (demand := queue_demand(obj)) is not None
+        ]
+        await asyncio.gather(*(measure(demand) for demand in demands))
+        for demand in demands:
+            # Work held back by fair-share metering is backlog all the same
+            demand.backlog += forwarder.pending(demand.queue_name)
+
+        limits = allocate(
+            demands,
+            Config.Controller.MAX_TOTAL_SOLVER_REPLICAS,
+            Config.Scheduler.CPU_BUDGET,
+            Config.Scheduler.MEMORY_BUDGET_GIB,
+        )
+        # KEDA rejects a maximum below the minimum the pre-warmer set
+        limits = {
+            name: max(limit, scaled_objects[name]["spec"].get("minReplicaCount", 0))
+            for name, limit in limits.items()
+        }
+        await asyncio.gather(
+            *(
+                self._apply(scaled_objects[name], limit)
+                for name, limit in limits.items()
+                if scaled_objects[name]["spec"].get("maxReplicaCount") != limit
+            )
+        )
+
+        for name in {a.scaled_object for a in self.allocations} - limits.keys():
+            SCHEDULER_MAX_REPLICAS.remove(name)
+            SCHEDULER_WANTED_REPLICAS.remove(name)
+        self.allocations = [
+            Allocation(
+                scaled_object=d.scaled_object,
+                queue_name=d.queue_name,
+                vcpus=d.vcpus,
+                memory_gib=d.memory_gib,
+                backlog=d.backlog,
+                wanted=d.wanted,
+                max_replicas=limits[d.scaled_object],
+            )
+            for d in demands
+        ]
+        for allocation in self.allocations:
+            SCHEDULER_MAX_REPLICAS.labels(allocation.scaled_object).set(
+                allocation.max_replicas
+            )
+            SCHEDULER_WANTED_REPLICAS.labels(allocation.scaled_object).set(
+                allocation.wanted
+            )
+        self.last_rebalance = time.time()
+        SCHEDULER_LAST_REBALANCE.set(self.last_rebalance)
+        return self.allocations
+
+    async def _apply(self, scaled_object: dict, max_replicas: int):
+        name = scaled_object["metadata"]["name"]
+        try:
+            await kube.call(
+                "patch_scaled_object",
+                kube.custom_objects().patch_namespaced_custom_object,
+                group="keda.sh",
+                version="v1alpha1",
+                namespace=Config.Controller.SOLVERS_NAMESPACE,
+                plural="scaledobjects",
+                name=name,
+                body={"spec": {"maxReplicaCount": max_replicas}},
+            )
+        except ApiException as e:
+            logger.warning(
+                f"Failed to set maxReplicaCount of {name}: {e.status} {e.reason}"
+            )
+            return
+        logger.info(f"Set maxReplicaCount of {name} to {max_replicas}")
+        # Keep the index current until the watch reports the change
+        scaled_object["spec"]["maxReplicaCount"] = max_replicas
+
+
+scheduler = CapacityScheduler(Config.Scheduler.INTERVAL)
@@ -1,7 +1,78 @@
 """Helper functions to create solver Deployments and KEDA ScaledObjects"""
 
+import copy
+import functools
+import hashlib
+import json
+import re
+
 from src.config import Config
 
+# Object names double as label values and DNS labels, so keep them to 63 characters
+MAX_NAME_LENGTH = 63
+SPEC_HASH_ANNOTATION = "solver-controller/spec-hash"
+
+
+def bucket_shape(vcpus: int, memory_gib: float) -> tuple[int, float]:
+    """Rounds a requested shape up to the configured buckets, so similar requests share one Deployment.
+
+    Values above the largest bucket, or with no buckets configured, are kept as requested.
+    """
+    vcpus = next(
+        (bucket for bucket in Config.Solver.VCPU_BUCKETS if bucket >= vcpus), vcpus
+    )
+    memory_gib = next(
+        (bucket for bucket in Config.Solver.MEMORY_BUCKETS_GIB if bucket >= memory_gib),
+        memory_gib,
+    )
+    return vcpus, memory_gib
+
+
+def shape_name(
+    solver_type: str, vcpus: int, memory_gib: float, suffix: str = ""
+) -> str:
+    """Readable, length-limited name for a solver shape.
+
+    The hash of the exact (solver, vCPUs, memory) key keeps names distinct even when sanitising
+    or truncating the readable part makes two of them look alike.
+    """
+    digest = hashlib.sha256(
+        f"{solver_type}/{vcpus}/{memory_gib:g}".encode()
+    ).hexdigest()[:8]
+    readable = re.sub(
+        r"[^a-z0-9]+", "-", f"solver-{solver_type}-{vcpus}cpu-{memory_gib:g}gi".lower()
+    )
+    readable = readable[: MAX_NAME_LENGTH - len(digest) - len(suffix) - 1].strip("-")
+    return f"{readable}-{digest}{suffix}"
+
+
+def deployment_name(solver_type: str, vcpus: int, memory_gib: float) -> str:
+    return shape_name(solver_type, vcpus, memory_gib)
+
+
+def scaled_object_name(solver_type: str, vcpus: int, memory_gib: float) -> str:
+    return shape_name(solver_type, vcpus, memory_gib, "-scaler")
+
+
+def labels(solver_type: str, vcpus: int, memory_gib: float) -> dict[str, str]:
+    return {
+        "app": "minizinc-solver",
+        "solver-type": re.sub(r"[^A-Za-z0-9_.-]+", "-", solver_type)[
+            :MAX_NAME_LENGTH
+        ].strip("-_."),
+        "solver-deployment": deployment_name(solver_type, vcpus, memory_gib),
+    }
+
+
+def spec_hash(manifest: dict) -> str:
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[
+        :16
+    ]
+
+
+def annotated_spec_hash(obj: dict) -> str | None:
+    return (obj["metadata"].get("annotations") or {}).get(SPEC_HASH_ANNOTATION)
+
 
 def create_solver_deployment_manifest(
     solver_type: str,
@@ -13,34 +84,51 @@ def create_solver_deployment_manifest(
     queue_out_name: str,
     solver_timeout: int,
 ) -> dict:
-    deployment_name = f"solver-{solver_type}"
+    manifest, _ = solver_deployment_template(
+        solver_type,
+        solvers_namespace,
+        solver_image,
+        pod_cpu_request,
+        pod_memory_gib,
+        queue_in_name,
+        queue_out_name,
+        solver_timeout,
+    )
+    return copy.deepcopy(manifest)
 
-    return {
+
+@functools.lru_cache(maxsize=1024)
+def solver_deployment_template(
+    solver_type: str,
+    solvers_namespace: str,
+    solver_image: str,
+    pod_cpu_request: int,
+    pod_memory_gib: float,
+    queue_in_name: str,
+    queue_out_name: str,
+    solver_timeout: int,
+) -> tuple[dict, str]:
+    """The Deployment manifest of a solver shape, with the hash of its content.
+
+    Built once per distinct set of arguments; the manifest is shared, so callers that change it
+    must use `create_solver_deployment_manifest` instead. The hash is also stored in the
+    SPEC_HASH_ANNOTATION annotation, so a live Deployment can be checked without a diff.
+    """
+    shape_labels = labels(solver_type, pod_cpu_request, pod_memory_gib)
+    manifest = {
         "apiVersion": "apps/v1",
         "kind": "Deployment",
         "metadata": {
-            "name": deployment_name,
+            "name": deployment_name(solver_type, pod_cpu_request, pod_memory_gib),
             "namespace": solvers_namespace,
-            "labels": {
-                "app": "minizinc-solver",
-                "solver-type": solver_type,
-            },
+            "labels": shape_labels,
         },
         "spec": {
             "replicas": 0,  # Start with 0, pod-scheduler will scale up
-            "selector": {
-                "matchLabels": {
-                    "app": "minizinc-solver",
-                    "solver-type": solver_type,
-                }
-            },
+            # Includes the shape, so Deployments of one solver never adopt each other's pods
+            "selector": {"matchLabels": shape_labels},
             "template": {
-                "metadata": {
-                    "labels": {
-                        "app": "minizinc-solver",
-                        "solver-type": solver_type,
-                    }
-                },
+                "metadata": {"labels": shape_labels},
                 "spec": {
                     "terminationGracePeriodSeconds": solver_timeout + 60,
                     "securityContext": {
@@ -73,7 +161,20 @@ def create_solver_deployment_manifest(
                                 {"name": "QUEUE_OUT_NAME", "value": queue_out_name},
                                 {"name": "CPU_LIMIT", "value": str(pod_cpu_request)},
                                 {"name": "MEMORY_LIMIT", "value": str(pod_memory_gib)},
-                                {"name": "SOLVER_TIMEOUT", "value": str(solver_timeout)},
+                                {
+                                    "name": "SOLVER_TIMEOUT",
+                                    "value": str(solver_timeout),
+                                },
+                                *(
+                                    [
+                                        {
+                                            "name": "CANCEL_EXCHANGE",
+                                            "value": Config.Race.CANCEL_EXCHANGE,
+                                        }
+                                    ]
+                                    if Config.Race.ENABLED
+                                    else []
+                                ),
                             ],
                             "resources": {
                                 "requests": {
@@ -102,34 +203,58 @@ def create_solver_deployment_manifest(
             },
         },
     }
+    digest = spec_hash(manifest)
+    manifest["metadata"]["annotations"] = {SPEC_HASH_ANNOTATION: digest}
+    return manifest, digest
+
+
+def template_update(manifest: dict) -> dict:
+    """Merge patch bringing a live Deployment or DaemonSet up to `manifest`, leaving replica counts to the autoscaler"""
+    return {
+        "metadata": {
+            "labels": manifest["metadata"]["labels"],
+            "annotations": manifest["metadata"]["annotations"],
+        },
+        "spec": {"template": manifest["spec"]["template"]},
+    }
+
+
+def trigger_queue_name(scaled_object: dict) -> str | None:
+    """The queue a solver ScaledObject scales on, or None for objects this controller did not create"""
+    if scaled_object["metadata"].get("labels", {}).get("app") != "minizinc-solver":
+        return None
+    return next(
+        (
+            t["metadata"]["queueName"]
+            for t in scaled_object["spec"].get("triggers", [])
+            if t.get("type") == "rabbitmq"
+        ),
+        None,
+    )
 
 
 def create_keda_scaled_object_manifest(
     solver_type: str,
     solvers_namespace: str,
     queue_name: str,
+    vcpus: int,
+    memory_gib: float,
 ) -> dict:
-    deployment_name = f"solver-{solver_type}"
-    scaled_object_name = f"solver-{solver_type}-scaler"
-    max_replicas = Config.Controller.MAX_TOTAL_SOLVER_REPLICAS
-
     return {
         "apiVersion": "keda.sh/v1alpha1",
         "kind": "ScaledObject",
         "metadata": {
-            "name": scaled_object_name,
+            "name": scaled_object_name(solver_type, vcpus, memory_gib),
             "namespace": solvers_namespace,
-            "labels": {
-                "app": "minizinc-solver",
-                "solver-type": solver_type,
-            },
+            "labels": labels(solver_type, vcpus, memory_gib),
         },
         "spec": {
             "scaleTargetRef": {
-                "name": deployment_name,
+                "name": deployment_name(solver_type, vcpus, memory_gib),
             },
             "minReplicaCount": Config.Solver.MIN_REPLICAS,
-            "maxReplicaCount": max_replicas,
+            # Raised by the capacity scheduler once it has measured the queue's backlog
+            "maxReplicaCount": 1,
             "pollingInterval": 1,
             "cooldownPeriod": 2,
             "triggers": [
@@ -145,3 +270,90 @@ def create_keda_scaled_object_manifest(
             ],
         },
     }
+
+
+def create_prepull_daemonset_manifest(
+    solvers_namespace: str, images: list[str]
+) -> dict:
+    """DaemonSet that pulls every solver image onto every node, so new solver pods skip the pull.
+
+    A first init container copies a static busybox into a shared volume as `true`, and each
+    image then runs that copy as an init container of its own, so distroless images without a
+    shell or coreutils are pulled just the same. The pod then idles in a pause container.
+    Annotated with its spec hash like solver Deployments.
+    """
+    name = Config.Prewarm.PREPULL_NAME
+    container_security_context = {
+        "allowPrivilegeEscalation": False,
+        "readOnlyRootFilesystem": True,
+        "capabilities": {"drop": ["ALL"]},
+    }
+    resources = {
+        "requests": {"cpu": "1m", "memory": "8Mi"},
+        "limits": {"cpu": "50m", "memory": "32Mi"},
+    }
+    manifest = {
+        "apiVersion": "apps/v1",
+        "kind": "DaemonSet",
+        "metadata": {
+            "name": name,
+            "namespace": solvers_namespace,
+            "labels": {"app": name},
+        },
+        "spec": {
+            "selector": {"matchLabels": {"app": name}},
+            "template": {
+                "metadata": {"labels": {"app": name}},
+                "spec": {
+                    "securityContext": {
+                        "runAsNonRoot": True,
+                        "runAsUser": 65534,
+                        "seccompProfile": {"type": "RuntimeDefault"},
+                    },
+                    "initContainers": [
+                        {
+                            "name": "true",
+                            "image": Config.Prewarm.TRUE_IMAGE,
+                            "imagePullPolicy": "IfNotPresent",
+                            # busybox runs the applet it is named after
+                            "command": ["cp", "/bin/busybox", "/prepull/true"],
+                            "resources": resources,
+                            "securityContext": container_security_context,
+                            "volumeMounts": [
+                                {"name": "prepull", "mountPath": "/prepull"}
+                            ],
+                        }
+                    ]
+                    + [
+                        {
+                            "name": f"image-{index}",
+                            "image": image,
+                            "imagePullPolicy": "IfNotPresent",
+                            "command": ["/prepull/true"],
+                            "resources": resources,
+                            "securityContext": container_security_context,
+                            "volumeMounts": [
+                                {
+                                    "name": "prepull",
+                                    "mountPath": "/prepull",
+                                    "readOnly": True,
+                                }
+                            ],
+                        }
+                        for index, image in enumerate(images)
+                    ],
+                    "containers": [
+                        {
+                            "name": "pause",
+                            "image": Config.Prewarm.PAUSE_IMAGE,
+                            "resources": resources,
+                            "securityContext": container_security_context,
+                        }
+                    ],
+                    "volumes": [{"name": "prepull", "emptyDir": {"sizeLimit": "8Mi"}}],
+                },
+            },
+        },
+    }
+    manifest["metadata"]["annotations"] = {SPEC_HASH_ANNOTATION: spec_hash(manifest)}
+    return manifest
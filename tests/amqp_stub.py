@@ -0,0 +1,387 @@
+"""In-memory stand-in for the parts of aio-pika the controller uses.
+
+`FakeBroker.connect_robust` has the same call signature as `aio_pika.connect_robust`,
+so tests can monkeypatch it in and drive the dispatcher and API routes without a broker.
+"""
+
+import asyncio
+from collections import deque
+
+from aio_pika.exceptions import (
+    ChannelNotFoundEntity,
+    DeliveryError,
+    PublishError,
+    QueueEmpty,
+)
+from aiormq.abc import DeliveredMessage
+from pamqp.commands import Basic
+
+
+class FakeBroker:
+    def __init__(self):
+        self.queues: dict[str, FakeQueueState] = {}
+        # Messages published to named exchanges, and the queues bound to each of them
+        self.exchanges: dict[str, list[FakeStoredMessage]] = {}
+        self.bindings: dict[str, set[str]] = {}
+        self.connections: list[FakeConnection] = []
+        self.declare_count = 0
+        self.confirm_delay = 0.0
+        self.nack_routing_keys: set[str] = set()
+
+    async def connect_robust(self, *args, **kwargs) -> "FakeConnection":
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+    def queue(self, name: str) -> "FakeQueueState":
+        if name not in self.queues:
+            self.queues[name] = FakeQueueState(name, {})
+        return self.queues[name]
+
+    def put(
+        self, queue_name: str, body: bytes, headers: dict | None = None, **properties
+    ):
+        self.queue(queue_name).push(
+            FakeStoredMessage(body, dict(headers or {}), properties)
+        )
+
+    def route(self, exchange: str, message: "FakeStoredMessage"):
+        """Delivers a message published to a named exchange to every queue bound to it, like a fanout"""
+        self.exchanges.setdefault(exchange, []).append(message)
+        for queue_name in self.bindings.get(exchange, ()):
+            self.queues[queue_name].push(message)
+
+    def bodies(self, queue_name: str) -> list[bytes]:
+        state = self.queues.get(queue_name)
+        return [m.body for m in state.ready] if state else []
+
+    async def wait_for(self, predicate, timeout: float = 5.0):
+        async def poll():
+            while not predicate():
+                await asyncio.sleep(0.001)
+
+        await asyncio.wait_for(poll(), timeout)
+
+
+class FakeStoredMessage:
+    def __init__(self, body: bytes, headers: dict, properties: dict):
+        self.body = body
+        self.headers = headers
+        self.properties = properties
+
+
+class FakeQueueState:
+    def __init__(self, name: str, arguments: dict, auto_delete: bool = False):
+        self.name = name
+        self.arguments = arguments
+        self.auto_delete = auto_delete
+        self.ready: deque[FakeStoredMessage] = deque()
+        self.unacked = 0
+        self.consumers = 0
+        self._waiters: list[asyncio.Future] = []
+
+    def push(self, message: FakeStoredMessage, front: bool = False):
+        if front:
+            self.ready.appendleft(message)
+        else:
+            self.ready.append(message)
+        self.notify()
+
+    def notify(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def changed(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+
+class FakeCallbacks:
+    def __init__(self, sender):
+        self.sender = sender
+        self.callbacks = []
+
+    def add(self, callback, weak: bool = False):
+        self.callbacks.append(callback)
+
+    def discard(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    async def __call__(self, *args):
+        for callback in list(self.callbacks):
+            result = callback(self.sender, *args)
+            if asyncio.iscoroutine(result):
+                await result
+
+
+class FakeConnection:
+    def __init__(self, broker: FakeBroker):
+        self.broker = broker
+        self.channels: list[FakeChannel] = []
+        self.reconnect_callbacks = FakeCallbacks(self)
+        self.is_closed = False
+        self.connected = asyncio.Event()
+        self.connected.set()
+
+    async def channel(self, on_return_raises: bool = False, **kwargs) -> "FakeChannel":
+        channel = FakeChannel(self, on_return_raises)
+        self.channels.append(channel)
+        return channel
+
+    async def close(self, exc=None):
+        if self.is_closed:
+            return
+        for channel in self.channels:
+            await channel.close()
+        self.is_closed = True
+        self.connected.clear()
+
+    async def simulate_reconnect(self):
+        await self.reconnect_callbacks()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class FakeChannel:
+    def __init__(self, connection: FakeConnection, on_return_raises: bool):
+        self.connection = connection
+        self.broker = connection.broker
+        self.on_return_raises = on_return_raises
+        self.prefetch_count = 0
+        self.is_closed = False
+        self.default_exchange = FakeExchange(self)
+        self._unacked: set[FakeIncomingMessage] = set()
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    async def declare_queue(
+        self,
+        name: str,
+        *,
+        durable: bool = False,
+        passive: bool = False,
+        auto_delete: bool = False,
+        arguments: dict | None = None,
+        **kwargs,
+    ) -> "FakeQueue":
+        self.broker.declare_count += 1
+        if passive and name not in self.broker.queues:
+            raise ChannelNotFoundEntity(f"NOT_FOUND - no queue '{name}'")
+        if name not in self.broker.queues:
+            self.broker.queues[name] = FakeQueueState(
+                name, dict(arguments or {}), auto_delete
+            )
+        return FakeQueue(self, self.broker.queues[name])
+
+    async def declare_exchange(
+        self, name: str, type=None, *, durable: bool = False, **kwargs
+    ) -> "FakeExchange":
+        self.broker.exchanges.setdefault(name, [])
+        return FakeExchange(self, name)
+
+    def has_capacity(self) -> bool:
+        return self.prefetch_count == 0 or len(self._unacked) < self.prefetch_count
+
+    def settled(self, message: "FakeIncomingMessage"):
+        self._unacked.discard(message)
+        message.state.unacked -= 1
+        message.state.notify()
+
+    async def close(self, exc=None):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        # Like a real broker, requeue everything this channel never settled.
+        for message in list(self._unacked):
+            self.settled(message)
+            message.state.push(message.stored, front=True)
+
+
+class FakeExchange:
+    def __init__(self, channel: FakeChannel, name: str = ""):
+        self.channel = channel
+        self.name = name
+
+    async def publish(
+        self,
+        message,
+        routing_key: str,
+        *,
+        mandatory: bool = True,
+        timeout=None,
+        **kwargs,
+    ):
+        broker = self.channel.broker
+        if broker.confirm_delay:
+            await asyncio.sleep(broker.confirm_delay)
+        if routing_key in broker.nack_routing_keys:
+            raise DeliveryError(None, None)
+        properties = {
+            name: getattr(message, name)
+            for name in (
+                "content_type",
+                "correlation_id",
+                "expiration",
+                "message_id",
+                "priority",
+                "reply_to",
+                "timestamp",
+                "type",
+            )
+            if getattr(message, name, None) is not None
+        }
+        stored = FakeStoredMessage(
+            message.body, dict(message.headers or {}), properties
+        )
+        if self.name:
+            broker.route(self.name, stored)
+        elif routing_key in broker.queues:
+            broker.queues[routing_key].push(stored)
+        # Like the broker, drop unroutable messages unless they must be returned to the publisher
+        elif mandatory and self.channel.on_return_raises:
+            returned = Basic.Return(
+                reply_code=312,
+                reply_text="NO_ROUTE",
+                exchange="",
+                routing_key=routing_key,
+            )
+            raise PublishError(
+                DeliveredMessage(returned, None, message.body, None), None
+            )
+
+
+class FakeQueue:
+    def __init__(self, channel: FakeChannel, state: FakeQueueState):
+        self.channel = channel
+        self.state = state
+        self.name = state.name
+
+    @property
+    def declaration_result(self):
+        return type(
+            "DeclareOk",
+            (),
+            {
+                "message_count": len(self.state.ready),
+                "consumer_count": self.state.consumers,
+            },
+        )()
+
+    async def get(self, *, no_ack: bool = False, fail: bool = True, timeout=5):
+        if not self.state.ready:
+            if fail:
+                raise QueueEmpty()
+            return None
+        return self._deliver(no_ack)
+
+    def iterator(self, **kwargs) -> "FakeQueueIterator":
+        return FakeQueueIterator(self, **kwargs)
+
+    async def bind(self, exchange, routing_key: str | None = None, **kwargs):
+        self.channel.broker.bindings.setdefault(exchange.name, set()).add(self.name)
+
+    async def delete(
+        self, *, if_unused: bool = True, if_empty: bool = True, timeout=None
+    ):
+        if if_empty and self.state.ready:
+            raise RuntimeError(f"PRECONDITION_FAILED - queue '{self.name}' not empty")
+        if if_unused and self.state.consumers:
+            raise RuntimeError(f"PRECONDITION_FAILED - queue '{self.name}' in use")
+        self.channel.broker.queues.pop(self.name, None)
+        for bound in self.channel.broker.bindings.values():
+            bound.discard(self.name)
+
+    def _deliver(self, no_ack: bool) -> "FakeIncomingMessage":
+        stored = self.state.ready.popleft()
+        message = FakeIncomingMessage(self.channel, self.state, stored)
+        if no_ack:
+            message.processed = True
+        else:
+            self.state.unacked += 1
+            self.channel._unacked.add(message)
+        return message
+
+
+class FakeQueueIterator:
+    def __init__(self, queue: FakeQueue, no_ack: bool = False, **kwargs):
+        self.queue = queue
+        self.no_ack = no_ack
+        self.closed = False
+        queue.state.consumers += 1
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.state.consumers -= 1
+            self.queue.state.notify()
+            if self.queue.state.auto_delete and not self.queue.state.consumers:
+                await self.queue.delete(if_unused=False, if_empty=False)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> "FakeIncomingMessage":
+        state = self.queue.state
+        while True:
+            if self.closed or self.queue.channel.is_closed:
+                raise StopAsyncIteration
+            if state.ready and (self.no_ack or self.queue.channel.has_capacity()):
+                return self.queue._deliver(self.no_ack)
+            await state.changed()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class FakeIncomingMessage:
+    def __init__(
+        self, channel: FakeChannel, state: FakeQueueState, stored: FakeStoredMessage
+    ):
+        self.channel = channel
+        self.state = state
+        self.stored = stored
+        self.body = stored.body
+        self.headers = dict(stored.headers)
+        self.routing_key = state.name
+        self.processed = False
+        for name in (
+            "content_type",
+            "correlation_id",
+            "expiration",
+            "message_id",
+            "priority",
+            "reply_to",
+            "timestamp",
+            "type",
+        ):
+            setattr(self, name, stored.properties.get(name))
+
+    def _settle(self):
+        if self.processed:
+            raise RuntimeError("Message already processed")
+        self.processed = True
+        self.channel.settled(self)
+
+    async def ack(self, multiple: bool = False):
+        self._settle()
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self._settle()
+        if requeue:
+            # Quorum queues count returned deliveries against x-delivery-limit
+            self.stored.headers["x-delivery-count"] = (
+                self.stored.headers.get("x-delivery-count", 0) + 1
+            )
+            self.state.push(self.stored, front=True)
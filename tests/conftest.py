@@ -1,7 +1,9 @@
 import os
+from unittest.mock import patch
+
+import aio_pika
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch
 
 # Set environment variables for tests before importing app
 os.environ.setdefault("RABBITMQ_HOST", "localhost")
@@ -15,14 +17,27 @@ os.environ.setdefault("CONTROL_QUEUE", "test-control-queue")
 os.environ.setdefault("MAX_TOTAL_SOLVER_REPLICAS", "10")
 os.environ.setdefault("PROJECT_SOLVER_RESULT_QUEUE", "test-result-queue")
 os.environ.setdefault("SOLVER_TIMEOUT", "3600")
+# One test process, so the singleton duties need no Lease
+os.environ.setdefault("LEADER_ELECTION", "false")
 
 # Mock kubernetes config loading for tests
 with patch("kubernetes.config.load_incluster_config"):
     from src.main import app
 
 
+from tests.amqp_stub import FakeBroker
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """In-memory broker standing in for RabbitMQ"""
+    broker = FakeBroker()
+    monkeypatch.setattr(aio_pika, "connect_robust", broker.connect_robust)
+    return broker
+
+
 @pytest.fixture
-def client():
+def client(broker):
     """Test client"""
     with TestClient(app) as client:
         yield client
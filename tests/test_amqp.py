@@ -0,0 +1,101 @@
+import asyncio
+
+import aio_pika
+import pytest
+
+from src.amqp import ChannelPool, channel_pool
+from src.metrics import AMQP_POOL_CHANNELS_IN_USE, AMQP_POOL_TIMEOUTS
+
+
+def test_status_polls_share_one_connection(client, broker):
+    """Polling /v1/status reuses the app connection and its channels"""
+    broker.put("results", b"solution")
+    response = client.get("/v1/status", params={"queue_name": "results"})
+    assert response.json()["messages"] == ["solution"]
+    connections = len(broker.connections)
+    channels = len(broker.connections[-1].channels)
+
+    for _ in range(5):
+        response = client.get("/v1/status", params={"queue_name": "results"})
+        assert response.status_code == 200
+
+    # Long polls do not change the QoS every borrower of the channel sees
+    response = client.get("/v1/status", params={"queue_name": "results", "wait": 0.01})
+    assert response.json() == {"isFinished": True, "messages": []}
+
+    assert len(broker.connections) == connections
+    assert len(broker.connections[-1].channels) == channels
+    [channel] = channel_pool._idle
+    assert channel.prefetch_count == 1
+
+
+def test_pool_bounds_channels_in_use(broker):
+    pool = ChannelPool(max_channels=2, acquire_timeout=0.05)
+    timeouts = AMQP_POOL_TIMEOUTS._value.get()
+
+    async def main():
+        first = await pool.acquire()
+        second = await pool.acquire()
+        assert AMQP_POOL_CHANNELS_IN_USE._value.get() >= 2
+        with pytest.raises(TimeoutError):
+            await pool.acquire()
+
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        await pool.release(first)
+        third = await waiter
+        assert third is first
+
+        await pool.release(second)
+        await pool.release(third)
+        await pool.close()
+
+    asyncio.run(main())
+    assert AMQP_POOL_TIMEOUTS._value.get() == timeouts + 1
+
+
+def test_pool_replaces_closed_channels_and_connections(broker):
+    pool = ChannelPool(max_channels=2, acquire_timeout=1)
+
+    async def main():
+        async with pool.channel() as channel:
+            await channel.close()
+        async with pool.channel() as replacement:
+            assert replacement is not channel
+
+        await broker.connections[0].close()
+        async with pool.channel():
+            pass
+        await pool.close()
+
+    asyncio.run(main())
+    assert len(broker.connections) == 2
+
+
+def test_ready_endpoint_reports_broker_outage(client, monkeypatch):
+    """The service is not ready while the broker cannot be reached"""
+
+    async def refuse(*args, **kwargs):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(aio_pika, "connect_robust", refuse)
+    from src.amqp import channel_pool
+
+    asyncio.run(channel_pool.close())
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not ready"
+
+
+def test_ping_takes_no_channel_slot(broker):
+    """Readiness holds while every channel is busy, and fails while the connection is down"""
+    pool = ChannelPool(max_channels=1, acquire_timeout=0.05)
+
+    async def main():
+        async with pool.channel():
+            assert await pool.ping()
+            broker.connections[0].connected.clear()
+            assert not await pool.ping()
+        await pool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+import asyncio
+from dataclasses import asdict
+
+from benchmarks.dispatch import Scenario, compare, run
+
+
+def test_benchmark_smoke():
+    scenario = Scenario(
+        messages=40, solvers=3, director_latency=0, kube_latency=0, confirm_delay=0
+    )
+    report = asdict(asyncio.run(run(scenario, [1, 4])))
+    assert [result["concurrency"] for result in report["results"]] == [1, 4]
+    for result in report["results"]:
+        assert result["messages"] == 40
+        assert result["retried"] == 0
+        assert result["messages_per_second"] > 0
+        assert result["p99_ms"] >= result["p50_ms"]
+
+    assert compare(report, report, tolerance=0) == []
+    faster_baseline = {
+        "results": [
+            {**result, "messages_per_second": result["messages_per_second"] * 2}
+            for result in report["results"]
+        ]
+    }
+    assert len(compare(report, faster_baseline, tolerance=0.25)) == 2
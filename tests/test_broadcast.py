@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from src import broadcast
+from src.amqp import ChannelPool
+from src.broadcast import Broadcaster, SubscriptionClosed
+from src.config import Config
+from src.routers.api.stream import sse_events
+from tests.amqp_stub import FakeBroker, FakeStoredMessage
+
+
+@pytest.fixture
+def pool(broker, monkeypatch):
+    pool = ChannelPool(max_channels=2, acquire_timeout=1)
+    monkeypatch.setattr(broadcast, "channel_pool", pool)
+    return pool
+
+
+def relay(broker: FakeBroker, queue_name: str, *bodies: bytes):
+    """Publishes results the way the result relay copies them to the streams"""
+    for body in bodies:
+        broker.route(f"{queue_name}.broadcast", FakeStoredMessage(body, {}, {}))
+
+
+def streaming(broker: FakeBroker, queue_name: str) -> bool:
+    return bool(broker.bindings.get(f"{queue_name}.broadcast"))
+
+
+def test_fans_out_with_one_consumer_and_resumes(broker, pool):
+    hub = Broadcaster(buffer_size=10, max_pending=10, linger=60)
+    broker.put("results", b"for the project")
+
+    async def main():
+        with hub.subscribe("results") as first, hub.subscribe("results") as second:
+            await broker.wait_for(lambda: streaming(broker, "results"))
+            [topic_queue] = broker.bindings["results.broadcast"]
+            relay(broker, "results", b"a", b"b")
+            assert [(await first.next(1)).data for _ in range(2)] == ["a", "b"]
+            event = await second.next(1)
+            assert event.data == "a"
+            assert broker.queues[topic_queue].consumers == 1
+            assert await first.next(0.01) is None  # Heartbeat tick
+
+        await asyncio.sleep(0)
+        # The topic's own queue goes with its last subscriber
+        assert topic_queue not in broker.queues
+        assert not streaming(broker, "results")
+
+        # Reconnecting with the last seen id replays what was missed
+        with hub.subscribe("results", last_event_id=event.id) as resumed:
+            assert (await resumed.next(1)).data == "b"
+        hub.close()
+        await pool.close()
+
+    asyncio.run(main())
+
+    # The project result queue is left to its consumer
+    assert broker.bodies("results") == [b"for the project"]
+    assert broker.queues["results"].consumers == 0
+
+
+def test_lagging_subscriber_is_closed(broker, pool):
+    hub = Broadcaster(buffer_size=10, max_pending=2, linger=0)
+
+    async def main():
+        with hub.subscribe("results") as slow:
+            await broker.wait_for(lambda: streaming(broker, "results"))
+            relay(broker, "results", b"a", b"b", b"c")
+            await broker.wait_for(lambda: slow.closed)
+            assert [(await slow.next(1)).data for _ in range(2)] == ["a", "b"]
+            with pytest.raises(SubscriptionClosed):
+                await slow.next(1)
+        hub.close()
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_sse_format(broker, pool, monkeypatch):
+    hub = Broadcaster(buffer_size=10, max_pending=10, linger=0)
+    monkeypatch.setattr("src.routers.api.stream.broadcaster", hub)
+
+    async def main():
+        events = sse_events("results", None)
+        chunk = asyncio.create_task(anext(events))
+        await broker.wait_for(lambda: streaming(broker, "results"))
+        relay(broker, "results", b"line 1\nline 2")
+        chunk = await chunk
+        assert chunk.startswith("id: ")
+        assert chunk.endswith("\ndata: line 1\ndata: line 2\n\n")
+        await events.aclose()
+        hub.close()
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_websocket_streams_results(client, broker, monkeypatch):
+    monkeypatch.setattr(Config.Broadcast, "ENABLED", True)
+
+    async def publish():
+        await broker.wait_for(lambda: streaming(broker, "test-result-queue"))
+        relay(broker, "test-result-queue", b"solution")
+
+    with client.websocket_connect("/v1/results/ws") as websocket:
+        # On the app's event loop, which the stub broker belongs to
+        client.portal.call(publish)
+        frame = websocket.receive_json()
+    assert frame["type"] == "result"
+    assert frame["data"] == "solution"
+
+
+def test_streams_are_off_unless_enabled(client, monkeypatch):
+    monkeypatch.setattr(Config.Broadcast, "ENABLED", False)
+    assert client.get("/v1/results/stream").status_code == 404
+
+
+def test_only_the_relayed_queue_can_be_streamed(client, monkeypatch):
+    monkeypatch.setattr(Config.Broadcast, "ENABLED", True)
+    response = client.get("/v1/results/stream", params={"queue_name": "other-queue"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Only test-result-queue is streamed"
+    with (
+        pytest.raises(WebSocketDisconnect) as disconnect,
+        client.websocket_connect("/v1/results/ws?queue_name=other-queue") as websocket,
+    ):
+        websocket.receive_json()
+    assert disconnect.value.code == 1008
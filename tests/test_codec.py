@@ -0,0 +1,82 @@
+import json
+
+import msgspec
+import pytest
+
+from src.codec import MSGPACK, DecodeError, encode
+from src.dispatcher import (
+    InputSolveBatchRequest,
+    InputSolveRequest,
+    OutputSolveRequest,
+    create_solver_message,
+    decode_control_message,
+)
+
+REQUEST = {
+    "problem_id": 1,
+    "instance_id": 2,
+    "solver_id": 3,
+    "vcpus": 4,
+    "memory_gib": 8,
+}
+
+
+def test_decodes_json_and_msgpack():
+    expected = InputSolveRequest(**REQUEST)
+    assert decode_control_message(json.dumps(REQUEST).encode()) == expected
+    assert decode_control_message(msgspec.msgpack.encode(REQUEST), MSGPACK) == expected
+
+
+def test_decodes_batches():
+    body = json.dumps(
+        {
+            "problem_id": 1,
+            "instance_ids": [1, 2],
+            "solver_ids": [3, 3, 4],
+            "vcpus": 2,
+            "memory_gib": 4,
+        }
+    ).encode()
+    batch = decode_control_message(body)
+    assert isinstance(batch, InputSolveBatchRequest)
+    assert batch.solver_ids == [3, 4]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        json.dumps({**REQUEST, "vcpus": "4"}).encode(),
+        json.dumps(
+            {"problem_id": 1, "instance_ids": [1], "vcpus": 2, "memory_gib": 4}
+        ).encode(),
+        b"not json",
+        b"[1, 2]",
+    ],
+)
+def test_rejects_invalid_messages(body):
+    with pytest.raises(DecodeError):
+        decode_control_message(body)
+
+
+def test_errors_name_the_field_of_the_request_kind_sent():
+    with pytest.raises(DecodeError, match="`instance_id`"):
+        decode_control_message(
+            json.dumps(
+                {k: v for k, v in REQUEST.items() if k != "instance_id"}
+            ).encode()
+        )
+    with pytest.raises(DecodeError, match="instance_ids"):
+        decode_control_message(
+            msgspec.msgpack.encode({**REQUEST, "instance_ids": "1"}), MSGPACK
+        )
+
+
+def test_solver_message_roundtrip():
+    message = create_solver_message(InputSolveRequest(**REQUEST), "gecode")
+    assert message.content_type == "application/json"
+    decoded = msgspec.json.decode(message.body, type=OutputSolveRequest)
+    assert (decoded.solver_name, decoded.instance_id) == ("gecode", 2)
+    assert (
+        msgspec.msgpack.decode(encode(decoded, MSGPACK), type=OutputSolveRequest)
+        == decoded
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src import dispatcher
+from src.config import Config
+from src.director import (
+    CircuitBreaker,
+    DirectorUnavailableError,
+    SolverDirectorClient,
+    SolverNotFoundError,
+)
+from src.queues import topology
+from tests.amqp_stub import FakeBroker
+
+SOLVERS = {
+    1: {"id": 1, "name": "gecode", "image_path": "gecode:latest"},
+    2: {"id": 2, "name": "chuffed", "image_path": "chuffed:latest"},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def single_lookup_director(request: httpx.Request) -> httpx.Response:
+    if request.url.params.get("ids"):
+        return httpx.Response(405)
+    solver = SOLVERS.get(int(request.url.path.rsplit("/", 1)[-1]))
+    return httpx.Response(200, json=solver) if solver else httpx.Response(404)
+
+
+def test_client_reuses_one_connection_pool():
+    """All lookups go through one long-lived httpx client"""
+    client = SolverDirectorClient(transport=httpx.MockTransport(single_lookup_director))
+
+    async def main():
+        first = client.client
+        assert await client.get_solver(1) == ("gecode", "gecode:latest")
+        assert await client.get_solver(2) == ("chuffed", "chuffed:latest")
+        assert client.client is first
+        with pytest.raises(SolverNotFoundError):
+            await client.get_solver(3)
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_get_solvers_uses_bulk_endpoint():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        ids = [int(solver_id) for solver_id in request.url.params["ids"].split(",")]
+        return httpx.Response(
+            200, json=[SOLVERS[solver_id] for solver_id in ids if solver_id in SOLVERS]
+        )
+
+    client = SolverDirectorClient(transport=httpx.MockTransport(handler))
+
+    results = asyncio.run(client.get_solvers([1, 2]))
+    assert results == {1: ("gecode", "gecode:latest"), 2: ("chuffed", "chuffed:latest")}
+    assert len(requests) == 1
+
+
+def test_get_solvers_falls_back_to_single_lookups():
+    """Without a bulk endpoint every id is fetched on its own, and errors are reported per id"""
+    client = SolverDirectorClient(transport=httpx.MockTransport(single_lookup_director))
+
+    results = asyncio.run(client.get_solvers([1, 2, 3]))
+    assert results[1] == ("gecode", "gecode:latest")
+    assert results[2] == ("chuffed", "chuffed:latest")
+    assert isinstance(results[3], SolverNotFoundError)
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """After repeated failures the director is not contacted until the reset timeout passed"""
+    clock = FakeClock()
+    healthy = False
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if not healthy:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(200, json=SOLVERS[1])
+
+    client = SolverDirectorClient(
+        transport=httpx.MockTransport(handler),
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock),
+    )
+
+    async def main():
+        nonlocal healthy
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await client.get_solver(1)
+        with pytest.raises(DirectorUnavailableError):
+            await client.get_solver(1)
+        assert len(calls) == 2
+
+        clock.now = 11
+        healthy = True
+        assert await client.get_solver(1) == ("gecode", "gecode:latest")
+        assert not client.breaker.is_open
+
+    asyncio.run(main())
+
+
+def test_dispatcher_parks_messages_while_breaker_is_open(monkeypatch):
+    """A message is parked without using up a retry attempt while the director is down"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+
+    async def unavailable(channel, request):
+        raise DirectorUnavailableError(retry_after=0.01)
+
+    monkeypatch.setattr(dispatcher, "process_request", unavailable)
+
+    async def main():
+        connection = await broker.connect_robust()
+        topology.attach(connection)
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        queue = await channel.declare_queue(control_queue)
+        broker.put(
+            control_queue,
+            json.dumps(
+                {
+                    "problem_id": 1,
+                    "instance_id": 1,
+                    "solver_id": 1,
+                    "vcpus": 1,
+                    "memory_gib": 1,
+                }
+            ).encode(),
+        )
+        message = await queue.get()
+        await dispatcher.handle_message(channel, control_queue, message)
+
+    asyncio.run(main())
+
+    # Acked rather than requeued, so it does not count against the queue's delivery limit
+    assert (
+        not broker.queues[control_queue].ready
+        and broker.queues[control_queue].unacked == 0
+    )
+    [parked] = broker.queues[f"{control_queue}.parked"].ready
+    assert parked.headers == {}
+    assert parked.properties["expiration"] == 0.01
+    assert (
+        broker.queues[f"{control_queue}.parked"].arguments["x-dead-letter-routing-key"]
+        == control_queue
+    )
+    assert not broker.bodies(f"{control_queue}.retry.5s")
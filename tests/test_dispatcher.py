@@ -0,0 +1,311 @@
+import asyncio
+import json
+import time
+from datetime import UTC, datetime
+
+from prometheus_client import REGISTRY
+
+from src import dispatcher
+from src.config import Config
+from src.director import SolverNotFoundError
+from tests.amqp_stub import FakeBroker
+
+
+def make_request(instance_id: int) -> bytes:
+    return json.dumps(
+        {
+            "problem_id": 1,
+            "instance_id": instance_id,
+            "solver_id": 7,
+            "vcpus": 2,
+            "memory_gib": 4,
+        }
+    ).encode()
+
+
+def run_dispatcher(monkeypatch, broker: FakeBroker, scenario):
+    monkeypatch.setattr(dispatcher.aio_pika, "connect_robust", broker.connect_robust)
+
+    async def main():
+        task = asyncio.create_task(dispatcher.start_dispatcher())
+        try:
+            await scenario(task)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_dispatcher_bounds_concurrency(monkeypatch):
+    """Requests are processed concurrently, but never more than MAX_IN_FLIGHT at once"""
+    monkeypatch.setattr(Config.Dispatcher, "MAX_IN_FLIGHT", 4)
+    monkeypatch.setattr(Config.Dispatcher, "PREFETCH_COUNT", 8)
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    for instance_id in range(20):
+        broker.put(control_queue, make_request(instance_id))
+
+    running = 0
+    peak = 0
+    processed = []
+
+    async def fake_process_request(channel, request):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        processed.append(request.instance_id)
+
+    monkeypatch.setattr(dispatcher, "process_request", fake_process_request)
+
+    async def scenario(task):
+        await broker.wait_for(lambda: len(processed) == 20)
+        await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert peak == 4
+    assert sorted(processed) == list(range(20))
+    assert not broker.queues[control_queue].ready
+
+
+def test_dispatcher_retries_failed_requests(monkeypatch):
+    """A failing request goes through the retry ladder without blocking the others"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    broker.put(control_queue, make_request(1))
+    broker.put(control_queue, make_request(2))
+
+    processed = []
+
+    async def fake_process_request(channel, request):
+        if request.instance_id == 2:
+            raise ConnectionError("broker hiccup")
+        processed.append(request.instance_id)
+
+    monkeypatch.setattr(dispatcher, "process_request", fake_process_request)
+
+    async def scenario(task):
+        await broker.wait_for(lambda: broker.bodies(f"{control_queue}.retry.5s"))
+        await broker.wait_for(lambda: processed == [1])
+
+    retries = (
+        REGISTRY.get_sample_value(
+            "solver_controller_dispatch_retries_total",
+            {"destination": "retry", "exception": "ConnectionError"},
+        )
+        or 0
+    )
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert broker.bodies(f"{control_queue}.retry.5s") == [make_request(2)]
+    assert (
+        REGISTRY.get_sample_value(
+            "solver_controller_dispatch_retries_total",
+            {"destination": "retry", "exception": "ConnectionError"},
+        )
+        == retries + 1
+    )
+
+
+def test_dispatcher_sends_poison_messages_straight_to_the_dlq(monkeypatch):
+    """A message that can never be decoded skips the retry ladder, with the reason in its headers"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    broker.put(control_queue, b"not json")
+
+    async def scenario(task):
+        await broker.wait_for(lambda: broker.bodies(f"{control_queue}.dlq"))
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert not broker.bodies(f"{control_queue}.retry.5s")
+    headers = broker.queues[f"{control_queue}.dlq"].ready[0].headers
+    assert headers["x-error-class"] == "permanent"
+    assert headers["x-error-type"] == "DecodeError"
+    assert headers["x-error"]
+
+
+def test_requests_past_their_deadline_are_dropped(monkeypatch):
+    """Expired requests are acked without being routed; the others carry their deadline to the solver"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    now = time.time()
+    for instance_id, deadline in ((10, now - 1), (11, now + 600)):
+        request = json.loads(make_request(instance_id))
+        broker.put(
+            control_queue, json.dumps({**request, "deadline": deadline}).encode()
+        )
+    # Submitted an hour ago with a ten minute budget
+    broker.put(
+        control_queue,
+        json.dumps({**json.loads(make_request(12)), "time_budget": 600}).encode(),
+        timestamp=datetime.fromtimestamp(now - 3600, UTC),
+    )
+
+    async def fake_get_solver_info(solver_id):
+        return "gecode", "gecode:latest"
+
+    async def fake_deploy_solver(*args):
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solver_info", fake_get_solver_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+    dropped = (
+        REGISTRY.get_sample_value(
+            "solver_controller_expired_requests_total", {"stage": "dispatch"}
+        )
+        or 0
+    )
+    solver_queue = dispatcher.solver_queue_name(7, 2, 4)
+
+    async def scenario(task):
+        await broker.wait_for(lambda: not broker.queues[control_queue].ready)
+        await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    [routed] = broker.queues[solver_queue].ready
+    assert json.loads(routed.body)["instance_id"] == 11
+    assert routed.headers["x-deadline"] == now + 600
+    assert 590 < routed.headers["x-solver-timeout"] < 600
+    assert 590 < routed.properties["expiration"] <= 600
+    assert (
+        REGISTRY.get_sample_value(
+            "solver_controller_expired_requests_total", {"stage": "dispatch"}
+        )
+        == dropped + 2
+    )
+
+
+def test_queues_deleted_behind_the_topology_are_declared_again(monkeypatch):
+    """A solver queue another replica reaped is declared again instead of losing the message"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    solver_queue = dispatcher.solver_queue_name(7, 2, 4)
+
+    async def fake_get_solver_info(solver_id):
+        return "gecode", "gecode:latest"
+
+    async def fake_get_solvers_info(solver_ids):
+        return {solver_id: ("gecode", "gecode:latest") for solver_id in solver_ids}
+
+    async def fake_deploy_solver(*args):
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solver_info", fake_get_solver_info)
+    monkeypatch.setattr(dispatcher, "get_solvers_info", fake_get_solvers_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+
+    async def scenario(task):
+        broker.put(control_queue, make_request(10))
+        await broker.wait_for(lambda: broker.bodies(solver_queue))
+        del broker.queues[solver_queue]
+        broker.put(control_queue, make_request(11))
+        await broker.wait_for(lambda: broker.bodies(solver_queue))
+        del broker.queues[solver_queue]
+        broker.put(
+            control_queue,
+            json.dumps(
+                {
+                    "problem_id": 1,
+                    "instance_ids": [12, 13],
+                    "solver_ids": [7],
+                    "vcpus": 2,
+                    "memory_gib": 4,
+                }
+            ).encode(),
+        )
+        await broker.wait_for(lambda: len(broker.bodies(solver_queue)) == 2)
+        await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert [
+        json.loads(body)["instance_id"] for body in broker.bodies(solver_queue)
+    ] == [12, 13]
+    assert not broker.bodies(f"{control_queue}.retry.{Config.Retry.DELAYS[0]}s")
+
+
+def test_dispatcher_drains_in_flight_requests_on_shutdown(monkeypatch):
+    """Cancelling the dispatcher lets in-flight requests finish and ack"""
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    for instance_id in range(3):
+        broker.put(control_queue, make_request(instance_id))
+
+    started = []
+    finished = []
+
+    async def fake_process_request(channel, request):
+        started.append(request.instance_id)
+        await asyncio.sleep(0.05)
+        finished.append(request.instance_id)
+
+    monkeypatch.setattr(dispatcher, "process_request", fake_process_request)
+
+    async def scenario(task):
+        await broker.wait_for(lambda: len(started) == 3)
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert sorted(finished) == [0, 1, 2]
+    assert broker.queues[control_queue].unacked == 0
+    assert not broker.queues[control_queue].ready
+
+
+def test_batch_is_fanned_out_per_solver(monkeypatch):
+    """A batch is expanded per solver, and items of an unknown solver are dead-lettered one by one"""
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", False)
+    monkeypatch.setattr(Config.Race, "ENABLED", False)
+    broker = FakeBroker()
+    control_queue = Config.Controller.CONTROL_QUEUE
+    broker.put(
+        control_queue,
+        json.dumps(
+            {
+                "problem_id": 1,
+                "instance_ids": [10, 11, 12],
+                "solver_ids": [7, 8],
+                "vcpus": 2,
+                "memory_gib": 4,
+            }
+        ).encode(),
+    )
+    lookups = []
+    deploys = []
+
+    async def fake_get_solvers_info(solver_ids):
+        lookups.append(solver_ids)
+        return {7: ("gecode", "gecode:latest"), 8: SolverNotFoundError(8)}
+
+    async def fake_deploy_solver(solver_type, *args):
+        deploys.append(solver_type)
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solvers_info", fake_get_solvers_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+
+    async def scenario(task):
+        await broker.wait_for(lambda: len(broker.bodies(f"{control_queue}.dlq")) == 3)
+        await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+
+    run_dispatcher(monkeypatch, broker, scenario)
+
+    assert lookups == [[7, 8]]
+    assert deploys == ["gecode"]
+    solver_queue = dispatcher.solver_queue_name(7, 2, 4)
+    assert [
+        json.loads(body)["instance_id"] for body in broker.bodies(solver_queue)
+    ] == [10, 11, 12]
+    dead = [json.loads(body) for body in broker.bodies(f"{control_queue}.dlq")]
+    assert [(item["solver_id"], item["instance_id"]) for item in dead] == [
+        (8, 10),
+        (8, 11),
+        (8, 12),
+    ]
+    assert not broker.queues[control_queue].ready
+    # Without the relay the project declares its result queue; the dispatcher leaves it alone
+    assert Config.Controller.PROJECT_SOLVER_RESULT_QUEUE not in broker.queues
@@ -0,0 +1,36 @@
+import httpx
+
+from src.codec import DecodeError
+from src.director import DirectorUnavailableError, SolverNotFoundError
+from src.errors import ErrorClass, ErrorClassifier, classifier
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://director/solvers/1")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status, request=request)
+    )
+
+
+def test_default_rules():
+    assert classifier.classify(DecodeError("bad")) is ErrorClass.PERMANENT
+    assert classifier.classify(SolverNotFoundError(7)) is ErrorClass.PERMANENT
+    assert classifier.classify(DirectorUnavailableError(3)) is ErrorClass.THROTTLED
+    assert classifier.classify(http_error(404)) is ErrorClass.PERMANENT
+    assert classifier.classify(http_error(429)) is ErrorClass.THROTTLED
+    assert classifier.classify(http_error(503)) is ErrorClass.TRANSIENT
+    assert classifier.classify(ConnectionError()) is ErrorClass.TRANSIENT
+
+
+def test_closest_registered_class_wins():
+    custom = ErrorClassifier()
+    custom.register(LookupError, ErrorClass.PERMANENT)
+    custom.register(
+        KeyError,
+        lambda e: ErrorClass.THROTTLED if e.args == ("busy",) else ErrorClass.TRANSIENT,
+    )
+
+    assert custom.classify(IndexError()) is ErrorClass.PERMANENT
+    assert custom.classify(KeyError("busy")) is ErrorClass.THROTTLED
+    assert custom.classify(KeyError("other")) is ErrorClass.TRANSIENT
+    assert custom.classify(RuntimeError()) is ErrorClass.TRANSIENT
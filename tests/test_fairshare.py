@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src import dispatcher, fairshare, informer
+from src.amqp import ChannelPool
+from src.config import Config
+from src.fairshare import FairShareForwarder, lane
+from src.informer import Informer
+from src.spawner import create_keda_scaled_object_manifest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def submitters_on_distinct_shards(queue_name: str, count: int) -> list[str]:
+    keys, lanes = [], set()
+    for n in range(100):
+        _, name = lane(queue_name, 0, f"user-{n}")
+        if name not in lanes:
+            keys.append(f"user-{n}")
+            lanes.add(name)
+        if len(keys) == count:
+            return keys
+    raise AssertionError("not enough shards")
+
+
+@pytest.fixture
+def solver_queue(broker, monkeypatch):
+    monkeypatch.setattr(Config.FairShare, "ENABLED", True)
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    monkeypatch.setattr(
+        fairshare, "channel_pool", ChannelPool(max_channels=4, acquire_timeout=1)
+    )
+    scaled_object = create_keda_scaled_object_manifest(
+        "gecode", "solvers", "q-gecode", 2, 4
+    )
+    scaled_object["spec"]["maxReplicaCount"] = 4
+    informer.scaled_objects.add(scaled_object)
+    return "q-gecode"
+
+
+def test_forwarder_meters_by_priority_then_round_robin(broker, solver_queue):
+    forwarder = FairShareForwarder(interval=1, scan_interval=60)
+    heavy, light = submitters_on_distinct_shards(solver_queue, 2)
+    for key, priority, count in ((heavy, 0, 10), (light, 0, 2), ("urgent", 2, 1)):
+        level, name = lane(solver_queue, priority, key)
+        for n in range(count):
+            broker.put(
+                name, f"{key}-{n}".encode(), {"x-priority": level, "x-submitted-at": 0}
+            )
+        forwarder.staged(solver_queue, level, name)
+
+    async def main():
+        rounds = []
+        for _ in range(2):
+            await forwarder.forward_all()
+            rounds.append([body.decode() for body in broker.bodies(solver_queue)])
+            broker.queues[solver_queue].ready.clear()  # Solvers took the work
+        await fairshare.channel_pool.close()
+        return rounds
+
+    first, second = asyncio.run(main())
+
+    # maxReplicaCount 4 x one message per replica: the urgent request first, then the submitters take turns
+    assert first == ["urgent-0", f"{heavy}-0", f"{light}-0", f"{heavy}-1"]
+    assert second == [f"{light}-1", f"{heavy}-2", f"{heavy}-3", f"{heavy}-4"]
+    assert forwarder.pending(solver_queue) == 5
+
+
+def test_dispatcher_stages_requests_when_fair_share_is_on(
+    broker, solver_queue, monkeypatch
+):
+    staged = []
+    monkeypatch.setattr(
+        dispatcher.forwarder, "staged", lambda *args: staged.append(args)
+    )
+
+    async def fake_get_solver_info(solver_id):
+        return "gecode", "gecode:latest"
+
+    async def fake_deploy_solver(*args):
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solver_info", fake_get_solver_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+    request = dispatcher.InputSolveRequest(
+        1, 10, 7, 2, 4, priority=5, submitter="alice", submitted_at=123.0
+    )
+
+    async def main():
+        connection = await broker.connect_robust()
+        await dispatcher.process_request(await connection.channel(), request)
+
+    asyncio.run(main())
+
+    queue_name = dispatcher.solver_queue_name(7, 2, 4)
+    level, staging = lane(queue_name, 5, "alice")
+    assert staged == [(queue_name, level, staging)]
+    assert not broker.bodies(queue_name)
+    message = broker.queues[staging].ready[0]
+    assert json.loads(message.body)["instance_id"] == 10
+    assert message.headers == {"x-submitted-at": 123.0, "x-priority": level}
+    assert message.properties["priority"] == 5
+
+
+def test_forwarder_drops_staged_requests_past_their_deadline(broker, solver_queue):
+    forwarder = FairShareForwarder(interval=1, scan_interval=60)
+    level, name = lane(solver_queue, 0, "alice")
+    now = time.time()
+    broker.put(name, b"stale", {"x-priority": level, "x-deadline": now - 1})
+    broker.put(name, b"fresh", {"x-priority": level, "x-deadline": now + 600})
+    forwarder.staged(solver_queue, level, name)
+    dropped = (
+        REGISTRY.get_sample_value(
+            "solver_controller_expired_requests_total", {"stage": "forward"}
+        )
+        or 0
+    )
+
+    async def main():
+        await forwarder.forward_all()
+        await fairshare.channel_pool.close()
+
+    asyncio.run(main())
+
+    assert broker.bodies(solver_queue) == [b"fresh"]
+    assert 590 < broker.queues[solver_queue].ready[0].properties["expiration"] <= 600
+    assert (
+        REGISTRY.get_sample_value(
+            "solver_controller_expired_requests_total", {"stage": "forward"}
+        )
+        == dropped + 1
+    )
+    assert not broker.bodies(name)
+
+
+def test_forwarder_restages_what_it_failed_to_forward(broker, solver_queue):
+    forwarder = FairShareForwarder(interval=1, scan_interval=60)
+    level, name = lane(solver_queue, 0, "alice")
+    broker.put(name, b"job-0", {"x-priority": level})
+    broker.put(name, b"job-1", {"x-priority": level})
+    forwarder.staged(solver_queue, level, name)
+    broker.nack_routing_keys.add(solver_queue)
+
+    async def main():
+        for _ in range(3):
+            assert await forwarder.forward_all() == 0
+        broker.nack_routing_keys.clear()
+        assert await forwarder.forward_all() == 2
+        await fairshare.channel_pool.close()
+
+    asyncio.run(main())
+
+    # Failed rounds use up none of the staging queue's delivery attempts
+    assert [
+        message.headers.get("x-delivery-count")
+        for message in broker.queues[solver_queue].ready
+    ] == [None, None]
+    assert broker.bodies(solver_queue) == [b"job-0", b"job-1"]
+
+
+def test_forwarder_finds_work_other_replicas_staged(broker, solver_queue):
+    """Only the leader forwards, so it periodically looks for lanes it was not told about"""
+    clock = Clock()
+    forwarder = FairShareForwarder(interval=1, scan_interval=30, clock=clock)
+    _, name = lane(solver_queue, 0, "alice")
+
+    async def main():
+        await forwarder.forward_all()
+        # Staged by the dispatcher of another replica, which told only its own forwarder
+        broker.put(name, b"job-0")
+        broker.put(name, b"job-1")
+        for _ in range(4):
+            broker.put(solver_queue, b"running")
+        await forwarder.forward_all()
+        assert forwarder.pending(solver_queue) == 0
+        clock.now = 30
+        await forwarder.forward_all()
+        assert forwarder.pending(solver_queue) == 2
+        broker.queues[solver_queue].ready.clear()  # Solvers took the work
+        await forwarder.forward_all()
+        await fairshare.channel_pool.close()
+
+    asyncio.run(main())
+
+    assert broker.bodies(solver_queue) == [b"job-0", b"job-1"]
+    assert forwarder.pending(solver_queue) == 0
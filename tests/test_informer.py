@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+
+from kubernetes.client.rest import ApiException
+
+from src import dispatcher, informer, kube
+from src.config import Config
+from src.informer import Informer
+from src.spawner import deployment_name, scaled_object_name
+
+
+class FakeResponse:
+    def __init__(self, payload=None, events=()):
+        self.data = json.dumps(payload).encode() if payload is not None else b""
+        self._events = events
+
+    def stream(self, amt=None, decode_content=False):
+        for event in self._events:
+            yield (json.dumps(event) + "\n").encode()
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+def deployment(name: str, resource_version: str) -> dict:
+    return {"metadata": {"name": name, "resourceVersion": resource_version}}
+
+
+def test_informer_lists_follows_and_resyncs(monkeypatch):
+    """The index follows watch events and relists after the watch expires"""
+    monkeypatch.setattr(Config.Kubernetes, "RESYNC_BACKOFF", 0)
+    calls = []
+    done = threading.Event()
+    responses = [
+        FakeResponse(
+            {
+                "metadata": {"resourceVersion": "1"},
+                "items": [deployment("solver-a", "1")],
+            }
+        ),
+        FakeResponse(
+            events=[
+                {"type": "ADDED", "object": deployment("solver-b", "2")},
+                {"type": "DELETED", "object": deployment("solver-a", "3")},
+                {
+                    "type": "ERROR",
+                    "object": {"code": 410, "reason": "Gone", "message": "too old"},
+                },
+            ]
+        ),
+        FakeResponse(
+            {
+                "metadata": {"resourceVersion": "9"},
+                "items": [deployment("solver-c", "9")],
+            }
+        ),
+    ]
+
+    def list_func(**kwargs):
+        calls.append(kwargs)
+        if not responses:
+            done.set()
+            raise ApiException(status=500)
+        return responses.pop(0)
+
+    index = Informer("test", list_func, namespace="solvers")
+    index.start()
+    assert done.wait(5)
+    index.stop()
+
+    assert not calls[0].get("watch")
+    assert calls[1]["watch"] and calls[1]["resource_version"] == "1"
+    assert not calls[2].get("watch")
+    assert index.names() == ["solver-c"]
+
+
+def test_deploy_solver_skips_existing_objects(monkeypatch):
+    """No API call is made when both objects are already indexed"""
+    created = []
+
+    class FakeAppsV1Api:
+        def create_namespaced_deployment(self, namespace, body):
+            created.append(body["metadata"]["name"])
+
+    class FakeCustomObjectsApi:
+        def create_namespaced_custom_object(
+            self, group, version, namespace, plural, body
+        ):
+            created.append(body["metadata"]["name"])
+
+    monkeypatch.setattr(kube, "apps_v1", FakeAppsV1Api)
+    monkeypatch.setattr(kube, "custom_objects", FakeCustomObjectsApi)
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                dispatcher.deploy_solver(
+                    "gecode",
+                    "gecode:latest",
+                    "solvers",
+                    "queue-in",
+                    "queue-out",
+                    60,
+                    2,
+                    4,
+                )
+                for _ in range(3)
+            )
+        )
+
+    assert asyncio.run(main()) == [True, True, True]
+
+    assert created == [
+        deployment_name("gecode", 2, 4),
+        scaled_object_name("gecode", 2, 4),
+    ]
+    # The lock serializing the three is gone with the last of them
+    assert not dispatcher._deploy_locks
+
+
+def test_deploy_solver_updates_a_changed_deployment_once(monkeypatch):
+    """A changed image is patched in, with a single call; an unchanged spec costs no call"""
+    calls = []
+
+    class FakeAppsV1Api:
+        def create_namespaced_deployment(self, namespace, body):
+            calls.append(
+                ("create", body["spec"]["template"]["spec"]["containers"][0]["image"])
+            )
+
+        def patch_namespaced_deployment(self, name, namespace, body, _content_type):
+            assert "replicas" not in body["spec"]
+            calls.append(
+                ("patch", body["spec"]["template"]["spec"]["containers"][0]["image"])
+            )
+
+    monkeypatch.setattr(kube, "apps_v1", FakeAppsV1Api)
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    informer.scaled_objects.add(
+        {"metadata": {"name": scaled_object_name("gecode", 2, 4)}}
+    )
+
+    async def main():
+        for image in ("gecode:1", "gecode:1", "gecode:2", "gecode:2"):
+            assert await dispatcher.deploy_solver(
+                "gecode", image, "solvers", "queue-in", "queue-out", 60, 2, 4
+            )
+
+    asyncio.run(main())
+
+    assert calls == [("create", "gecode:1"), ("patch", "gecode:2")]
+    live = informer.deployments.get(deployment_name("gecode", 2, 4))
+    assert live["spec"]["template"]["spec"]["containers"][0]["image"] == "gecode:2"
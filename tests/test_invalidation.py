@@ -0,0 +1,50 @@
+import asyncio
+
+from src import invalidation
+from src.amqp import ChannelPool
+from src.config import Config
+from src.invalidation import RESULT, SOLVER, Invalidator
+
+
+def test_invalidations_reach_every_other_process(broker, monkeypatch):
+    monkeypatch.setattr(
+        invalidation, "channel_pool", ChannelPool(max_channels=2, acquire_timeout=1)
+    )
+    applied = []
+    monkeypatch.setattr(
+        invalidation, "apply", lambda invalidation: applied.append(invalidation) or 1
+    )
+    exchange = Config.Controller.INVALIDATION_EXCHANGE
+    # Two processes, e.g. two gunicorn workers
+    serving, other = Invalidator(exchange), Invalidator(exchange)
+
+    async def main():
+        tasks = [asyncio.create_task(process.run()) for process in (serving, other)]
+        try:
+            await broker.wait_for(lambda: len(broker.bindings.get(exchange, ())) == 2)
+            assert await serving.invalidate(SOLVER, 3) == 1
+            await broker.wait_for(lambda: len(applied) == 2)
+            assert await serving.invalidate(RESULT) == 1
+            await broker.wait_for(lambda: len(applied) == 4)
+            await asyncio.sleep(0.01)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await invalidation.channel_pool.close()
+
+    asyncio.run(main())
+    # Applied once where it was requested and once by the other process, never twice by the first
+    assert [(i.cache, i.solver_id, i.origin) for i in applied] == [
+        (SOLVER, 3, serving.identity),
+        (SOLVER, 3, serving.identity),
+        (RESULT, None, serving.identity),
+        (RESULT, None, serving.identity),
+    ]
+
+
+def test_api_only_processes_refuse_admin_routes(client, monkeypatch):
+    monkeypatch.setattr(Config.Controller, "ROLE", "api")
+    response = client.delete("/v1/admin/solvers/3/cache")
+    assert response.status_code == 409
+    assert client.get("/v1/admin/capacity").status_code == 409
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from src import kube
+
+
+def test_call_does_not_block_the_event_loop():
+    """Slow API calls run on worker threads, in parallel, while the loop keeps serving"""
+    ticks = 0
+
+    def slow_api_call(name):
+        time.sleep(0.2)
+        return name
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticking = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            kube.call("test", slow_api_call, "a"),
+            kube.call("test", slow_api_call, name="b"),
+        )
+        elapsed = time.perf_counter() - start
+        ticking.cancel()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(main())
+    assert results == ["a", "b"]
+    assert elapsed < 0.35
+    assert ticks >= 10
+
+
+def test_call_latency_is_exported(client):
+    async def main():
+        await kube.call("test_export", lambda: None)
+
+    asyncio.run(main())
+    response = client.get("/metrics")
+    assert (
+        'solver_controller_kubernetes_request_seconds_count{operation="test_export",outcome="ok"}'
+        in response.text
+    )
@@ -0,0 +1,112 @@
+import asyncio
+import copy
+
+import pytest
+from kubernetes.client.rest import ApiException
+
+from src import kube
+from src.leader import LeaderElector
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    stored = {}
+
+    class FakeCoordinationV1Api:
+        def read_namespaced_lease(self, name, namespace):
+            if name not in stored:
+                raise ApiException(status=404)
+            return copy.deepcopy(stored[name])
+
+        def create_namespaced_lease(self, namespace, body):
+            if body.metadata.name in stored:
+                raise ApiException(status=409)
+            body.metadata.resource_version = "1"
+            stored[body.metadata.name] = copy.deepcopy(body)
+
+        def replace_namespaced_lease(self, name, namespace, body):
+            if body.metadata.resource_version != stored[name].metadata.resource_version:
+                raise ApiException(status=409)
+            body.metadata.resource_version = str(
+                int(body.metadata.resource_version) + 1
+            )
+            stored[name] = copy.deepcopy(body)
+
+    monkeypatch.setattr(kube, "coordination_v1", FakeCoordinationV1Api)
+    return stored
+
+
+def elector(identity: str, clock: Clock) -> LeaderElector:
+    return LeaderElector(
+        "leader",
+        "ns",
+        identity,
+        lease_duration=15,
+        renew_deadline=10,
+        retry_period=2,
+        clock=clock,
+    )
+
+
+def test_one_process_holds_the_lease_until_it_expires(leases):
+    clock = Clock()
+    a, b = elector("a", clock), elector("b", clock)
+
+    async def scenario():
+        assert await a.try_acquire_or_renew()
+        assert not await b.try_acquire_or_renew()
+        clock.now = 10
+        assert await a.try_acquire_or_renew()
+        clock.now = 20
+        # b saw a renewal at 10, so the Lease is still live for b
+        assert not await b.try_acquire_or_renew()
+        clock.now = 40
+        assert await b.try_acquire_or_renew()
+        assert not await a.try_acquire_or_renew()
+
+    asyncio.run(scenario())
+    assert leases["leader"].spec.holder_identity == "b"
+    assert leases["leader"].spec.lease_transitions == 1
+
+
+def test_released_lease_is_taken_over_at_once(leases):
+    clock = Clock()
+    a, b = elector("a", clock), elector("b", clock)
+
+    async def scenario():
+        assert await a.try_acquire_or_renew()
+        assert not await b.try_acquire_or_renew()
+        await a.release()
+        return await b.try_acquire_or_renew()
+
+    assert asyncio.run(scenario())
+    assert leases["leader"].spec.holder_identity == "b"
+
+
+def test_duties_run_only_while_leading(leases):
+    clock = Clock()
+    started = []
+
+    async def duty():
+        started.append(clock.now)
+        await asyncio.Event().wait()
+
+    async def scenario():
+        a = elector("a", clock)
+        task = asyncio.create_task(a.run([duty]))
+        await asyncio.sleep(0.01)
+        assert a.is_leader and started == [0.0]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert not a.is_leader
+        return leases["leader"].spec.holder_identity
+
+    assert asyncio.run(scenario()) is None
@@ -1,3 +1,10 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from src import metrics
+from src.config import Config
+
+
 def test_metrics_endpoint(client):
     """Test the metrics endpoint"""
     response = client.get("/metrics")
@@ -10,3 +17,32 @@ def test_metrics_endpoint(client):
     assert data.startswith("# HELP")
     # Should have both process and python data
     assert "python_" in data
+
+
+def test_solver_label_is_bounded(monkeypatch):
+    monkeypatch.setattr(Config.Metrics, "MAX_SOLVER_LABELS", 2)
+    monkeypatch.setattr(metrics, "_solver_labels", set())
+    assert [metrics.solver_label(solver_id) for solver_id in (1, 2, 3, 1)] == [
+        "1",
+        "2",
+        "other",
+        "1",
+    ]
+
+
+def test_stage_records_outcome():
+    def count(outcome):
+        return (
+            REGISTRY.get_sample_value(
+                "solver_controller_dispatch_stage_seconds_count",
+                {"stage": "lookup", "solver": "9", "outcome": outcome},
+            )
+            or 0
+        )
+
+    ok, error = count("ok"), count("error")
+    with metrics.stage("lookup", "9"):
+        pass
+    with pytest.raises(ValueError), metrics.stage("lookup", "9"):
+        raise ValueError()
+    assert (count("ok"), count("error")) == (ok + 1, error + 1)
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from kubernetes.client.rest import ApiException
+from prometheus_client import REGISTRY
+
+from src import informer, kube, prewarm
+from src.amqp import ChannelPool
+from src.informer import Informer
+from src.prewarm import Prewarmer
+from src.spawner import (
+    create_keda_scaled_object_manifest,
+    create_solver_deployment_manifest,
+    deployment_name,
+    scaled_object_name,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def prepulled(manifest: dict) -> list[str]:
+    """The solver images a pre-pull DaemonSet pulls, each of which must run the shared `true`"""
+    copy, *containers = manifest["spec"]["template"]["spec"]["initContainers"]
+    assert copy["command"] == ["cp", "/bin/busybox", "/prepull/true"]
+    assert all(container["command"] == ["/prepull/true"] for container in containers)
+    return [container["image"] for container in containers]
+
+
+@pytest.fixture
+def solvers(broker, monkeypatch):
+    calls = []
+
+    class FakeAppsV1Api:
+        def create_namespaced_daemon_set(self, namespace, body):
+            calls.append(("create", prepulled(body)))
+            if len(calls) > 1:
+                raise ApiException(status=409)
+
+        def patch_namespaced_daemon_set(self, name, namespace, body, _content_type):
+            calls.append(("patch", prepulled(body)))
+
+    class FakeCustomObjectsApi:
+        def patch_namespaced_custom_object(
+            self, group, version, namespace, plural, name, body
+        ):
+            calls.append((name, body["spec"]["minReplicaCount"]))
+
+    monkeypatch.setattr(kube, "apps_v1", FakeAppsV1Api)
+    monkeypatch.setattr(kube, "custom_objects", FakeCustomObjectsApi)
+    monkeypatch.setattr(
+        prewarm, "channel_pool", ChannelPool(max_channels=4, acquire_timeout=1)
+    )
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    for solver in ("gecode", "chuffed"):
+        informer.deployments.add(
+            create_solver_deployment_manifest(
+                solver, "solvers", f"{solver}:1", 2, 4, f"q-{solver}", "out", 60
+            )
+        )
+        informer.scaled_objects.add(
+            create_keda_scaled_object_manifest(solver, "solvers", f"q-{solver}", 2, 4)
+        )
+    return calls
+
+
+def test_busy_queues_are_warmed_until_arrivals_stop(solvers):
+    clock = Clock()
+    prewarmer = Prewarmer(interval=15, half_life=600, clock=clock)
+    gecode = scaled_object_name("gecode", 2, 4)
+
+    cold = (
+        REGISTRY.get_sample_value(
+            "solver_controller_prewarm_arrivals_total", {"outcome": "cold"}
+        )
+        or 0
+    )
+    for _ in range(10):
+        clock.now += 60
+        prewarmer.record("q-gecode", deployment_name("gecode", 2, 4))
+    assert 0.005 < prewarmer.rate("q-gecode") < 1 / 60
+    assert (
+        REGISTRY.get_sample_value(
+            "solver_controller_prewarm_arrivals_total", {"outcome": "cold"}
+        )
+        == cold + 10
+    )
+
+    assert asyncio.run(prewarmer.adjust()) == {gecode: 1}
+    assert asyncio.run(prewarmer.adjust()) == {gecode: 1}
+    assert solvers == [(gecode, 1)]
+    assert informer.scaled_objects.get(gecode)["spec"]["minReplicaCount"] == 1
+    assert REGISTRY.get_sample_value("solver_controller_prewarm_warm_replicas") == 1
+
+    clock.now += 6 * 600
+    assert asyncio.run(prewarmer.adjust()) == {}
+    assert solvers == [(gecode, 1), (gecode, 0)]
+
+
+def test_prepull_follows_the_solver_images(solvers):
+    prewarmer = Prewarmer(interval=15, half_life=600)
+
+    async def main():
+        await prewarmer.prepull()
+        await prewarmer.prepull()
+        informer.deployments.update(
+            create_solver_deployment_manifest(
+                "gecode", "solvers", "gecode:2", 2, 4, "q-gecode", "out", 60
+            )
+        )
+        await prewarmer.prepull()
+
+    asyncio.run(main())
+
+    assert solvers == [
+        ("create", ["chuffed:1", "gecode:1"]),
+        ("create", ["chuffed:1", "gecode:2"]),
+        ("patch", ["chuffed:1", "gecode:2"]),
+    ]
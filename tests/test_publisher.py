@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import aio_pika
+import pytest
+
+from src.metrics import PUBLISH_OUTSTANDING
+from src.publisher import publish, publish_many
+from tests.amqp_stub import FakeBroker
+
+
+def test_publish_many_pipelines_confirms():
+    """Confirms for a batch are awaited together rather than one round trip at a time"""
+    broker = FakeBroker()
+    broker.confirm_delay = 0.05
+    broker.nack_routing_keys = {"rejected"}
+    broker.queue("accepted")
+    outstanding = []
+
+    async def main():
+        connection = await broker.connect_robust()
+        channel = await connection.channel(publisher_confirms=True)
+        messages = [
+            (aio_pika.Message(body=str(i).encode()), "accepted") for i in range(20)
+        ]
+        messages.append((aio_pika.Message(body=b"x"), "rejected"))
+
+        publishing = asyncio.create_task(publish_many(channel, messages))
+        await asyncio.sleep(0.01)
+        outstanding.append(PUBLISH_OUTSTANDING._value.get())
+        return await publishing
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert outstanding == [21]
+    assert results[:20] == [None] * 20
+    assert isinstance(results[20], aio_pika.exceptions.DeliveryError)
+    assert broker.bodies("accepted") == [str(i).encode() for i in range(20)]
+    assert PUBLISH_OUTSTANDING._value.get() == 0
+
+
+def test_unroutable_messages_fail_the_publish():
+    """A mandatory message no queue takes raises instead of being confirmed and lost"""
+    broker = FakeBroker()
+
+    async def main():
+        connection = await broker.connect_robust()
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        with pytest.raises(aio_pika.exceptions.PublishError):
+            await publish(channel, aio_pika.Message(body=b"lost"), "missing")
+        # Unless the caller does not mind
+        await publish(
+            channel, aio_pika.Message(body=b"dropped"), "missing", mandatory=False
+        )
+
+    asyncio.run(main())
+
+    assert "missing" not in broker.queues
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import UTC, datetime
+
+from src.queues import RETRY_DELAYS, Topology, retry_or_dlq
+from tests.amqp_stub import FakeBroker
+
+
+def test_topology_declares_each_queue_once_per_connection():
+    broker = FakeBroker()
+    topology = Topology()
+
+    async def main():
+        connection = await broker.connect_robust()
+        topology.attach(connection)
+        channel = await connection.channel()
+
+        await asyncio.gather(
+            *(topology.ensure(channel, "solver-queue") for _ in range(10))
+        )
+        assert broker.declare_count == 1
+
+        await connection.simulate_reconnect()
+        await topology.ensure(channel, "solver-queue")
+        await topology.ensure(channel, "solver-queue")
+        assert broker.declare_count == 2
+
+    asyncio.run(main())
+
+
+def test_retry_or_dlq_declares_the_retry_ladder_first():
+    """Retries are never published to a retry queue that does not exist yet"""
+    broker = FakeBroker()
+    submitted = datetime(2026, 1, 1, tzinfo=UTC)
+    broker.put("control", b"request", timestamp=submitted)
+
+    async def main():
+        connection = await broker.connect_robust()
+        channel = await connection.channel()
+        queue = await channel.declare_queue("control")
+        message = await queue.get()
+        await retry_or_dlq(channel, "control", message, RuntimeError("boom"))
+
+    asyncio.run(main())
+
+    retry_queue = broker.queues[f"control.retry.{RETRY_DELAYS[0]}s"]
+    assert retry_queue.arguments["x-dead-letter-routing-key"] == "control"
+    assert retry_queue.arguments["x-message-ttl"] == RETRY_DELAYS[0] * 1000
+    assert "control.dlq" in broker.queues
+    assert broker.bodies(f"control.retry.{RETRY_DELAYS[0]}s") == [b"request"]
+    retried = broker.queues[f"control.retry.{RETRY_DELAYS[0]}s"].ready[0]
+    assert retried.headers["x-attempt"] == 1
+    assert retried.headers["x-error-class"] == "transient"
+    assert retried.headers["x-error"] == "boom"
+    # Jitter only shortens the delay, the queue TTL stays the upper bound
+    assert 0 < retried.properties["expiration"] <= RETRY_DELAYS[0]
+    # The retry still counts its time budget from the original submission
+    assert retried.properties["timestamp"] == submitted
@@ -0,0 +1,210 @@
+import asyncio
+import json
+
+from prometheus_client import REGISTRY
+
+from src import dispatcher
+from src import results as results_module
+from src.amqp import ChannelPool
+from src.config import Config
+from src.race import RaceTracker, is_final
+from src.results import ResultCache
+from tests.amqp_stub import FakeBroker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_only_final_results_end_a_race():
+    assert is_final(b'{"status": "OPTIMAL_SOLUTION", "solution": {}}')
+    assert is_final(b'{"status": "UNSATISFIABLE"}')
+    assert not is_final(b'{"status": "SATISFIED"}')
+    assert not is_final(b"[1, 2]")
+    assert not is_final(b"not json")
+
+
+def test_first_final_result_cancels_the_other_solvers(broker):
+    clock = Clock()
+    tracker = RaceTracker(clock=clock)
+    for solver_id in (7, 8, 9):
+        tracker.add("race-1", f"key-{solver_id}", solver_id, vcpus=2)
+    saved = (
+        REGISTRY.get_sample_value("solver_controller_race_saved_solver_seconds_sum")
+        or 0
+    )
+
+    async def scenario():
+        connection = await broker.connect_robust()
+        channel = await connection.channel()
+        assert await tracker.result(channel, "key-8", b'{"status": "SATISFIED"}') == []
+        clock.now = 600
+        assert await tracker.result(
+            channel, "key-8", b'{"status": "OPTIMAL_SOLUTION"}'
+        ) == ["race-1"]
+        # The race is over, so a late final result of a loser changes nothing
+        assert (
+            await tracker.result(channel, "key-7", b'{"status": "OPTIMAL_SOLUTION"}')
+            == []
+        )
+
+    asyncio.run(scenario())
+
+    cancels = broker.exchanges[Config.Race.CANCEL_EXCHANGE]
+    assert len(cancels) == 1
+    assert cancels[0].headers == {"x-race-id": "race-1"}
+    assert json.loads(cancels[0].body) == {
+        "race_id": "race-1",
+        "winner_solver_id": 8,
+        "solver_ids": [7, 9],
+    }
+    assert len(tracker) == 0
+    # Two losers, each stopped 3000s before its timeout
+    assert (
+        REGISTRY.get_sample_value("solver_controller_race_saved_solver_seconds_sum")
+        == saved + 6000
+    )
+
+
+def test_race_batch_is_fanned_out_and_decided_by_the_relay(monkeypatch):
+    monkeypatch.setattr(Config.Race, "ENABLED", True)
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", False)
+    tracker = RaceTracker()
+    monkeypatch.setattr(dispatcher, "races", tracker)
+    monkeypatch.setattr(results_module, "races", tracker)
+    broker = FakeBroker()
+    monkeypatch.setattr(dispatcher.aio_pika, "connect_robust", broker.connect_robust)
+    control_queue = Config.Controller.CONTROL_QUEUE
+    broker.queue(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE)
+    deploys = []
+
+    async def fake_get_solvers_info(solver_ids):
+        return {
+            solver_id: (f"solver-{solver_id}", f"solver-{solver_id}:1")
+            for solver_id in solver_ids
+        }
+
+    async def fake_deploy_solver(
+        solver_type, image, namespace, queue_in, queue_out, *args
+    ):
+        deploys.append(queue_out)
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solvers_info", fake_get_solvers_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+    broker.put(
+        control_queue,
+        json.dumps(
+            {
+                "problem_id": 1,
+                "instance_ids": [10],
+                "solver_ids": [7, 8],
+                "vcpus": 2,
+                "memory_gib": 4,
+                "race": True,
+            }
+        ).encode(),
+    )
+    queues = [dispatcher.solver_queue_name(solver_id, 2, 4) for solver_id in (7, 8)]
+
+    async def main():
+        task = asyncio.create_task(dispatcher.start_dispatcher())
+        try:
+            await broker.wait_for(lambda: all(broker.bodies(queue) for queue in queues))
+            await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+            race_ids = {
+                broker.queues[queue].ready[0].headers["x-race-id"] for queue in queues
+            }
+            assert len(race_ids) == 1 and len(tracker) == 1
+
+            winner = broker.queues[queues[1]].ready[0]
+            broker.put(
+                Config.ResultCache.RELAY_QUEUE,
+                b'{"status": "OPTIMAL_SOLUTION"}',
+                correlation_id=winner.properties["correlation_id"],
+            )
+            connection = await broker.connect_robust()
+            channel = await connection.channel(
+                publisher_confirms=True, on_return_raises=True
+            )
+            relay = await channel.declare_queue(Config.ResultCache.RELAY_QUEUE)
+            await ResultCache(ttl=60, max_size=10, max_bytes=1000).relay(
+                channel, await relay.get()
+            )
+            return race_ids.pop()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    race_id = asyncio.run(main())
+
+    assert deploys == [Config.ResultCache.RELAY_QUEUE] * 2
+    assert broker.bodies(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE) == [
+        b'{"status": "OPTIMAL_SOLUTION"}'
+    ]
+    [cancel] = broker.exchanges[Config.Race.CANCEL_EXCHANGE]
+    assert json.loads(cancel.body) == {
+        "race_id": race_id,
+        "winner_solver_id": 8,
+        "solver_ids": [7],
+    }
+    assert len(tracker) == 0
+
+
+def test_race_ends_in_its_replica_whichever_replica_relays_the_result(
+    broker, monkeypatch
+):
+    monkeypatch.setattr(Config.Race, "ENABLED", True)
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", False)
+    monkeypatch.setattr(
+        results_module, "channel_pool", ChannelPool(max_channels=4, acquire_timeout=1)
+    )
+    # The race was dispatched by one replica, and the other took its winning result off the relay queue
+    dispatching, relaying = RaceTracker(), RaceTracker()
+    for solver_id in (7, 8):
+        dispatching.add("race-1", f"key-{solver_id}", solver_id, vcpus=2)
+    replicas = [
+        ResultCache(ttl=60, max_size=10, max_bytes=1000, tracker=tracker)
+        for tracker in (dispatching, relaying)
+    ]
+    exchange = Config.ResultCache.RELAYED_EXCHANGE
+    broker.queue(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE)
+
+    async def main():
+        tasks = [asyncio.create_task(replica.follow()) for replica in replicas]
+        try:
+            await broker.wait_for(lambda: len(broker.bindings.get(exchange, ())) == 2)
+            broker.put(
+                Config.ResultCache.RELAY_QUEUE,
+                b'{"status": "OPTIMAL_SOLUTION"}',
+                correlation_id="key-8",
+                content_type="application/json",
+            )
+            connection = await broker.connect_robust()
+            channel = await connection.channel(
+                publisher_confirms=True, on_return_raises=True
+            )
+            relay = await channel.declare_queue(Config.ResultCache.RELAY_QUEUE)
+            await replicas[1].relay(channel, await relay.get())
+            await broker.wait_for(lambda: len(dispatching) == 0)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results_module.channel_pool.close()
+
+    asyncio.run(main())
+
+    [cancel] = broker.exchanges[Config.Race.CANCEL_EXCHANGE]
+    assert json.loads(cancel.body) == {
+        "race_id": "race-1",
+        "winner_solver_id": 8,
+        "solver_ids": [7],
+    }
+    assert broker.bodies(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE) == [
+        b'{"status": "OPTIMAL_SOLUTION"}'
+    ]
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from src import informer, kube, scheduler
+from src import reaper as gc
+from src.amqp import ChannelPool
+from src.informer import Informer
+from src.metrics import REAPER_RECLAIMED
+from src.reaper import Reaper
+from src.spawner import (
+    create_keda_scaled_object_manifest,
+    create_solver_deployment_manifest,
+    scaled_object_name,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def solvers(broker, monkeypatch):
+    deleted = []
+
+    class FakeAppsV1Api:
+        def delete_namespaced_deployment(self, name, namespace):
+            deleted.append(name)
+
+    class FakeCustomObjectsApi:
+        def delete_namespaced_custom_object(
+            self, group, version, namespace, plural, name
+        ):
+            deleted.append(name)
+
+    monkeypatch.setattr(kube, "apps_v1", FakeAppsV1Api)
+    monkeypatch.setattr(kube, "custom_objects", FakeCustomObjectsApi)
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    pool = ChannelPool(max_channels=4, acquire_timeout=1)
+    monkeypatch.setattr(scheduler, "channel_pool", pool)
+    monkeypatch.setattr(gc, "channel_pool", pool)
+    for solver in ("gecode", "chuffed"):
+        informer.deployments.add(
+            create_solver_deployment_manifest(
+                solver, "solvers", "image", 2, 4, f"q-{solver}", "out", 60
+            )
+        )
+        informer.scaled_objects.add(
+            create_keda_scaled_object_manifest(solver, "solvers", f"q-{solver}", 2, 4)
+        )
+        broker.queue(f"q-{solver}")
+    return deleted
+
+
+def test_reaps_only_idle_solvers(broker, solvers):
+    clock = Clock()
+    reaper = Reaper(idle_seconds=100, interval=60, dry_run=False, clock=clock)
+
+    async def main():
+        assert await reaper.sweep() == []
+        clock.now = 50
+        reaper.touch("q-chuffed")
+        clock.now = 120
+        broker.put("q-gecode", b"job")  # Queued work counts as use
+        assert await reaper.sweep() == []
+
+        broker.queues["q-gecode"].ready.clear()
+        clock.now = 200
+        reaped = await reaper.sweep()
+        await gc.channel_pool.close()
+        return reaped
+
+    reaped = asyncio.run(main())
+    assert reaped == [scaled_object_name("chuffed", 2, 4)]
+    assert "q-chuffed" not in broker.queues
+    assert "q-gecode" in broker.queues
+    assert len(solvers) == 2
+    assert informer.scaled_objects.names() == [scaled_object_name("gecode", 2, 4)]
+
+
+def test_dry_run_deletes_nothing(broker, solvers):
+    clock = Clock()
+    reaper = Reaper(idle_seconds=100, interval=60, dry_run=True, clock=clock)
+    counted = REAPER_RECLAIMED.labels("scaledobject", "dry_run")._value.get()
+
+    async def main():
+        await reaper.sweep()
+        clock.now = 200
+        assert len(await reaper.sweep()) == 2
+        # Still idle: already reported, so neither logged nor counted again
+        clock.now = 300
+        assert await reaper.sweep() == []
+        assert (
+            REAPER_RECLAIMED.labels("scaledobject", "dry_run")._value.get()
+            == counted + 2
+        )
+
+        # Used and idle again: reported again
+        reaper.touch("q-gecode")
+        clock.now = 500
+        reaped = await reaper.sweep()
+        await gc.channel_pool.close()
+        return reaped
+
+    assert asyncio.run(main()) == [scaled_object_name("gecode", 2, 4)]
+    assert (
+        REAPER_RECLAIMED.labels("scaledobject", "dry_run")._value.get() == counted + 3
+    )
+    assert solvers == []
+    assert set(broker.queues) == {"q-gecode", "q-chuffed"}
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from src.replay import replay
+
+
+def test_replay_moves_matching_messages_at_the_given_rate(broker):
+    broker.queue("control")
+    for n in range(4):
+        error_class = "permanent" if n == 1 else "transient"
+        broker.put(
+            "control.dlq",
+            f"job {n}".encode(),
+            {
+                "x-attempt": 4,
+                "x-error-class": error_class,
+                "x-error": "boom",
+                "x-tenant": "a",
+            },
+            content_type="application/json",
+        )
+
+    async def main():
+        connection = await broker.connect_robust()
+        channel = await connection.channel(
+            publisher_confirms=True, on_return_raises=True
+        )
+        start = time.monotonic()
+        replayed = await replay(
+            channel, "control", rate=50, limit=2, error_class="transient"
+        )
+        return replayed, time.monotonic() - start
+
+    replayed, seconds = asyncio.run(main())
+
+    assert replayed == 2
+    assert seconds >= 1 / 50
+    assert broker.bodies("control") == [b"job 0", b"job 2"]
+    assert broker.queues["control"].ready[0].headers == {
+        "x-tenant": "a",
+        "x-replayed": 1,
+    }
+    assert (
+        broker.queues["control"].ready[0].properties["content_type"]
+        == "application/json"
+    )
+    assert sorted(broker.bodies("control.dlq")) == [b"job 1", b"job 3"]
+
+
+def test_dry_run_moves_nothing(broker):
+    for n in range(3):
+        broker.put(
+            "control.dlq",
+            f"job {n}".encode(),
+            {"x-error-class": "transient" if n else "permanent"},
+        )
+
+    async def main():
+        connection = await broker.connect_robust()
+        return await replay(
+            await connection.channel(),
+            "control",
+            rate=0,
+            error_class="transient",
+            dry_run=True,
+        )
+
+    assert asyncio.run(main()) == 2
+    # Each message went back to the tail as soon as it was counted, so the DLQ is as it was
+    assert broker.bodies("control.dlq") == [b"job 0", b"job 1", b"job 2"]
+    assert broker.queues["control.dlq"].unacked == 0
+    assert not broker.bodies("control")
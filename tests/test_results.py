@@ -0,0 +1,204 @@
+import asyncio
+import json
+
+from prometheus_client import REGISTRY
+
+from src import dispatcher
+from src import results as results_module
+from src.amqp import ChannelPool
+from src.config import Config
+from src.results import ResultCache, result_key
+from tests.amqp_stub import FakeBroker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_results_expire_and_are_evicted_by_count_and_size():
+    clock = Clock()
+    cache = ResultCache(ttl=60, max_size=3, max_bytes=10, clock=clock)
+    cache.put("a", b"aaaa", {}, {})
+    cache.put("b", b"bbbb", {}, {})
+    assert cache.get("a").body == b"aaaa"
+
+    # Over the size limit: the least recently used result goes
+    cache.put("c", b"cccc", {}, {})
+    assert cache.get("b") is None
+    assert [cache.get(key).body for key in ("a", "c")] == [b"aaaa", b"cccc"]
+
+    clock.now = 61
+    assert cache.get("a") is None
+    assert len(cache) == 1
+    cache.bypass("c")
+    assert len(cache) == 0
+
+
+def test_cost_is_measured_from_dispatch_to_result():
+    clock = Clock()
+    cache = ResultCache(ttl=60, max_size=10, max_bytes=1000, clock=clock)
+    cache.dispatched("a", vcpus=4)
+    clock.now = 30
+    cache.put("a", b"solution", {}, {})
+    assert cache.get("a").cost == 120
+    # A later result of the same solve replaces the first
+    clock.now = 40
+    cache.put("a", b"better solution", {}, {})
+    assert cache.get("a").body == b"better solution"
+    assert cache.get("a").cost == 160
+
+
+def test_repeated_requests_are_answered_from_the_relayed_result(monkeypatch):
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", True)
+    monkeypatch.setattr(Config.Broadcast, "ENABLED", True)
+    clock = Clock()
+    monkeypatch.setattr(
+        dispatcher,
+        "results",
+        ResultCache(ttl=60, max_size=10, max_bytes=1000, clock=clock),
+    )
+    broker = FakeBroker()
+    monkeypatch.setattr(dispatcher.aio_pika, "connect_robust", broker.connect_robust)
+    control_queue = Config.Controller.CONTROL_QUEUE
+    result_queue = Config.Controller.PROJECT_SOLVER_RESULT_QUEUE
+    # Declared by the project, which consumes it
+    broker.queue(result_queue)
+    solver_queue = dispatcher.solver_queue_name(7, 2, 4)
+    deploys = []
+
+    async def fake_get_solver_info(solver_id):
+        return "gecode", "gecode:1"
+
+    async def fake_deploy_solver(
+        solver_type, image, namespace, queue_in, queue_out, *args
+    ):
+        deploys.append(queue_out)
+        return True
+
+    monkeypatch.setattr(dispatcher, "get_solver_info", fake_get_solver_info)
+    monkeypatch.setattr(dispatcher, "deploy_solver", fake_deploy_solver)
+
+    def request(bypass_cache: bool = False) -> bytes:
+        return json.dumps(
+            {
+                "problem_id": 1,
+                "instance_id": 10,
+                "solver_id": 7,
+                "vcpus": 2,
+                "memory_gib": 4,
+                "bypass_cache": bypass_cache,
+            }
+        ).encode()
+
+    saved = (
+        REGISTRY.get_sample_value(
+            "solver_controller_result_cache_saved_vcpu_seconds_total"
+        )
+        or 0
+    )
+
+    async def main():
+        task = asyncio.create_task(dispatcher.start_dispatcher())
+        try:
+            broker.put(control_queue, request())
+            await broker.wait_for(lambda: len(broker.bodies(solver_queue)) == 1)
+            solver_message = broker.queues[solver_queue].ready[0]
+            assert solver_message.properties["correlation_id"] == result_key(
+                7, "gecode:1", 1, 10, 2, 4
+            )
+
+            # The solver answers on the relay queue 30s later, and the relay passes the result on
+            clock.now = 30
+            broker.put(
+                Config.ResultCache.RELAY_QUEUE,
+                b"solution",
+                correlation_id=solver_message.properties["correlation_id"],
+            )
+            connection = await broker.connect_robust()
+            channel = await connection.channel(
+                publisher_confirms=True, on_return_raises=True
+            )
+            relay = await channel.declare_queue(Config.ResultCache.RELAY_QUEUE)
+            await dispatcher.results.relay(channel, await relay.get())
+            assert broker.bodies(result_queue) == [b"solution"]
+
+            broker.put(control_queue, request())
+            await broker.wait_for(lambda: len(broker.bodies(result_queue)) == 2)
+            broker.put(control_queue, request(bypass_cache=True))
+            await broker.wait_for(lambda: len(broker.bodies(solver_queue)) == 2)
+            await broker.wait_for(lambda: broker.queues[control_queue].unacked == 0)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+    assert broker.queues[result_queue].ready[1].headers["x-cached"] is True
+    # Relayed and cached results alike are copied to the result streams
+    assert [m.body for m in broker.exchanges[f"{result_queue}.broadcast"]] == [
+        b"solution",
+        b"solution",
+    ]
+    assert deploys == [Config.ResultCache.RELAY_QUEUE] * 2
+    assert len(dispatcher.results) == 0
+    assert (
+        REGISTRY.get_sample_value(
+            "solver_controller_result_cache_saved_vcpu_seconds_total"
+        )
+        == saved + 60
+    )
+
+
+def test_every_replica_caches_what_one_of_them_relayed(broker, monkeypatch):
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", True)
+    monkeypatch.setattr(
+        results_module, "channel_pool", ChannelPool(max_channels=4, acquire_timeout=1)
+    )
+    replicas = [ResultCache(ttl=60, max_size=10, max_bytes=1000) for _ in range(2)]
+    exchange = Config.ResultCache.RELAYED_EXCHANGE
+    broker.queue(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE)
+    broker.put(
+        Config.ResultCache.RELAY_QUEUE,
+        b'{"objective": 3}',
+        {"x-solver": 7},
+        correlation_id="key",
+    )
+
+    async def main():
+        tasks = [asyncio.create_task(replica.follow()) for replica in replicas]
+        try:
+            await broker.wait_for(lambda: len(broker.bindings.get(exchange, ())) == 2)
+            connection = await broker.connect_robust()
+            channel = await connection.channel(
+                publisher_confirms=True, on_return_raises=True
+            )
+            relay = await channel.declare_queue(Config.ResultCache.RELAY_QUEUE)
+            await replicas[0].relay(channel, await relay.get())
+            await broker.wait_for(lambda: len(replicas[1]) == 1)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results_module.channel_pool.close()
+
+    asyncio.run(main())
+
+    for replica in replicas:
+        hit = replica.get("key")
+        assert (hit.body, hit.headers) == (b'{"objective": 3}', {"x-solver": 7})
+        assert hit.properties == {"correlation_id": "key"}
+    assert broker.bodies(Config.Controller.PROJECT_SOLVER_RESULT_QUEUE) == [
+        b'{"objective": 3}'
+    ]
+
+
+def test_results_go_straight_to_the_project_queue_while_the_cache_is_off(monkeypatch):
+    monkeypatch.setattr(Config.ResultCache, "ENABLED", False)
+    assert (
+        results_module.solver_result_queue()
+        == Config.Controller.PROJECT_SOLVER_RESULT_QUEUE
+    )
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+
+from src import informer, kube
+from src import scheduler as capacity
+from src.amqp import ChannelPool
+from src.informer import Informer
+from src.scheduler import CapacityScheduler, QueueDemand, allocate
+from src.spawner import (
+    create_keda_scaled_object_manifest,
+    create_solver_deployment_manifest,
+    scaled_object_name,
+)
+
+
+def test_allocate_is_fair_and_weighted_by_shape():
+    demands = [
+        QueueDemand("small", "q-small", vcpus=2, memory_gib=4, backlog=100),
+        QueueDemand("large", "q-large", vcpus=8, memory_gib=16, backlog=100),
+        QueueDemand("idle", "q-idle", vcpus=2, memory_gib=4),
+    ]
+    # The idle queue's floor of one replica comes out of the budget too
+    limits = allocate(demands, replicas=10)
+    assert limits == {"small": 7, "large": 2, "idle": 1}
+
+    # A queue wanting less than its fair share leaves the rest to the others
+    demands[0].backlog = 3
+    assert allocate(demands, replicas=10) == {"small": 3, "large": 6, "idle": 1}
+
+    # The vCPU budget binds before the replica budget
+    assert allocate(demands, replicas=10, cpus=24) == {
+        "small": 3,
+        "large": 2,
+        "idle": 1,
+    }
+
+    # With more queues than replicas the busiest get the floors and the limits stay within budget
+    demands[1].backlog = 1
+    assert allocate(demands, replicas=2) == {"small": 1, "large": 1, "idle": 0}
+    assert allocate(demands, replicas=1) == {"small": 1, "large": 0, "idle": 0}
+
+
+def test_rebalance_patches_scaled_objects(broker, monkeypatch):
+    patches = {}
+
+    class FakeCustomObjectsApi:
+        def patch_namespaced_custom_object(
+            self, group, version, namespace, plural, name, body
+        ):
+            patches[name] = body["spec"]["maxReplicaCount"]
+
+    monkeypatch.setattr(kube, "custom_objects", FakeCustomObjectsApi)
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    monkeypatch.setattr(
+        capacity, "channel_pool", ChannelPool(max_channels=4, acquire_timeout=1)
+    )
+    monkeypatch.setattr(capacity.Config.Controller, "MAX_TOTAL_SOLVER_REPLICAS", 6)
+    for solver, vcpus in (("gecode", 2), ("chuffed", 2), ("unused", 4)):
+        informer.deployments.add(
+            create_solver_deployment_manifest(
+                solver, "solvers", "image", vcpus, 4, f"q-{solver}", "out", 60
+            )
+        )
+        informer.scaled_objects.add(
+            create_keda_scaled_object_manifest(
+                solver, "solvers", f"q-{solver}", vcpus, 4
+            )
+        )
+    for _ in range(10):
+        broker.put("q-gecode", b"job")
+    broker.put("q-chuffed", b"job")
+
+    scheduler = CapacityScheduler(interval=60)
+
+    async def main():
+        await scheduler.rebalance()
+        await capacity.channel_pool.close()
+
+    asyncio.run(main())
+
+    gecode, chuffed, unused = (
+        scaled_object_name(s, v, 4)
+        for s, v in (("gecode", 2), ("chuffed", 2), ("unused", 4))
+    )
+    assert patches == {gecode: 4}
+    assert {a.scaled_object: a.max_replicas for a in scheduler.allocations} == {
+        gecode: 4,
+        chuffed: 1,
+        unused: 1,
+    }
+    assert informer.scaled_objects.get(gecode)["spec"]["maxReplicaCount"] == 4
+
+
+def test_rebalance_fails_when_the_broker_cannot_be_measured(monkeypatch):
+    patches = {}
+
+    class FakeCustomObjectsApi:
+        def patch_namespaced_custom_object(
+            self, group, version, namespace, plural, name, body
+        ):
+            patches[name] = body["spec"]["maxReplicaCount"]
+
+    class UnreachablePool:
+        def channel(self):
+            raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(kube, "custom_objects", FakeCustomObjectsApi)
+    monkeypatch.setattr(informer, "deployments", Informer("deployment", None))
+    monkeypatch.setattr(informer, "scaled_objects", Informer("scaledobject", None))
+    monkeypatch.setattr(capacity, "channel_pool", UnreachablePool())
+    informer.scaled_objects.add(
+        create_keda_scaled_object_manifest("gecode", "solvers", "q-gecode", 2, 4)
+    )
+
+    scheduler = CapacityScheduler(interval=60)
+    scheduler.last_rebalance = time.time() - 120
+    # An unreachable broker is not an empty queue: the limits stay as they are and go stale
+    with pytest.raises(ConnectionError):
+        asyncio.run(scheduler.rebalance())
+    assert patches == {}
+    assert scheduler.staleness() >= 120
+
+
+def test_capacity_endpoint(client, monkeypatch):
+    response = client.get("/v1/admin/capacity")
+    assert response.status_code == 200
+    assert response.json()["max_total_replicas"] == 10
+
+    # Only the leader runs the scheduler, so only it knows the allocations
+    monkeypatch.setattr(capacity.Config.Leader, "ELECTION", True)
+    assert client.get("/v1/admin/capacity").status_code == 409
@@ -0,0 +1,191 @@
+import asyncio
+
+import pytest
+
+from src import dispatcher
+from src.cache import AsyncTTLCache
+from src.director import SolverNotFoundError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(loader, clock=None, **kwargs) -> AsyncTTLCache:
+    options = {
+        "ttl": 60,
+        "max_size": 2,
+        "negative_ttl": 5,
+        "negative_exceptions": (SolverNotFoundError,),
+    }
+    options.update(kwargs)
+    return AsyncTTLCache("test", loader, clock=clock or FakeClock(), **options)
+
+
+def test_cache_expires_entries_after_ttl():
+    """Entries are served from the cache until the TTL runs out"""
+    calls = []
+    clock = FakeClock()
+
+    async def loader(key):
+        calls.append(key)
+        return f"solver-{key}"
+
+    cache = make_cache(loader, clock)
+
+    async def main():
+        assert await cache.get(1) == "solver-1"
+        assert await cache.get(1) == "solver-1"
+        clock.now = 61
+        assert await cache.get(1) == "solver-1"
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+
+
+def test_cache_evicts_least_recently_used():
+    """The cache never holds more than max_size entries"""
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        return key
+
+    cache = make_cache(loader)
+
+    async def main():
+        await cache.get(1)
+        await cache.get(2)
+        await cache.get(1)
+        await cache.get(3)  # Evicts 2, the least recently used
+        await cache.get(1)
+        await cache.get(2)
+
+    asyncio.run(main())
+    assert calls == [1, 2, 3, 2]
+    assert len(cache) == 2
+
+
+def test_cache_remembers_missing_solvers():
+    """A 404 is cached for the negative TTL only"""
+    calls = []
+    clock = FakeClock()
+
+    async def loader(key):
+        calls.append(key)
+        raise SolverNotFoundError(key)
+
+    cache = make_cache(loader, clock)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(SolverNotFoundError):
+                await cache.get(1)
+        clock.now = 6
+        with pytest.raises(SolverNotFoundError):
+            await cache.get(1)
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+
+
+def test_cache_does_not_remember_other_errors():
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        raise RuntimeError("director unavailable")
+
+    cache = make_cache(loader)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await cache.get(1)
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+
+
+def test_cache_coalesces_concurrent_misses():
+    """Concurrent misses for one key share a single load"""
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 10
+
+    cache = make_cache(loader)
+
+    async def main():
+        return await asyncio.gather(*(cache.get(1) for _ in range(50)), cache.get(2))
+
+    results = asyncio.run(main())
+    assert results == [10] * 50 + [20]
+    assert calls == [1, 2]
+
+
+def test_invalidate_endpoint(client, monkeypatch):
+    """The admin endpoint drops a cached solver so the next lookup refetches it"""
+    calls = []
+
+    async def fake_fetch(solver_id):
+        calls.append(solver_id)
+        return "gecode", "gecode:latest"
+
+    monkeypatch.setattr(dispatcher.solver_cache, "_loader", fake_fetch)
+    dispatcher.solver_cache.clear()
+
+    async def lookup():
+        return await dispatcher.get_solver_info(3)
+
+    asyncio.run(lookup())
+    asyncio.run(lookup())
+
+    response = client.delete("/v1/admin/solvers/3/cache")
+    assert response.status_code == 200
+    assert response.json() == {"invalidated": 1}
+
+    asyncio.run(lookup())
+    assert calls == [3, 3]
+
+    response = client.delete("/v1/admin/solvers/3/cache")
+    assert response.json() == {"invalidated": 1}
+    response = client.delete("/v1/admin/solvers/3/cache")
+    assert response.json() == {"invalidated": 0}
+
+
+def test_cache_metrics_are_exported(client):
+    response = client.get("/metrics")
+    assert "solver_controller_cache_requests_total" in response.text
+
+
+def test_get_many_loads_all_misses_in_one_call():
+    bulk_calls = []
+
+    async def loader(key):
+        return key
+
+    async def bulk_loader(keys):
+        bulk_calls.append(keys)
+        return {key: SolverNotFoundError(key) if key == 3 else key * 10 for key in keys}
+
+    cache = make_cache(loader, max_size=10)
+
+    async def main():
+        await cache.get(1)
+        first = await cache.get_many([1, 2, 3], bulk_loader)
+        second = await cache.get_many([1, 2, 3], bulk_loader)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert bulk_calls == [[2, 3]]
+    assert (
+        first[1] == 1 and first[2] == 20 and isinstance(first[3], SolverNotFoundError)
+    )
+    assert second[2] == 20 and isinstance(second[3], SolverNotFoundError)
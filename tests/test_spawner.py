@@ -0,0 +1,68 @@
+from src.config import Config
+from src.spawner import (
+    MAX_NAME_LENGTH,
+    annotated_spec_hash,
+    bucket_shape,
+    create_keda_scaled_object_manifest,
+    create_solver_deployment_manifest,
+    deployment_name,
+    scaled_object_name,
+)
+
+
+def test_names_are_per_shape_and_bounded():
+    names = {
+        deployment_name("gecode", 2, 4),
+        deployment_name("gecode", 4, 4),
+        deployment_name("gecode", 2, 8),
+    }
+    assert len(names) == 3
+
+    # Sanitising makes these look alike; the hash keeps them apart
+    assert deployment_name("or_tools", 2, 4) != deployment_name("or.tools", 2, 4)
+
+    long_name = scaled_object_name("a-very-long-solver-name-" * 4, 64, 256.5)
+    assert len(long_name) <= MAX_NAME_LENGTH
+    assert long_name.endswith("-scaler")
+
+
+def test_manifests_select_only_their_shape():
+    deployment = create_solver_deployment_manifest(
+        "gecode", "solvers", "image", 2, 4, "queue-in", "queue-out", 60
+    )
+    scaled_object = create_keda_scaled_object_manifest(
+        "gecode", "solvers", "queue-in", 2, 4
+    )
+    selector = deployment["spec"]["selector"]["matchLabels"]
+    assert selector["solver-deployment"] == deployment["metadata"]["name"]
+    assert deployment["spec"]["template"]["metadata"]["labels"] == selector
+    assert (
+        scaled_object["spec"]["scaleTargetRef"]["name"]
+        == deployment["metadata"]["name"]
+    )
+
+
+def test_bucket_shape(monkeypatch):
+    assert bucket_shape(3, 5) == (3, 5)
+    monkeypatch.setattr(Config.Solver, "VCPU_BUCKETS", [1, 2, 4, 8])
+    monkeypatch.setattr(Config.Solver, "MEMORY_BUCKETS_GIB", [2, 8, 32])
+    assert bucket_shape(3, 5) == (4, 8)
+    assert bucket_shape(16, 64) == (16, 64)
+
+
+def test_spec_hash_annotation_follows_the_manifest():
+    deployment = create_solver_deployment_manifest(
+        "gecode", "solvers", "image", 2, 4, "queue-in", "queue-out", 60
+    )
+    same = create_solver_deployment_manifest(
+        "gecode", "solvers", "image", 2, 4, "queue-in", "queue-out", 60
+    )
+    changed = create_solver_deployment_manifest(
+        "gecode", "solvers", "image", 2, 4, "queue-in", "queue-out", 120
+    )
+
+    assert annotated_spec_hash(deployment) == annotated_spec_hash(same)
+    assert annotated_spec_hash(deployment) != annotated_spec_hash(changed)
+    # Callers get their own copy of the cached template
+    deployment["spec"]["replicas"] = 3
+    assert same["spec"]["replicas"] == 0
@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import json
+import time
+
+import httpx
+import msgspec
+import pytest
+from starlette.requests import ClientDisconnect
+
+from src.amqp import ChannelPool
+from src.main import app
+from src.routers.api import routes
+
+
+def test_status_is_bounded_by_count_and_bytes(client, broker):
+    for i in range(5):
+        broker.put("results", f"solution-{i}".encode())
+
+    response = client.get(
+        "/v1/status", params={"queue_name": "results", "max_messages": 2}
+    )
+    assert response.json() == {
+        "isFinished": False,
+        "messages": ["solution-0", "solution-1"],
+    }
+
+    # The message that would exceed the byte budget stays at the head of the queue
+    response = client.get(
+        "/v1/status", params={"queue_name": "results", "max_bytes": 15}
+    )
+    assert response.json()["messages"] == ["solution-2"]
+    assert broker.bodies("results") == [b"solution-3", b"solution-4"]
+
+    response = client.get("/v1/status", params={"queue_name": "results"})
+    assert response.json()["messages"] == ["solution-3", "solution-4"]
+    response = client.get("/v1/status", params={"queue_name": "results"})
+    assert response.json() == {"isFinished": True, "messages": []}
+
+
+def test_status_ack_after_send(client, broker):
+    broker.put("results", b"solution")
+    response = client.get("/v1/status", params={"queue_name": "results", "ack": True})
+    assert response.json()["messages"] == ["solution"]
+    assert broker.bodies("results") == []
+    assert broker.queues["results"].unacked == 0
+
+
+def test_status_long_poll_returns_on_first_message(broker, monkeypatch):
+    monkeypatch.setattr(
+        routes, "channel_pool", ChannelPool(max_channels=2, acquire_timeout=1)
+    )
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            start = time.perf_counter()
+            request = asyncio.create_task(
+                client.get("/v1/status", params={"queue_name": "results", "wait": 5})
+            )
+            await asyncio.sleep(0.05)
+            broker.put("results", b"solution")
+            response = await request
+            assert response.json()["messages"] == ["solution"]
+            assert time.perf_counter() - start < 1
+
+            response = await client.get(
+                "/v1/status", params={"queue_name": "results", "wait": 0.05}
+            )
+            assert response.json() == {"isFinished": True, "messages": []}
+        await routes.channel_pool.close()
+
+    asyncio.run(main())
+    assert broker.queues["results"].consumers == 0
+
+
+def test_status_stream_ndjson(client, broker):
+    for i in range(3):
+        broker.put("results", f"solution-{i}".encode())
+
+    response = client.get(
+        "/v1/status/stream", params={"queue_name": "results", "ack": True}
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [
+        {"message": "solution-0"},
+        {"message": "solution-1"},
+        {"message": "solution-2"},
+        {"isFinished": False},
+    ]
+    assert broker.queues["results"].unacked == 0
+
+
+def test_status_returns_binary_bodies_as_text(client, broker):
+    broker.put(
+        "results",
+        msgspec.msgpack.encode({"status": "OPTIMAL_SOLUTION"}),
+        content_type="application/msgpack",
+    )
+    broker.put("results", b"\xff\xfe")
+
+    response = client.get("/v1/status", params={"queue_name": "results"})
+    assert response.json()["messages"] == [
+        '{"status":"OPTIMAL_SOLUTION"}',
+        base64.b64encode(b"\xff\xfe").decode(),
+    ]
+    response = client.get("/v1/status/stream", params={"queue_name": "results"})
+    assert json.loads(response.text.splitlines()[0]) == {"isFinished": True}
+    assert broker.queues["results"].unacked == 0
+
+
+def test_status_stream_releases_its_channel_when_the_client_is_gone(
+    broker, monkeypatch
+):
+    monkeypatch.setattr(
+        routes, "channel_pool", ChannelPool(max_channels=1, acquire_timeout=0.1)
+    )
+    broker.put("results", b"solution")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client disconnected")
+
+    async def main():
+        response = await routes.stream_status(
+            queue_name="results", limits=routes.drain_limits(), ack=True
+        )
+        with pytest.raises(ClientDisconnect):
+            await response(
+                {"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send
+            )
+        # The only channel of the pool is free again
+        async with routes.channel_pool.channel():
+            pass
+        await routes.channel_pool.close()
+
+    asyncio.run(main())
+    assert broker.bodies("results") == [b"solution"]
+    assert broker.queues["results"].unacked == 0